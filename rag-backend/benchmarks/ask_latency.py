@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark /ask latency under concurrent load.
+
+Runs N concurrent clients against a running RAG backend and reports p50/p99
+latency for /ask. While the load is running, a probe client keeps hitting the
+cheap `/` endpoint: if retrieval blocks the event loop, probe latency climbs
+with /ask load, otherwise it stays flat.
+
+Every request asks a different question (the --question text numbered, or the lines
+of --questions-file), so /ask runs retrieval and generation instead of returning a
+cached answer. The answer cache hits seen on /metrics during the run are reported;
+--repeat-question measures the cached path on purpose.
+
+Run it once against the old build and once against the new one, e.g.:
+
+    python benchmarks/ask_latency.py --url http://localhost:8000 --label before
+    python benchmarks/ask_latency.py --url http://localhost:8000 --label after
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(name: str, latencies: list[float], errors: int, elapsed: float) -> str:
+    if not latencies:
+        return f"{name}: no successful requests ({errors} errors)"
+    return (
+        f"{name}: n={len(latencies)} errors={errors} "
+        f"p50={percentile(latencies, 50) * 1000:.1f}ms "
+        f"p99={percentile(latencies, 99) * 1000:.1f}ms "
+        f"mean={statistics.mean(latencies) * 1000:.1f}ms "
+        f"throughput={len(latencies) / elapsed:.2f} req/s"
+    )
+
+
+def load_questions(args) -> list[str]:
+    """
+    One question per request; repeated file lines are numbered so each one is a cache miss
+    """
+    if args.questions_file:
+        with open(args.questions_file) as f:
+            base = [line.strip() for line in f if line.strip()]
+    else:
+        base = [args.question]
+    if args.repeat_question:
+        return [base[i % len(base)] for i in range(args.requests)]
+    if len(base) >= args.requests:
+        return base[:args.requests]
+    return [f"{base[i % len(base)]} (variant {i})" for i in range(args.requests)]
+
+
+async def answer_cache_hits(client: httpx.AsyncClient) -> int | None:
+    """
+    answer_cache.hits counter of the worker that serves /metrics, None when unavailable
+    """
+    try:
+        response = await client.get("/metrics")
+        return response.json()["metrics"]["counters"].get("answer_cache.hits", 0)
+    except Exception:
+        return None
+
+
+async def ask_client(client: httpx.AsyncClient, queue: asyncio.Queue, payload: dict, latencies: list, errors: list):
+    while True:
+        try:
+            question = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        started = time.perf_counter()
+        try:
+            response = await client.post("/ask", json=dict(payload, question=question))
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors.append(response.status_code)
+        except Exception as e:
+            errors.append(str(e))
+
+
+async def probe_client(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list, interval: float):
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            response = await client.get("/")
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+        except Exception:
+            pass
+        await asyncio.sleep(interval)
+
+
+async def run(args):
+    payload = {"max_context_results": args.max_context_results}
+    if args.file_id:
+        payload["file_id"] = args.file_id
+
+    queue = asyncio.Queue()
+    for question in load_questions(args):
+        queue.put_nowait(question)
+
+    ask_latencies, ask_errors, probe_latencies = [], [], []
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        hits_before = await answer_cache_hits(client)
+        probe = asyncio.create_task(probe_client(client, stop, probe_latencies, args.probe_interval))
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            ask_client(client, queue, payload, ask_latencies, ask_errors)
+            for _ in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+        hits_after = await answer_cache_hits(client)
+
+    print(f"[{args.label}] concurrency={args.concurrency} requests={args.requests} elapsed={elapsed:.1f}s")
+    print(f"[{args.label}] {summarize('/ask', ask_latencies, len(ask_errors), elapsed)}")
+    print(f"[{args.label}] {summarize('/ (probe)', probe_latencies, 0, elapsed)}")
+    if hits_before is not None and hits_after is not None:
+        # Counters are per process: with several uvicorn workers this is one worker's share
+        print(f"[{args.label}] answer cache hits during the run: {hits_after - hits_before}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /ask latency under concurrent clients")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--question", default="What is the main topic of the document?")
+    parser.add_argument("--questions-file", help="Questions to ask, one per line (cycled and numbered if fewer than --requests)")
+    parser.add_argument("--repeat-question", action="store_true", help="Send the same questions unnumbered to measure answer cache hits")
+    parser.add_argument("--max-context-results", type=int, default=5)
+    parser.add_argument("--file-id", action="append", help="Restrict search to a document id (repeatable)")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--probe-interval", type=float, default=0.1)
+    parser.add_argument("--label", default="run")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
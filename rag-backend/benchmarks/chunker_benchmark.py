@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Compare the token-aware chunker with the previous character-based chunker.
+
+For every input size, both chunkers split the same text (synthetic prose with
+paragraphs, or --input) streamed in 64 KB pieces like a text file, and report:
+  - throughput in MB/s
+  - number of chunks and their mean size in tokens
+  - chunks longer than the model limit (--model-limit), whose tails the model
+    truncates and never embeds
+
+Token counts come from the embedding model's fast tokenizer when transformers
+is installed (CHUNK_TOKENIZER=auto), otherwise from the character heuristic.
+
+    python benchmarks/chunker_benchmark.py --sizes-mb 1,8,32
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.chunker import Chunker
+
+WORDS = (
+    "the of and to in is that for it as was with be by on not he this are or his from at which "
+    "but have an they you were her she there been one all we their has would when if so no "
+    "revenue quarterly report analysis 2024 customer-facing infrastructure configuration "
+    "approximately $1,250,000 (see section 4.2) e.g. API throughput latency p99"
+).split()
+
+def synthetic_text(size_bytes: int, seed: int = 0) -> str:
+    """
+    Paragraphs of random sentences, with the occasional very long run-on sentence
+    """
+    rng = random.Random(seed)
+    paragraphs, size = [], 0
+    while size < size_bytes:
+        sentences = []
+        for _ in range(rng.randint(1, 8)):
+            length = rng.randint(200, 400) if rng.random() < 0.01 else rng.randint(4, 35)
+            sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+            sentences.append(sentence[0].upper() + sentence[1:] + rng.choice([".", ".", ".", "?", "!"]))
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+def legacy_chunks(text_pieces, chunk_size: int = 1000, overlap: int = 200):
+    """
+    The previous chunker: fixed character windows, backing up to a sentence end
+    with a per-character scan, and repeated slicing of the buffer
+    """
+    buffer = ""
+    start = 0
+    for piece in text_pieces:
+        buffer += piece
+        while len(buffer) - start > chunk_size:
+            end = legacy_chunk_end(buffer, start, chunk_size)
+            chunk = buffer[start:end].strip()
+            if chunk:
+                yield chunk
+            start = end - overlap
+        if start > 0:
+            buffer = buffer[start:]
+            start = 0
+    while start < len(buffer):
+        end = legacy_chunk_end(buffer, start, chunk_size)
+        chunk = buffer[start:end].strip()
+        if chunk:
+            yield chunk
+        start = end - overlap
+        if start >= len(buffer):
+            break
+
+def legacy_chunk_end(text: str, start: int, chunk_size: int) -> int:
+    end = start + chunk_size
+    if end < len(text):
+        for i in range(end, max(start + chunk_size - 100, start), -1):
+            if text[i] in ".!?":
+                end = i + 1
+                break
+    return end
+
+def pieces_of(text: str, size: int = 64 * 1024):
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+def measure(name: str, chunk_fn, text: str, counter: Chunker, model_limit: int) -> str:
+    started = time.perf_counter()
+    chunks = list(chunk_fn(pieces_of(text)))
+    elapsed = time.perf_counter() - started
+    tokens = []
+    for start in range(0, len(chunks), 256):
+        tokens.extend(counter.count_tokens(chunks[start:start + 256]))
+    truncated = sum(1 for count in tokens if count > model_limit)
+    return (
+        f"{name:>8}: {len(text) / 1e6 / elapsed:7.2f} MB/s  chunks={len(chunks):6d}  "
+        f"mean_tokens={statistics.mean(tokens) if tokens else 0:6.1f}  max_tokens={max(tokens, default=0):5d}  "
+        f"truncated={truncated} ({100.0 * truncated / max(1, len(chunks)):.1f}%)"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chunker on multi-MB inputs")
+    parser.add_argument("--sizes-mb", default="1,8,32", help="Comma-separated synthetic input sizes in MB")
+    parser.add_argument("--input", default=None, help="Chunk this UTF-8 text file instead of synthetic text")
+    parser.add_argument("--max-tokens", type=int, default=None, help="Defaults to CHUNK_MAX_TOKENS")
+    parser.add_argument("--overlap-tokens", type=int, default=None, help="Defaults to CHUNK_OVERLAP_TOKENS")
+    parser.add_argument("--model-limit", type=int, default=254, help="Tokens the model embeds (256 minus special tokens)")
+    args = parser.parse_args()
+
+    chunker = Chunker(max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens)
+    print(f"Token counts: {'fast tokenizer' if chunker.tokenizer is not None else f'heuristic ({chunker.chars_per_token} chars/token)'}")
+    print(f"Chunker: max_tokens={chunker.max_tokens} overlap_tokens={chunker.overlap_tokens}; legacy: 1000 chars, 200 overlap")
+
+    if args.input:
+        with open(args.input, encoding="utf-8") as file:
+            texts = [(args.input, file.read())]
+    else:
+        texts = [(f"{size} MB", synthetic_text(int(float(size) * 1e6))) for size in args.sizes_mb.split(",")]
+
+    for label, text in texts:
+        print()
+        print(f"{label} ({len(text) / 1e6:.1f} MB of text)")
+        print(measure("legacy", legacy_chunks, text, chunker, args.model_limit))
+        print(measure("tokens", lambda pieces: (chunk.text for chunk in chunker.chunk_stream(pieces)), text, chunker, args.model_limit))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Compare vector store backends on synthetic embeddings.
+
+For every corpus size, each backend is loaded into a fresh store in its own
+process and measured on:
+  - build time (inserts, plus graph construction for mmap-ann)
+  - recall@k against exact search, for unscoped and document-scoped queries
+  - queries per second (one query at a time, like /ask)
+  - resident memory after the queries (RSS) and peak RSS
+
+Backends: chroma, mmap (exact NumPy search), mmap-ann (hnswlib/FAISS graph),
+mmap-int8 (int8-quantized scan with float rescoring). Append "+hash" or
+"+document" to a backend to partition it by documentId, e.g. chroma+hash.
+Embeddings are clustered so that nearest neighbours are meaningful.
+
+    python benchmarks/vector_store_benchmark.py --sizes 100000,1000000 --backends chroma,mmap,mmap-ann
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def memory_usage_mb() -> tuple:
+    """
+    Current and peak resident set size of this process, in MB
+    """
+    current = peak = 0.0
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1]) / 1024.0
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) / 1024.0
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    return current, peak
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def generate_corpus(path: str, size: int, dim: int, seed: int = 0, block: int = 100000) -> np.ndarray:
+    """
+    Write `size` clustered unit vectors to an .npy file and return it memory-mapped
+    """
+    rng = np.random.default_rng(seed)
+    centers = normalize(rng.standard_normal((max(1, size // 1000), dim)).astype(np.float32))
+    corpus = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(size, dim))
+    for start in range(0, size, block):
+        end = min(size, start + block)
+        assigned = centers[rng.integers(0, len(centers), end - start)]
+        corpus[start:end] = normalize(assigned + 0.03 * rng.standard_normal((end - start, dim)).astype(np.float32))
+    corpus.flush()
+    return np.load(path, mmap_mode="r")
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int, block: int = 100000) -> np.ndarray:
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    for start in range(0, len(corpus), block):
+        scores = (np.asarray(corpus[start:start + block]) @ queries.T).T
+        rows = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+        best_scores = np.concatenate([best_scores, scores], axis=1)
+        best_rows = np.concatenate([best_rows, rows], axis=1)
+        keep = np.argsort(-best_scores, axis=1)[:, :k]
+        best_scores = np.take_along_axis(best_scores, keep, axis=1)
+        best_rows = np.take_along_axis(best_rows, keep, axis=1)
+    return best_rows
+
+
+def scoped_top_k(corpus: np.ndarray, queries: np.ndarray, scopes: list, chunks_per_document: int, k: int) -> list:
+    truth = []
+    for query, documents in zip(queries, scopes):
+        rows = np.concatenate([np.arange(d * chunks_per_document, min(len(corpus), (d + 1) * chunks_per_document)) for d in np.unique(documents)])
+        scores = np.asarray(corpus[rows]) @ query
+        truth.append(rows[np.argsort(-scores)[:k]])
+    return truth
+
+
+def open_store(backend: str, path: str, dtype: str, partitions: int):
+    backend, _, partition_mode = backend.partition("+")
+    if partition_mode:
+        from services.partitioned_vector_store import open_partitioned_store
+        options = {} if backend == "chroma" else {"dtype": dtype, "ann": "none"}
+        return open_partitioned_store(backend, path, mode=partition_mode, partitions=partitions, **options)
+    if backend == "chroma":
+        from services.vector_store import ChromaVectorStore
+        return ChromaVectorStore(path=path)
+    from services.mmap_vector_store import MmapVectorStore
+    if backend == "mmap":
+        return MmapVectorStore(path=path, dtype=dtype, ann="none")
+    if backend == "mmap-ann":
+        return MmapVectorStore(path=path, dtype=dtype, ann="auto", ann_threshold=0)
+    if backend == "mmap-int8":
+        return MmapVectorStore(path=path, dtype=dtype, ann="none", quantization="int8")
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def recall(found: list, truth: list, k: int) -> float:
+    hits = sum(len(set(f[:k]) & set(int(row) for row in t[:k])) for f, t in zip(found, truth))
+    return hits / float(sum(min(k, len(t)) for t in truth) or 1)
+
+
+def run_backend(backend: str, options: dict, results):
+    """
+    Load the corpus into a fresh store and measure it (runs in a child process)
+    """
+    corpus = np.load(options["corpus_path"], mmap_mode="r")
+    queries = np.load(options["queries_path"])
+    truth = np.load(options["truth_path"])
+    scoped_truth = np.load(options["scoped_truth_path"], allow_pickle=True)
+    scopes = np.load(options["scopes_path"])
+    k = options["k"]
+    chunks_per_document = options["chunks_per_document"]
+    store_path = os.path.join(options["workdir"], backend)
+    shutil.rmtree(store_path, ignore_errors=True)
+
+    store = open_store(backend, store_path, options["dtype"], options["partitions"])
+    started = time.perf_counter()
+    for start in range(0, len(corpus), options["batch_size"]):
+        end = min(len(corpus), start + options["batch_size"])
+        store.upsert(
+            ids=[str(row) for row in range(start, end)],
+            embeddings=np.asarray(corpus[start:end]).tolist(),
+            documents=[f"chunk {row}" for row in range(start, end)],
+            metadatas=[{"documentId": f"doc{row // chunks_per_document}", "chunk_index": row % chunks_per_document} for row in range(start, end)]
+        )
+    if backend == "mmap-ann":
+        store.build_ann()
+    build_seconds = time.perf_counter() - started
+
+    def measure(scoped: bool):
+        found = []
+        started = time.perf_counter()
+        for query, documents in zip(queries, scopes):
+            result = store.query(
+                query_embeddings=[query.tolist()],
+                n_results=k,
+                documentsId=[f"doc{d}" for d in documents] if scoped else None,
+                include=["distances"]
+            )
+            found.append([int(chunk_id) for chunk_id in result["ids"][0]])
+        elapsed = time.perf_counter() - started
+        return recall(found, scoped_truth if scoped else truth, k), len(queries) / elapsed
+
+    unscoped_recall, unscoped_qps = measure(scoped=False)
+    scoped_recall, scoped_qps = measure(scoped=True)
+    rss, peak_rss = memory_usage_mb()
+    results.put({
+        "backend": backend,
+        "build_seconds": build_seconds,
+        "recall": unscoped_recall,
+        "qps": unscoped_qps,
+        "scoped_recall": scoped_recall,
+        "scoped_qps": scoped_qps,
+        "rss_mb": rss,
+        "peak_rss_mb": peak_rss
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare vector store backends")
+    parser.add_argument("--sizes", default="100000,1000000", help="Comma-separated corpus sizes")
+    parser.add_argument("--backends", default="chroma,mmap,mmap-ann,mmap-int8", help="Comma-separated backends")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension (all-MiniLM-L6-v2 is 384)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dtype", default="float32", help="mmap store dtype: float32 or float16")
+    parser.add_argument("--chunks-per-document", type=int, default=50)
+    parser.add_argument("--scoped-documents", type=int, default=3, help="Documents per scoped query")
+    parser.add_argument("--partitions", type=int, default=16, help="Buckets for +hash partitioned backends")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Chunks per upsert")
+    parser.add_argument("--workdir", default=None, help="Scratch directory (defaults to a temp dir)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="vector_store_benchmark_")
+    os.makedirs(workdir, exist_ok=True)
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    try:
+        for size in [int(value) for value in args.sizes.split(",")]:
+            print(f"Generating {size} x {args.dim} corpus...")
+            corpus = generate_corpus(os.path.join(workdir, "corpus.npy"), size, args.dim)
+            rng = np.random.default_rng(1)
+            queries = normalize(np.asarray(corpus[rng.integers(0, size, args.queries)]) + 0.05 * rng.standard_normal((args.queries, args.dim)).astype(np.float32))
+            documents = max(1, size // args.chunks_per_document)
+            scopes = rng.integers(0, documents, (args.queries, args.scoped_documents))
+
+            print("Computing exact neighbours...")
+            paths = {name: os.path.join(workdir, f"{name}.npy") for name in ("queries", "truth", "scoped_truth", "scopes")}
+            np.save(paths["queries"], queries)
+            np.save(paths["truth"], exact_top_k(corpus, queries, args.k))
+            scoped = np.empty(args.queries, dtype=object)
+            scoped[:] = scoped_top_k(corpus, queries, scopes, args.chunks_per_document, args.k)
+            np.save(paths["scoped_truth"], scoped, allow_pickle=True)
+            np.save(paths["scopes"], scopes)
+            del corpus
+
+            options = {
+                "corpus_path": os.path.join(workdir, "corpus.npy"),
+                "queries_path": paths["queries"],
+                "truth_path": paths["truth"],
+                "scoped_truth_path": paths["scoped_truth"],
+                "scopes_path": paths["scopes"],
+                "k": args.k,
+                "dtype": args.dtype,
+                "chunks_per_document": args.chunks_per_document,
+                "batch_size": args.batch_size,
+                "partitions": args.partitions,
+                "workdir": workdir
+            }
+            for backend in args.backends.split(","):
+                print(f"Running {backend} at {size} chunks...")
+                results = context.Queue()
+                process = context.Process(target=run_backend, args=(backend, options, results))
+                process.start()
+                process.join()
+                if process.exitcode != 0:
+                    print(f"{backend} failed with exit code {process.exitcode}")
+                    continue
+                rows.append(dict(results.get(), size=size))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print()
+    print(f"{'size':>9} {'backend':>14} {'build_s':>8} {'recall@' + str(args.k):>9} {'qps':>8} "
+          f"{'scoped_recall':>13} {'scoped_qps':>10} {'rss_mb':>8} {'peak_mb':>8}")
+    for row in rows:
+        print(
+            f"{row['size']:>9} {row['backend']:>14} {row['build_seconds']:>8.1f} {row['recall']:>9.3f} {row['qps']:>8.1f} "
+            f"{row['scoped_recall']:>13.3f} {row['scoped_qps']:>10.1f} {row['rss_mb']:>8.0f} {row['peak_rss_mb']:>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 import os
 from dotenv import load_dotenv
-from typing import Optional
 
 load_dotenv()
 
@@ -11,9 +10,62 @@ class Settings:
     AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
     AWS_SQS_QUEUE_URL = os.getenv("AWS_SQS_QUEUE_URL")
     AWS_S3_BUCKET = os.getenv("AWS_S3_BUCKET")
+    # Custom endpoints for a local stand-in (moto server, localstack); the per-service URLs override it
+    AWS_ENDPOINT_URL = os.getenv("AWS_ENDPOINT_URL") or None
+    AWS_S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL") or None
+    AWS_SQS_ENDPOINT_URL = os.getenv("AWS_SQS_ENDPOINT_URL") or None
+    # "path" is usually needed with a local endpoint
+    S3_ADDRESSING_STYLE = os.getenv("S3_ADDRESSING_STYLE", "auto")
+    # Connections per shared boto3 client (one client per service per process) and retry attempts
+    AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+    AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "5"))
 
     # SQS Configuration
     MAX_SQS_ATTEMPTS = int(os.getenv("MAX_SQS_ATTEMPTS", "3"))
+    # Visibility timeout applied to in-flight messages, re-extended every heartbeat while a document is processed
+    SQS_VISIBILITY_TIMEOUT = int(os.getenv("SQS_VISIBILITY_TIMEOUT", "300"))
+    SQS_VISIBILITY_HEARTBEAT_SECONDS = int(os.getenv("SQS_VISIBILITY_HEARTBEAT_SECONDS", "60"))
+    # Processed messages are deleted in batches of up to 10, flushed at most SQS_DELETE_MAX_WAIT_MS after queuing
+    SQS_DELETE_MAX_WAIT_MS = float(os.getenv("SQS_DELETE_MAX_WAIT_MS", "500"))
+
+    # Worker concurrency: concurrent message handlers and processes for extraction/embedding (0 = threads)
+    WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "4"))
+    WORKER_PROCESS_POOL_SIZE = int(os.getenv("WORKER_PROCESS_POOL_SIZE", str(os.cpu_count() or 1)))
+    # Messages received ahead of free handlers (the next receive runs while the current ones are processed)
+    SQS_PREFETCH_MESSAGES = int(os.getenv("SQS_PREFETCH_MESSAGES", str(WORKER_CONCURRENCY)))
+
+    # Cross-document ingestion batching: chunks per embedding batch, max wait before a partial flush,
+    # and how many chunks may be queued before producers are paused
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+    INGEST_BATCH_MAX_WAIT_MS = float(os.getenv("INGEST_BATCH_MAX_WAIT_MS", "200"))
+    INGEST_MAX_PENDING_CHUNKS = int(os.getenv("INGEST_MAX_PENDING_CHUNKS", "1024"))
+
+    # PDFs are extracted in ranges of PDF_PAGES_PER_TASK pages across the process pool, with at most
+    # PDF_MAX_PENDING_RANGES ranges in flight or buffered per document
+    PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+    PDF_MAX_PENDING_RANGES = int(os.getenv("PDF_MAX_PENDING_RANGES", str(2 * max(1, WORKER_PROCESS_POOL_SIZE))))
+
+    # Chunking: chunk size and sentence overlap in embedding-model tokens (all-MiniLM-L6-v2 truncates
+    # at 256 tokens including 2 special tokens). CHUNK_TOKENIZER "auto" counts with the model's fast
+    # tokenizer; "heuristic" (or a missing tokenizer) estimates CHUNK_CHARS_PER_TOKEN characters per token
+    CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "250"))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+    CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "auto")
+    CHUNK_CHARS_PER_TOKEN = float(os.getenv("CHUNK_CHARS_PER_TOKEN", "3"))
+    # Stream documents from S3 instead of downloading them to temp files. Text and CSV are decoded
+    # as the bytes arrive; PDF/DOCX need random access and are buffered in memory up to
+    # S3_SPOOL_MEMORY_BYTES, in an anonymous temp file up to S3_SPOOL_MAX_BYTES, and read with ranged
+    # GETs of S3_RANGE_BLOCK_BYTES (caching S3_RANGE_CACHE_BLOCKS blocks) beyond that and for PDF page ranges
+    S3_STREAMING_INGEST = os.getenv("S3_STREAMING_INGEST", "true").lower() == "true"
+    S3_SPOOL_MEMORY_BYTES = int(os.getenv("S3_SPOOL_MEMORY_BYTES", str(32 * 1024 * 1024)))
+    S3_SPOOL_MAX_BYTES = int(os.getenv("S3_SPOOL_MAX_BYTES", str(256 * 1024 * 1024)))
+    S3_RANGE_BLOCK_BYTES = int(os.getenv("S3_RANGE_BLOCK_BYTES", str(1024 * 1024)))
+    S3_RANGE_CACHE_BLOCKS = int(os.getenv("S3_RANGE_CACHE_BLOCKS", "16"))
+    # Objects of at least S3_TRANSFER_THRESHOLD_BYTES are downloaded (and streamed) as parallel ranged
+    # GETs of S3_TRANSFER_PART_BYTES, S3_TRANSFER_MAX_CONCURRENCY at a time per process
+    S3_TRANSFER_THRESHOLD_BYTES = int(os.getenv("S3_TRANSFER_THRESHOLD_BYTES", str(16 * 1024 * 1024)))
+    S3_TRANSFER_PART_BYTES = int(os.getenv("S3_TRANSFER_PART_BYTES", str(8 * 1024 * 1024)))
+    S3_TRANSFER_MAX_CONCURRENCY = int(os.getenv("S3_TRANSFER_MAX_CONCURRENCY", "10"))
 
     # Ollama Configuration (free and open source)
     OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
@@ -21,10 +73,94 @@ class Settings:
     
     # Vector DB Configuration
     CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+    EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+    # Load the embedding model and vector store in the background right after startup
+    # (readiness waits for it) instead of on the first request that needs them
+    STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+    # gunicorn: load the embedding model in the master before forking so workers share its pages
+    PRELOAD_EMBEDDING_MODEL = os.getenv("PRELOAD_EMBEDDING_MODEL", "false").lower() == "true"
+    # Vector store backend: "chroma" or "mmap" (memory-mapped matrix with NumPy brute force,
+    # plus an hnswlib/FAISS graph for unscoped queries once the store reaches VECTOR_STORE_ANN_THRESHOLD)
+    VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+    VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "./vector_store")
+    VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float32")
+    VECTOR_STORE_ANN = os.getenv("VECTOR_STORE_ANN", "auto")
+    VECTOR_STORE_ANN_THRESHOLD = int(os.getenv("VECTOR_STORE_ANN_THRESHOLD", "50000"))
+    VECTOR_STORE_HNSW_M = int(os.getenv("VECTOR_STORE_HNSW_M", "16"))
+    VECTOR_STORE_HNSW_EF_CONSTRUCTION = int(os.getenv("VECTOR_STORE_HNSW_EF_CONSTRUCTION", "200"))
+    VECTOR_STORE_HNSW_EF_SEARCH = int(os.getenv("VECTOR_STORE_HNSW_EF_SEARCH", "64"))
+    # Optional int8 scalar quantization of the mmap store: scans use 1-byte codes and the best
+    # n_results * VECTOR_STORE_RESCORE_MULTIPLIER candidates are rescored with the float vectors.
+    # VECTOR_STORE_ANN=auto builds no graph for int8 stores (it would hold float32 vectors in RAM)
+    VECTOR_STORE_QUANTIZATION = os.getenv("VECTOR_STORE_QUANTIZATION", "none")
+    VECTOR_STORE_RESCORE_MULTIPLIER = int(os.getenv("VECTOR_STORE_RESCORE_MULTIPLIER", "4"))
+    # Partitioning by documentId: "none", "hash" (VECTOR_STORE_PARTITIONS buckets) or "document" (one per
+    # document, plus a global partition for unscoped queries)
+    VECTOR_STORE_PARTITION_MODE = os.getenv("VECTOR_STORE_PARTITION_MODE", "none")
+    VECTOR_STORE_PARTITIONS = int(os.getenv("VECTOR_STORE_PARTITIONS", "16"))
+    # Partitions kept open (least recently used ones are closed) and how long the partition list
+    # (and partitions found missing) are cached
+    VECTOR_STORE_MAX_OPEN_PARTITIONS = int(os.getenv("VECTOR_STORE_MAX_OPEN_PARTITIONS", "128"))
+    VECTOR_STORE_PARTITION_LIST_TTL_SECONDS = float(os.getenv("VECTOR_STORE_PARTITION_LIST_TTL_SECONDS", "5"))
+    # Hybrid retrieval: BM25 inverted index fused with vector results via reciprocal rank fusion
+    HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "false").lower() == "true"
+    HYBRID_CANDIDATE_MULTIPLIER = int(os.getenv("HYBRID_CANDIDATE_MULTIPLIER", "4"))
+    HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+    LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(CHROMA_PERSIST_DIRECTORY, "lexical_index.sqlite3"))
+    LEXICAL_MAX_DF_RATIO = float(os.getenv("LEXICAL_MAX_DF_RATIO", "0.5"))
+    # Cross-encoder reranking: candidates fetched, batch size and latency budget before falling back to vector order
+    RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+    RERANK_MODEL_NAME = os.getenv("RERANK_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "500"))
+    # Prompt context packing: token budget (with per-model overrides as "model:tokens,..."),
+    # characters per estimated token and near-duplicate detection
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+    CONTEXT_TOKEN_BUDGETS = os.getenv("CONTEXT_TOKEN_BUDGETS", "")
+    CONTEXT_CHARS_PER_TOKEN = int(os.getenv("CONTEXT_CHARS_PER_TOKEN", "4"))
+    CONTEXT_SHINGLE_SIZE = int(os.getenv("CONTEXT_SHINGLE_SIZE", "5"))
+    CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.8"))
+    # Page size for scanning the collection (/stats, /export) and how long /stats results are reused
+    STATS_PAGE_SIZE = int(os.getenv("STATS_PAGE_SIZE", "5000"))
+    STATS_CACHE_SECONDS = float(os.getenv("STATS_CACHE_SECONDS", "60"))
+
+    # Retrieval Configuration (embedding + vector search run off the event loop)
+    RETRIEVAL_MAX_WORKERS = int(os.getenv("RETRIEVAL_MAX_WORKERS", "4"))
+    RETRIEVAL_MAX_CONCURRENCY = int(os.getenv("RETRIEVAL_MAX_CONCURRENCY", "16"))
+
+    # Query embedding micro-batching
+    EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+    EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+
+    # Query embedding cache (0 disables; TTL of 0 means entries never expire)
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+    QUERY_EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", "0"))
+
+    # Answer cache: "memory", "sqlite" (shared across workers, survives restarts) or "none"
+    ANSWER_CACHE_BACKEND = os.getenv("ANSWER_CACHE_BACKEND", "memory")
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+    ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "0"))
+    # /ask/batch: max questions per request and concurrent LLM generations per batch
+    ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "1000"))
+    ASK_BATCH_LLM_CONCURRENCY = int(os.getenv("ASK_BATCH_LLM_CONCURRENCY", "4"))
+    # /search: max offset + limit per query and max queries per /search/batch request
+    SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "100"))
+    SEARCH_BATCH_MAX_QUERIES = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "1000"))
+    # Max hits fetched per query while refilling a page that max_distance/min_score thinned out
+    SEARCH_MAX_FETCH = int(os.getenv("SEARCH_MAX_FETCH", "1000"))
+    # SQLite file for the on-disk answer cache and per-document version counters
+    CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", os.path.join(CHROMA_PERSIST_DIRECTORY, "rag_cache.sqlite3"))
     
     # Service Authentication
     NEST_SERVICE_ID: str = os.getenv("NEST_SERVICE_ID", "python-rag-service")
     NEST_SERVICE_SECRET: str = os.getenv("NEST_SERVICE_SECRET", "test-secret")
     NEST_API_BASE_URL: str = os.getenv("NEST_API_BASE_URL", "http://localhost:3001")
 
+    # Shared HTTP client pools (Ollama and NestJS API)
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+    HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
 settings = Settings()
@@ -0,0 +1,30 @@
+"""
+gunicorn settings for serving the API with several worker processes:
+
+    gunicorn main:app -c gunicorn.conf.py
+
+The worker count comes from WEB_CONCURRENCY (gunicorn's own default). With
+PRELOAD_EMBEDDING_MODEL=true the embedding model is loaded once in the master
+before the workers are forked, so they share its weights copy-on-write instead
+of each loading a copy. Only the model is preloaded: the vector store, SQLite
+connections and thread pools are still opened inside each worker.
+"""
+
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import settings
+
+bind = "0.0.0.0:8000"
+worker_class = "uvicorn.workers.UvicornWorker"
+# Workers start listening before the warm-up, so they never need a long boot timeout
+timeout = 120
+
+def on_starting(server):
+    if settings.PRELOAD_EMBEDDING_MODEL:
+        # Loading only: running inference here would start torch threads that don't survive fork
+        from services.vector_db_service import load_embedding_model
+        load_embedding_model()
@@ -1,24 +1,83 @@
+import time
+# Startup time is measured from the first import of this module
+STARTUP_STARTED = time.perf_counter()
+
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import logging
-from typing import List, Dict, Any
+import json
+from typing import List, Dict, Any, Optional, Tuple
 import uvicorn
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
 from config import settings
 from services.vector_db_service import VectorDBService
-from services.llm_service import LLMService
+from services.retrieval_service import RetrievalService
+from services.llm_service import LLMService, LLMServiceError
+from services.answer_cache import AnswerCache
 from services.nest_api_service import NestAPIService
+from services.metrics import metrics
+from services.http_clients import http_clients, OLLAMA_CLIENT, NEST_API_CLIENT
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Readiness: set once the warm-up has loaded the models and opened the vector store
+startup_state: Dict[str, Any] = {"ready": False, "error": None, "startup_seconds": None, "timings": {}}
+
+async def warm_up():
+    """
+    Load the embedding model, vector store and reranker in the background, so the
+    server accepts connections (and answers liveness probes) while they load
+    """
+    try:
+        timings = await retrieval_service.run(vector_db_service.load)
+        if retrieval_service.reranker:
+            # Load the cross-encoder up front so the first requests don't spend their budget on it
+            started = time.perf_counter()
+            await retrieval_service.run(retrieval_service.reranker.load)
+            timings["reranker"] = time.perf_counter() - started
+        startup_seconds = time.perf_counter() - STARTUP_STARTED
+        for stage, seconds in timings.items():
+            metrics.observe(f"startup.{stage}_seconds", seconds)
+        metrics.observe("startup.ready_seconds", startup_seconds)
+        startup_state.update(ready=True, startup_seconds=round(startup_seconds, 3), timings={
+            stage: round(seconds, 3) for stage, seconds in timings.items()
+        })
+        stage_summary = ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in timings.items())
+        logger.info(f"Ready {startup_seconds:.2f}s after startup ({stage_summary})")
+    except Exception as e:
+        startup_state["error"] = str(e)
+        logger.error(f"Error warming up services: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    http_clients.start(OLLAMA_CLIENT, NEST_API_CLIENT)
+    listen_seconds = time.perf_counter() - STARTUP_STARTED
+    metrics.observe("startup.listen_seconds", listen_seconds)
+    logger.info(f"Accepting requests {listen_seconds:.2f}s after startup")
+    warm_up_task = None
+    if settings.STARTUP_WARMUP:
+        warm_up_task = asyncio.create_task(warm_up())
+    else:
+        # Models and the vector store load on the first request that needs them
+        startup_state.update(ready=True, startup_seconds=round(listen_seconds, 3))
+    yield
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+    await retrieval_service.shutdown()
+    await http_clients.close()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="RAG Backend API",
     description="RAG-based question answering system with vector database",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -32,8 +91,10 @@ app.add_middleware(
 
 # Initialize services
 vector_db_service = VectorDBService()
+retrieval_service = RetrievalService(vector_db_service)
 llm_service = LLMService()
 nest_api_service = NestAPIService()
+answer_cache = AnswerCache()
 
 # Pydantic models
 class QuestionRequest(BaseModel):
@@ -41,6 +102,32 @@ class QuestionRequest(BaseModel):
     max_context_results: int = 5
     file_id: List[str] = None  # Optional: limit search to specific file
 
+class BatchQuestionRequest(BaseModel):
+    questions: List[QuestionRequest]
+
+class SearchRequest(BaseModel):
+    query: str
+    file_id: List[str] = None  # Optional: limit search to specific files
+    limit: int = 5
+    offset: int = 0
+    max_distance: Optional[float] = None  # Drop hits farther than this cosine distance
+    min_score: Optional[float] = None  # Drop hits scoring lower (rerank score, else 1 - distance)
+    fields: List[str] = ["document", "metadata"]  # Returned per hit besides id, distance and score
+
+class BatchSearchRequest(BaseModel):
+    queries: List[SearchRequest]
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[Dict[str, Any]]
+    offset: int
+    limit: int
+    has_more: bool  # Exact unless the thresholds drop hits past SEARCH_MAX_FETCH candidates
+
+class BatchSearchResponse(BaseModel):
+    results: List[SearchResponse]
+    elapsed_seconds: float
+
 class QuestionResponse(BaseModel):
     answer: str
     context_used: List[Dict[str, Any]]
@@ -51,6 +138,8 @@ class HealthResponse(BaseModel):
     status: str
     vector_db_status: str
     timestamp: str
+    startup_seconds: Optional[float] = None
+    startup_timings: Dict[str, float] = {}
 
 @app.get("/", response_model=Dict[str, str])
 async def root():
@@ -59,6 +148,80 @@ async def root():
     """
     return {"message": "RAG Backend API is running"}
 
+@app.get("/health/live")
+async def health_live():
+    """
+    Liveness: the process is up and serving requests, even while models are still loading
+    """
+    return {
+        "status": "alive",
+        "uptime_seconds": round(time.perf_counter() - STARTUP_STARTED, 3),
+        "timestamp": datetime.utcnow().isoformat() + "Z"
+    }
+
+@app.get("/health/ready", response_model=HealthResponse)
+async def health_ready():
+    """
+    Readiness: 200 once the warm-up has finished, 503 while starting or if it failed
+    """
+    if startup_state["ready"]:
+        status, vector_db_status = "ready", "loaded" if vector_db_service.is_loaded else "lazy"
+    elif startup_state["error"]:
+        status, vector_db_status = "unhealthy", f"error: {startup_state['error']}"
+    else:
+        status, vector_db_status = "starting", "loading"
+    response = HealthResponse(
+        status=status,
+        vector_db_status=vector_db_status,
+        timestamp=datetime.utcnow().isoformat() + "Z",
+        startup_seconds=startup_state["startup_seconds"],
+        startup_timings=startup_state["timings"]
+    )
+    return JSONResponse(status_code=200 if startup_state["ready"] else 503, content=response.model_dump())
+
+@app.get("/health", response_model=HealthResponse)
+async def health():
+    """
+    Health check endpoint (same as /health/ready)
+    """
+    return await health_ready()
+
+NO_CONTEXT_ANSWER = "I couldn't find any relevant information to answer your question. Please try rephrasing or ask about a different topic."
+
+def make_answer_cache_key(request: QuestionRequest) -> Optional[str]:
+    """
+    Answer cache key for a question, including the current versions of the documents in scope
+    """
+    return answer_cache.make_key(
+        request.question,
+        request.file_id,
+        request.max_context_results,
+        llm_service.model,
+        llm_service.prompt_template_version
+    )
+
+async def get_answer_cache_key(request: QuestionRequest) -> Optional[str]:
+    return await asyncio.to_thread(make_answer_cache_key, request)
+
+async def generate_answer(question: str, context_results: List[Dict[str, Any]], cache_key: Optional[str]) -> Tuple[str, bool]:
+    """
+    LLM answer for the retrieved context, cached on success.
+    Returns (answer, ok); LLM errors are returned as the answer text and never cached.
+    """
+    if not context_results:
+        logger.warning("No relevant context found for the question")
+        return NO_CONTEXT_ANSWER, True
+    try:
+        answer = await llm_service.generate_answer(question, context_results, raise_errors=True)
+    except LLMServiceError as e:
+        return str(e), False
+    await asyncio.to_thread(
+        answer_cache.put,
+        cache_key,
+        {"answer": answer, "context_used": context_results}
+    )
+    return answer, True
+
 @app.post("/ask", response_model=QuestionResponse)
 async def ask_question(request: QuestionRequest):
     """
@@ -67,27 +230,29 @@ async def ask_question(request: QuestionRequest):
     try:
         logger.info(f"Processing question: {request.question[:100]}...")
         
-        # Get relevant context from vector database
-        context_results = vector_db_service.search_similar(
-            query=request.question,
-            documentsId = request.file_id, # search within specific files if provided
-            n_results=request.max_context_results,
-        )
-        
-        if not context_results:
-            logger.warning("No relevant context found for the question")
+        # Serve repeated questions over an unchanged document scope from the answer cache
+        cache_key = await get_answer_cache_key(request)
+        cached = await asyncio.to_thread(answer_cache.get, cache_key)
+        if cached is not None:
+            logger.info(f"Answer cache hit for question: {request.question[:50]}...")
             return QuestionResponse(
-                answer="I couldn't find any relevant information to answer your question. Please try rephrasing or ask about a different topic.",
-                context_used=[],
+                answer=cached["answer"],
+                context_used=cached["context_used"],
                 question=request.question,
                 timestamp=datetime.utcnow().isoformat() + "Z"
             )
         
+        # Get relevant context from vector database (off the event loop)
+        context_results = await retrieval_service.search_similar(
+            query=request.question,
+            documentsId = request.file_id, # search within specific files if provided
+            n_results=request.max_context_results,
+        )
+        
         # Generate answer using LLM with retrieved context
-        answer = await llm_service.generate_answer(request.question, context_results)
+        answer, _ = await generate_answer(request.question, context_results, cache_key)
         
         # Prepare response
-        from datetime import datetime
         response = QuestionResponse(
             answer=answer,
             context_used=context_results,
@@ -105,6 +270,327 @@ async def ask_question(request: QuestionRequest):
             detail=f"Internal server error: {str(e)}"
         )
 
+@app.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    """
+    Ask a question and stream the answer as NDJSON events:
+    a "context" event with the retrieved context, "token" events as Ollama
+    generates them, then a final "done" (or "error") event with metadata.
+    """
+    try:
+        logger.info(f"Processing streaming question: {request.question[:100]}...")
+        started = time.perf_counter()
+        
+        cache_key = await get_answer_cache_key(request)
+        cached = await asyncio.to_thread(answer_cache.get, cache_key)
+        if cached is not None:
+            context_results = cached["context_used"]
+        else:
+            context_results = await retrieval_service.search_similar(
+                query=request.question,
+                documentsId=request.file_id,
+                n_results=request.max_context_results,
+            )
+    except Exception as e:
+        logger.error(f"Error processing streaming question: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
+        )
+    
+    def event(payload: Dict[str, Any]) -> str:
+        return json.dumps(payload) + "\n"
+    
+    async def event_stream():
+        yield event({
+            "type": "context",
+            "question": request.question,
+            "context_used": context_results
+        })
+        
+        tokens = []
+        status = "completed"
+        try:
+            if cached is not None:
+                tokens.append(cached["answer"])
+                yield event({"type": "token", "token": cached["answer"]})
+            elif not context_results:
+                logger.warning("No relevant context found for the question")
+                tokens.append(NO_CONTEXT_ANSWER)
+                yield event({"type": "token", "token": NO_CONTEXT_ANSWER})
+            else:
+                async for token in llm_service.stream_answer(request.question, context_results):
+                    tokens.append(token)
+                    yield event({"type": "token", "token": token})
+                await asyncio.to_thread(
+                    answer_cache.put,
+                    cache_key,
+                    {"answer": "".join(tokens).strip(), "context_used": context_results}
+                )
+        except LLMServiceError as e:
+            status = "error"
+            yield event({"type": "error", "message": str(e)})
+        
+        yield event({
+            "type": "done",
+            "status": status,
+            "question": request.question,
+            "model": llm_service.model,
+            "cached": cached is not None,
+            "context_count": len(context_results),
+            "token_count": len(tokens),
+            "elapsed_seconds": round(time.perf_counter() - started, 3),
+            "timestamp": datetime.utcnow().isoformat() + "Z"
+        })
+    
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+@app.post("/ask/batch")
+async def ask_question_batch(request: BatchQuestionRequest):
+    """
+    Answer many questions in one call. Retrieval is batched (one encode call, one vector
+    query per document scope) and LLM generations run with bounded concurrency. Results
+    are streamed as NDJSON "answer" events in completion order, each carrying the
+    question's index, followed by a "done" event.
+    """
+    questions = request.questions
+    if not questions:
+        raise HTTPException(status_code=400, detail="questions must not be empty")
+    if len(questions) > settings.ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.ASK_BATCH_MAX_QUESTIONS} questions per batch"
+        )
+    
+    try:
+        logger.info(f"Processing batch of {len(questions)} questions")
+        started = time.perf_counter()
+        
+        def lookup_cached_answers():
+            cache_keys = [make_answer_cache_key(question) for question in questions]
+            return cache_keys, [answer_cache.get(cache_key) for cache_key in cache_keys]
+        
+        cache_keys, cached = await asyncio.to_thread(lookup_cached_answers)
+        pending = [i for i, entry in enumerate(cached) if entry is None]
+        contexts = []
+        if pending:
+            contexts = await retrieval_service.search_batch(
+                [questions[i].question for i in pending],
+                [questions[i].file_id for i in pending],
+                [questions[i].max_context_results for i in pending]
+            )
+    except Exception as e:
+        logger.error(f"Error processing question batch: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
+        )
+    
+    def event(index: int, answer: str, context_results: List[Dict[str, Any]], status: str, is_cached: bool) -> str:
+        return json.dumps({
+            "type": "answer",
+            "index": index,
+            "question": questions[index].question,
+            "answer": answer,
+            "context_used": context_results,
+            "status": status,
+            "cached": is_cached,
+            "timestamp": datetime.utcnow().isoformat() + "Z"
+        }) + "\n"
+    
+    async def event_stream():
+        semaphore = asyncio.Semaphore(settings.ASK_BATCH_LLM_CONCURRENCY)
+        
+        async def answer_question(index: int, context_results: List[Dict[str, Any]]):
+            async with semaphore:
+                answer, ok = await generate_answer(questions[index].question, context_results, cache_keys[index])
+            return index, answer, context_results, ok
+        
+        for index, entry in enumerate(cached):
+            if entry is not None:
+                yield event(index, entry["answer"], entry["context_used"], "completed", True)
+        
+        errors = 0
+        tasks = [asyncio.ensure_future(answer_question(index, context)) for index, context in zip(pending, contexts)]
+        try:
+            for next_answer in asyncio.as_completed(tasks):
+                index, answer, context_results, ok = await next_answer
+                errors += 0 if ok else 1
+                yield event(index, answer, context_results, "completed" if ok else "error", False)
+        finally:
+            # The client went away: stop generations that haven't finished
+            for task in tasks:
+                task.cancel()
+        
+        yield json.dumps({
+            "type": "done",
+            "count": len(questions),
+            "cached": len(questions) - len(pending),
+            "errors": errors,
+            "model": llm_service.model,
+            "elapsed_seconds": round(time.perf_counter() - started, 3),
+            "timestamp": datetime.utcnow().isoformat() + "Z"
+        }) + "\n"
+    
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+# Optional hit fields and the vector store fields they are read from
+SEARCH_FIELDS = {"document": "documents", "metadata": "metadatas"}
+
+def validate_search_request(request: SearchRequest):
+    unknown = [field for field in request.fields if field not in SEARCH_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields {unknown}; choose from {list(SEARCH_FIELDS)}"
+        )
+    if request.limit < 1 or request.offset < 0:
+        raise HTTPException(status_code=400, detail="limit must be positive and offset non-negative")
+    if request.offset + request.limit > settings.SEARCH_MAX_RESULTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"offset + limit must not exceed {settings.SEARCH_MAX_RESULTS}"
+        )
+
+def search_include(requests: List[SearchRequest]) -> List[str]:
+    """
+    Vector store fields needed by the requests; chunk text is only read when asked for
+    """
+    return [SEARCH_FIELDS[field] for field in SEARCH_FIELDS if any(field in request.fields for request in requests)]
+
+def search_score(result: Dict[str, Any]) -> Optional[float]:
+    distance = result.get('distance')
+    return result.get('rerank_score', 1.0 - distance if distance is not None else None)
+
+def passes_search_thresholds(request: SearchRequest, result: Dict[str, Any]) -> bool:
+    distance = result.get('distance')
+    score = search_score(result)
+    # Lexical-only hybrid hits have no vector distance and never pass a threshold
+    if request.max_distance is not None and (distance is None or distance > request.max_distance):
+        return False
+    if request.min_score is not None and (score is None or score < request.min_score):
+        return False
+    return True
+
+def filter_search_hits(request: SearchRequest, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Apply the score thresholds and project the requested fields
+    """
+    hits = []
+    for result in results:
+        if not passes_search_thresholds(request, result):
+            continue
+        hit = {"id": result['id'], "distance": result.get('distance'), "score": search_score(result)}
+        for field in request.fields:
+            hit[field] = result.get(field)
+        hits.append(hit)
+    return hits
+
+def next_search_fetch(request: SearchRequest, results: List[Dict[str, Any]], hits: List[Dict[str, Any]], n_results: int) -> Optional[int]:
+    """
+    A larger n_results when the thresholds left fewer than offset + limit + 1 hits and deeper
+    hits could still pass, None once the page and has_more are settled
+    """
+    if len(hits) > request.offset + request.limit or len(results) < n_results:
+        return None
+    if n_results >= settings.SEARCH_MAX_FETCH:
+        return None
+    # Plain vector results come nearest first: once one fails the thresholds, all deeper ones do
+    ordered_by_distance = not settings.HYBRID_SEARCH_ENABLED and not retrieval_service.reranker
+    if ordered_by_distance and results and not passes_search_thresholds(request, results[-1]):
+        return None
+    return min(n_results * 2, settings.SEARCH_MAX_FETCH)
+
+def format_search_response(request: SearchRequest, hits: List[Dict[str, Any]]) -> SearchResponse:
+    """
+    Cut out the requested page of the filtered hits
+    """
+    end = request.offset + request.limit
+    return SearchResponse(
+        query=request.query,
+        results=hits[request.offset:end],
+        offset=request.offset,
+        limit=request.limit,
+        has_more=len(hits) > end
+    )
+
+@app.post("/search", response_model=SearchResponse)
+async def search(request: SearchRequest):
+    """
+    Retrieval only: the top-k chunks for a query, without calling the LLM
+    """
+    validate_search_request(request)
+    try:
+        logger.info(f"Processing search: {request.query[:100]}...")
+        # One extra hit tells whether another page exists
+        n_results = request.offset + request.limit + 1
+        while True:
+            results = await retrieval_service.search_similar(
+                query=request.query,
+                documentsId=request.file_id,
+                n_results=n_results,
+                include=search_include([request])
+            )
+            hits = filter_search_hits(request, results)
+            n_results = next_search_fetch(request, results, hits, n_results)
+            if n_results is None:
+                return format_search_response(request, hits)
+    except Exception as e:
+        logger.error(f"Error processing search: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
+        )
+
+@app.post("/search/batch", response_model=BatchSearchResponse)
+async def search_batch(request: BatchSearchRequest):
+    """
+    Retrieval only for many queries: one encode call and one vector query per document scope
+    """
+    queries = request.queries
+    if not queries:
+        raise HTTPException(status_code=400, detail="queries must not be empty")
+    if len(queries) > settings.SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.SEARCH_BATCH_MAX_QUERIES} queries per batch"
+        )
+    for query in queries:
+        validate_search_request(query)
+    
+    try:
+        logger.info(f"Processing batch of {len(queries)} searches")
+        started = time.perf_counter()
+        include = search_include(queries)
+        hits: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        # Queries whose thresholds dropped hits are fetched again, deeper, until their page is full
+        pending = {i: query.offset + query.limit + 1 for i, query in enumerate(queries)}
+        while pending:
+            positions = list(pending)
+            results = await retrieval_service.search_batch(
+                [queries[i].query for i in positions],
+                [queries[i].file_id for i in positions],
+                [pending[i] for i in positions],
+                include=include
+            )
+            for i, result in zip(positions, results):
+                hits[i] = filter_search_hits(queries[i], result)
+                n_results = next_search_fetch(queries[i], result, hits[i], pending[i])
+                if n_results is None:
+                    del pending[i]
+                else:
+                    pending[i] = n_results
+        return BatchSearchResponse(
+            results=[format_search_response(query, query_hits) for query, query_hits in zip(queries, hits)],
+            elapsed_seconds=round(time.perf_counter() - started, 3)
+        )
+    except Exception as e:
+        logger.error(f"Error processing search batch: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
+        )
+
 # Only for development/testing purposes
 @app.get("/stats")
 async def get_stats():
@@ -112,7 +598,9 @@ async def get_stats():
     Get statistics about the vector database
     """
     try:
-        stats = vector_db_service.get_collection_stats()
+        # A stats rescan pages through all metadata: keep it off the retrieval executor so it
+        # can't hold threads that queries need
+        stats = await asyncio.to_thread(vector_db_service.get_collection_stats)
         
         return {
             "vector_database": stats,
@@ -125,6 +613,33 @@ async def get_stats():
             detail=f"Error retrieving statistics: {str(e)}"
         )
 
+# Only for development/testing purposes
+@app.get("/export")
+async def export_chunks(offset: int = 0, limit: Optional[int] = None, include_text: bool = False):
+    """
+    Stream stored chunks as NDJSON (one {"id", "metadata"[, "document"]} object per line),
+    paging through the collection instead of loading it all at once
+    """
+    if offset < 0 or (limit is not None and limit < 0):
+        raise HTTPException(status_code=400, detail="offset and limit must be non-negative")
+    
+    def chunk_stream():
+        for chunk in vector_db_service.iter_chunks(offset=offset, limit=limit, include_documents=include_text):
+            yield json.dumps(chunk) + "\n"
+    
+    # Starlette iterates sync generators in its threadpool, so paging doesn't block the loop
+    return StreamingResponse(chunk_stream(), media_type="application/x-ndjson")
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    In-process performance metrics (embedding batching, caches, stage timings)
+    """
+    return {
+        "metrics": metrics.snapshot(),
+        "timestamp": datetime.utcnow().isoformat() + "Z"
+    }
+
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Script to re-encode the vector collection into an mmap vector store (optionally
+float16 or int8-quantized, optionally partitioned by documentId) and report the
+recall loss against the source embeddings
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import settings
+from services.mmap_vector_store import MmapVectorStore
+from services.partitioned_vector_store import PARTITION_MODES, open_partitioned_store
+from services.vector_store import ChromaVectorStore
+
+def open_source(backend: str, path: str):
+    if backend == "chroma":
+        return ChromaVectorStore(path=path or settings.CHROMA_PERSIST_DIRECTORY)
+    if backend == "mmap":
+        return MmapVectorStore(path=path or settings.VECTOR_STORE_PATH, ann="none")
+    raise ValueError(f"Unknown source backend: {backend}")
+
+def iter_pages(store, include: list, page_size: int):
+    offset = 0
+    while True:
+        page = store.get(include=include, limit=page_size, offset=offset)
+        if not page['ids']:
+            break
+        yield page
+        offset += len(page['ids'])
+
+def normalize(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def recall(found: list, expected: list) -> float:
+    hits = sum(len(set(f) & set(e)) for f, e in zip(found, expected))
+    return hits / float(sum(len(e) for e in expected) or 1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-encode the vector collection into an mmap vector store")
+    parser.add_argument("--source-backend", default=settings.VECTOR_STORE_BACKEND, help="chroma or mmap")
+    parser.add_argument("--source-path", default=None, help="Defaults to CHROMA_PERSIST_DIRECTORY / VECTOR_STORE_PATH")
+    parser.add_argument("--target-path", required=True, help="Directory of the new store (must not exist yet)")
+    parser.add_argument("--target-backend", default="mmap", help="mmap, or chroma together with --partition-mode")
+    parser.add_argument("--partition-mode", default="none", help="none, hash or document (see VECTOR_STORE_PARTITION_MODE)")
+    parser.add_argument("--dtype", default="float32", help="Stored float vectors: float32 or float16")
+    parser.add_argument("--quantization", default="int8", help="none or int8")
+    parser.add_argument("--queries", type=int, default=200, help="Stored chunks used as recall queries")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=settings.STATS_PAGE_SIZE)
+    args = parser.parse_args()
+
+    if os.path.exists(args.target_path) and os.listdir(args.target_path):
+        sys.exit(f"Target {args.target_path} is not empty")
+    if args.partition_mode != "none" and args.partition_mode not in PARTITION_MODES:
+        sys.exit(f"Unknown partition mode: {args.partition_mode}")
+    if args.target_backend not in ("mmap", "chroma") or (args.target_backend == "chroma" and args.partition_mode == "none"):
+        sys.exit("The target backend must be mmap, or chroma with --partition-mode")
+
+    source = open_source(args.source_backend, args.source_path)
+    store_options = dict(dtype=args.dtype, ann="none", quantization=args.quantization) if args.target_backend == "mmap" else {}
+    if args.partition_mode != "none":
+        target = open_partitioned_store(args.target_backend, args.target_path, mode=args.partition_mode, **store_options)
+    else:
+        target = MmapVectorStore(path=args.target_path, **store_options)
+    quantized = args.target_backend == "mmap" and args.quantization == "int8"
+    total = source.count()
+    if not total:
+        sys.exit("Source collection is empty")
+    sample = set(np.random.default_rng(0).choice(total, min(args.queries, total), replace=False).tolist())
+
+    # Pass 1: copy every chunk and keep the sampled embeddings as queries
+    print(f"Copying {total} chunks from {args.source_backend} into {args.target_path}...")
+    started = time.perf_counter()
+    query_ids, queries = [], []
+    position = 0
+    for page in iter_pages(source, ["documents", "metadatas", "embeddings"], args.page_size):
+        embeddings = np.asarray(page['embeddings'], dtype=np.float32)
+        target.upsert(page['ids'], embeddings, page['documents'], page['metadatas'])
+        for i, chunk_id in enumerate(page['ids']):
+            if position + i in sample:
+                query_ids.append(chunk_id)
+                queries.append(embeddings[i])
+        position += len(page['ids'])
+        print(f"  {position}/{total}")
+    print(f"Copied {position} chunks in {time.perf_counter() - started:.1f}s")
+    queries = normalize(queries)
+
+    # Pass 2: exact float32 neighbours over the source embeddings (the query chunk itself is excluded)
+    print("Computing exact neighbours over the source embeddings...")
+    best_ids = np.empty((len(queries), 0), dtype=object)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    for page in iter_pages(source, ["embeddings"], args.page_size):
+        scores = (normalize(page['embeddings']) @ queries.T).T
+        ids = np.broadcast_to(np.array(page['ids'], dtype=object), scores.shape)
+        best_scores = np.concatenate([best_scores, scores], axis=1)
+        best_ids = np.concatenate([best_ids, ids], axis=1)
+        keep = np.argsort(-best_scores, axis=1)[:, :args.k + 1]
+        best_scores = np.take_along_axis(best_scores, keep, axis=1)
+        best_ids = np.take_along_axis(best_ids, keep, axis=1)
+    expected = [[chunk_id for chunk_id in row if chunk_id != own][:args.k] for row, own in zip(best_ids, query_ids)]
+
+    def evaluate(rescore_multiplier: int = None):
+        # Partitioned targets keep the multiplier their partitions were opened with
+        if rescore_multiplier is not None:
+            target.rescore_multiplier = rescore_multiplier
+        found = []
+        started = time.perf_counter()
+        for query, own in zip(queries, query_ids):
+            result = target.query([query.tolist()], args.k + 1, include=["distances"])
+            found.append([chunk_id for chunk_id in result['ids'][0] if chunk_id != own][:args.k])
+        return recall(found, expected), len(queries) / (time.perf_counter() - started)
+
+    dim = queries.shape[1]
+    print()
+    if args.target_backend == "mmap":
+        scan_bytes = dim if quantized else dim * np.dtype(args.dtype).itemsize
+        print(f"Vectors: {position} x {dim}, stored as {args.dtype}, quantization {args.quantization}")
+        print(f"Scanned bytes per vector: {scan_bytes} (float32: {dim * 4}, {dim * 4 / scan_bytes:.1f}x smaller)")
+    if args.partition_mode != "none":
+        print(f"Partitioned by documentId ({args.partition_mode} mode)")
+    print(f"Store size on disk: {target.size_bytes() / 1e6:.1f} MB")
+    partitioned = args.partition_mode != "none"
+    if quantized and not partitioned:
+        recall_raw, qps_raw = evaluate(1)
+        print(f"recall@{args.k} without rescoring: {recall_raw:.4f} ({qps_raw:.1f} queries/s)")
+    recall_rescored, qps_rescored = evaluate(None if partitioned else settings.VECTOR_STORE_RESCORE_MULTIPLIER)
+    if quantized:
+        label = f"with rescoring x{settings.VECTOR_STORE_RESCORE_MULTIPLIER}"
+    else:
+        label = "chroma HNSW search" if args.target_backend == "chroma" else "exact search"
+    print(f"recall@{args.k} {label}: {recall_rescored:.4f} ({qps_rescored:.1f} queries/s)")
+    print(f"recall loss vs float32 baseline: {1.0 - recall_rescored:.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+"""
+Script to (re)build the BM25 lexical index from the existing vector collection
+"""
+
+import sys
+import os
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.vector_db_service import VectorDBService
+
+if __name__ == "__main__":
+    print("Rebuilding lexical index from the vector collection...")
+    indexed = VectorDBService().rebuild_lexical_index()
+    print(f"Indexed {indexed} chunks")
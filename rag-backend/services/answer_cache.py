@@ -0,0 +1,206 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from config import settings
+from services.cache import LRUCache, normalize_query
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Version row bumped on every document change; used for questions without a document scope
+GLOBAL_SCOPE = "*"
+
+# SQLite host parameter limit is 999 on older builds
+SQL_BATCH = 500
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(db_path, timeout=30.0, check_same_thread=False, isolation_level=None)
+    # WAL lets the API workers read while the ingestion worker writes
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+class DocumentVersionStore:
+    """
+    Per-document version counters shared by the ingestion worker and every API worker.
+    Always SQLite-backed, because the writer (worker) and readers (API) are separate processes.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or settings.CACHE_DB_PATH
+        self._lock = threading.Lock()
+        self._connection = _connect(self.db_path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS document_versions ("
+            "document_id TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+        )
+
+    def bump(self, documentId: str):
+        """
+        Mark a document as changed (re-ingested or deleted)
+        """
+        with self._lock:
+            self._connection.executemany(
+                "INSERT INTO document_versions (document_id, version) VALUES (?, 1) "
+                "ON CONFLICT(document_id) DO UPDATE SET version = version + 1",
+                [(documentId,), (GLOBAL_SCOPE,)]
+            )
+        logger.info(f"Bumped document version for {documentId}")
+
+    def get_versions(self, documentIds: List[str]) -> Dict[str, int]:
+        if not documentIds:
+            return {}
+        versions = dict.fromkeys(documentIds, 0)
+        unique_ids = list(versions)
+        with self._lock:
+            for start in range(0, len(unique_ids), SQL_BATCH):
+                batch = unique_ids[start:start + SQL_BATCH]
+                placeholders = ",".join("?" for _ in batch)
+                versions.update(self._connection.execute(
+                    f"SELECT document_id, version FROM document_versions WHERE document_id IN ({placeholders})",
+                    batch
+                ).fetchall())
+        return versions
+
+class InMemoryAnswerCacheBackend:
+    """
+    Per-process LRU answer cache
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self._cache = LRUCache(max_size=max_size, ttl_seconds=ttl_seconds, name="answer_cache")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._cache.get(key)
+
+    def put(self, key: str, value: Dict[str, Any]):
+        self._cache.put(key, value)
+
+class SQLiteAnswerCacheBackend:
+    """
+    On-disk answer cache: survives restarts and is shared by all uvicorn workers on the host
+    """
+
+    def __init__(self, db_path: str, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._connection = _connect(db_path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS answer_cache ("
+            "cache_key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS answer_cache_last_access ON answer_cache (last_access)"
+        )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, created_at FROM answer_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl_seconds > 0 and row[1] + self.ttl_seconds < now:
+                self._connection.execute("DELETE FROM answer_cache WHERE cache_key = ?", (key,))
+                row = None
+            if row is not None:
+                self._connection.execute(
+                    "UPDATE answer_cache SET last_access = ? WHERE cache_key = ?", (now, key)
+                )
+        metrics.increment(f"answer_cache.{'hits' if row is not None else 'misses'}")
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO answer_cache (cache_key, value, created_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            # Evict least recently used entries beyond the size limit
+            self._connection.execute(
+                "DELETE FROM answer_cache WHERE cache_key IN ("
+                "SELECT cache_key FROM answer_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,)
+            )
+
+class AnswerCache:
+    """
+    Full /ask response cache keyed on (normalized question, document scope,
+    max_context_results, model, prompt template) plus the current version of
+    every document in scope, so re-ingesting or deleting a document
+    invalidates its answers automatically.
+    """
+
+    def __init__(self, backend: str = None):
+        backend = (backend or settings.ANSWER_CACHE_BACKEND).lower()
+        self.enabled = backend != "none" and settings.ANSWER_CACHE_SIZE > 0
+        self.version_store = DocumentVersionStore() if self.enabled else None
+        if not self.enabled:
+            self.backend = None
+        elif backend == "sqlite":
+            self.backend = SQLiteAnswerCacheBackend(
+                settings.CACHE_DB_PATH,
+                settings.ANSWER_CACHE_SIZE,
+                settings.ANSWER_CACHE_TTL_SECONDS
+            )
+        elif backend == "memory":
+            self.backend = InMemoryAnswerCacheBackend(
+                settings.ANSWER_CACHE_SIZE,
+                settings.ANSWER_CACHE_TTL_SECONDS
+            )
+        else:
+            raise ValueError(f"Unknown answer cache backend: {backend}")
+        logger.info(f"Answer cache backend: {backend if self.enabled else 'disabled'}")
+
+    def make_key(
+        self,
+        question: str,
+        documentsId: Optional[List[str]],
+        max_context_results: int,
+        model: str,
+        prompt_template_version: str
+    ) -> Optional[str]:
+        """
+        Build the cache key, including the current versions of the documents in scope
+        """
+        if not self.enabled:
+            return None
+        scope = sorted(set(documentsId or []))
+        versions = self.version_store.get_versions(scope or [GLOBAL_SCOPE])
+        key_parts = {
+            "question": normalize_query(question),
+            "scope": scope,
+            "versions": sorted(versions.items()),
+            "max_context_results": max_context_results,
+            "model": model,
+            "prompt_template": prompt_template_version
+        }
+        return hashlib.sha256(json.dumps(key_parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not self.enabled or key is None:
+            return None
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Error reading answer cache: {e}")
+            return None
+
+    def put(self, key: Optional[str], value: Dict[str, Any]):
+        if not self.enabled or key is None:
+            return
+        try:
+            self.backend.put(key, value)
+        except Exception as e:
+            logger.error(f"Error writing answer cache: {e}")
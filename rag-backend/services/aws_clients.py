@@ -0,0 +1,61 @@
+import logging
+import threading
+from typing import Any, Dict, Optional
+import boto3
+from botocore.config import Config
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class AWSClientManager:
+    """
+    boto3 clients shared by every task in the process (one per service), with a
+    connection pool sized for concurrent ingestion. boto3 clients are thread-safe,
+    but creating them from the default session is not, so creation is serialized.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._session: Optional[boto3.session.Session] = None
+
+    def _endpoint_url(self, service_name: str) -> Optional[str]:
+        """
+        Custom endpoint (e.g. moto or localstack); a per-service URL wins over AWS_ENDPOINT_URL
+        """
+        endpoints = {"s3": settings.AWS_S3_ENDPOINT_URL, "sqs": settings.AWS_SQS_ENDPOINT_URL}
+        return endpoints.get(service_name) or settings.AWS_ENDPOINT_URL
+
+    def _create_client(self, service_name: str):
+        if self._session is None:
+            self._session = boto3.session.Session(
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                region_name=settings.AWS_REGION
+            )
+        config = Config(
+            max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS,
+            retries={"max_attempts": settings.AWS_MAX_ATTEMPTS, "mode": "standard"},
+            s3={"addressing_style": settings.S3_ADDRESSING_STYLE}
+        )
+        endpoint_url = self._endpoint_url(service_name)
+        logger.info(
+            f"Creating shared {service_name} client (max_pool_connections={settings.AWS_MAX_POOL_CONNECTIONS}"
+            f"{f', endpoint={endpoint_url}' if endpoint_url else ''})"
+        )
+        return self._session.client(service_name, endpoint_url=endpoint_url, config=config)
+
+    def get(self, service_name: str):
+        """
+        Shared client for a service, created on first use
+        """
+        client = self._clients.get(service_name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(service_name)
+                if client is None:
+                    client = self._create_client(service_name)
+                    self._clients[service_name] = client
+        return client
+
+aws_clients = AWSClientManager()
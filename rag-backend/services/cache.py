@@ -0,0 +1,82 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from services.metrics import metrics
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_EDGE_PUNCTUATION_RE = re.compile(r"^[^\w]+|[^\w]+$")
+_REPEATED_PUNCTUATION_RE = re.compile(r"([^\w\s])\1+")
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize a question for cache lookups: case, whitespace and surrounding/repeated punctuation
+    """
+    text = _WHITESPACE_RE.sub(" ", text.lower()).strip()
+    text = _REPEATED_PUNCTUATION_RE.sub(r"\1", text)
+    return _EDGE_PUNCTUATION_RE.sub("", text)
+
+class LRUCache:
+    """
+    Thread-safe bounded LRU cache with optional TTL and hit/miss counters
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 0, name: str = "cache"):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: Any) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at and expires_at < time.monotonic():
+                    del self._entries[key]
+                    entry = None
+                else:
+                    self._entries.move_to_end(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.increment(f"{self.name}.{'hits' if entry is not None else 'misses'}")
+        return value if entry is not None else None
+
+    def put(self, key: Any, value: Any):
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds > 0 else 0
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            size = len(self._entries)
+        metrics.set_gauge(f"{self.name}.size", size)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
@@ -0,0 +1,256 @@
+import collections
+import logging
+import os
+import re
+import threading
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Sentence ends (punctuation and closing quotes/brackets followed by whitespace) and line breaks
+# followed by more whitespace (paragraphs, indented lines). A single leading character class keeps
+# the scan fast; the boundary falls after group 1.
+BOUNDARY_PATTERN = re.compile(r'([.!?\n][.!?"\')\]]*)\s+')
+# Text scanned for boundaries and token-counted per step; also the longest run without a boundary we buffer
+WINDOW_CHARS = 64 * 1024
+
+class Chunk(NamedTuple):
+    text: str
+    # Character offsets of the chunk in the extracted text (pieces joined by the separator)
+    start: int
+    end: int
+    # First and last page the chunk spans, for paged formats (PDF)
+    page_number: Optional[int] = None
+    page_end: Optional[int] = None
+
+# Per-process tokenizer; False once loading failed, so the fallback is not retried per document
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+def load_tokenizer():
+    """
+    The embedding model's fast tokenizer, or None when it is unavailable (the character heuristic is used)
+    """
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                _tokenizer = False
+                if settings.CHUNK_TOKENIZER.lower() == "auto":
+                    name = settings.EMBEDDING_MODEL_NAME
+                    if "/" not in name and not os.path.isdir(name):
+                        # Short names resolve to the sentence-transformers organisation, as in SentenceTransformer
+                        name = f"sentence-transformers/{name}"
+                    try:
+                        from transformers import AutoTokenizer
+                        _tokenizer = AutoTokenizer.from_pretrained(name, use_fast=True)
+                    except Exception as e:
+                        logger.warning(f"Could not load tokenizer {name}, sizing chunks by characters: {e}")
+    return _tokenizer or None
+
+class Chunker:
+    """
+    Splits a stream of text into overlapping chunks sized in embedding-model tokens.
+    Sentence and paragraph boundaries are found with one regex pass per window of
+    text, each sentence is token-counted once (a single batched call to the fast
+    tokenizer per window) and sentences are packed greedily up to `max_tokens`. Each
+    assembled chunk is counted once more before it is emitted (joining can add tokens),
+    so chunks are never truncated by the model and the work stays linear in the input.
+    The overlap is made of whole trailing sentences. Only the text of the chunk
+    being built and the current window is kept in memory.
+    """
+
+    def __init__(self, max_tokens: int = None, overlap_tokens: int = None, tokenizer=None, chars_per_token: float = None):
+        self.max_tokens = max(1, max_tokens or settings.CHUNK_MAX_TOKENS)
+        self.overlap_tokens = max(0, min(settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens, self.max_tokens // 2))
+        self.tokenizer = tokenizer if tokenizer is not None else load_tokenizer()
+        self.chars_per_token = chars_per_token or settings.CHUNK_CHARS_PER_TOKEN
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """
+        Token counts (without special tokens) for a batch of texts
+        """
+        if self.tokenizer is None:
+            return [self._estimate_tokens(len(text)) for text in texts]
+        encoded = self.tokenizer(
+            texts,
+            add_special_tokens=False,
+            return_attention_mask=False,
+            return_token_type_ids=False
+        )
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def _estimate_tokens(self, length: int) -> int:
+        return int(length / self.chars_per_token) + 1
+
+    def chunk_text(self, text: str) -> List[Chunk]:
+        return list(self.chunk_stream([text]))
+
+    def chunk_stream(self, pieces: Iterable[str], separator: str = "") -> Iterator[Chunk]:
+        """
+        Yield chunks for a stream of text pieces as soon as they are complete
+        """
+        buffer = ""
+        # Document offset of buffer[0] and buffer position from which boundaries are not yet scanned
+        buffer_offset = 0
+        scanned = 0
+        # Sentences of the chunk being built: (start, end, tokens) in document offsets
+        current: List[Tuple[int, int, int]] = []
+        current_tokens = 0
+        first_piece = True
+
+        # Leading sentences of `current` carried over from the previous chunk as overlap
+        overlap_count = 0
+
+        def flush():
+            """
+            Emit the chunk being built; returns it with the trailing sentences held back to fit it
+            """
+            nonlocal current, current_tokens, overlap_count
+            # Per-sentence counts leave out the whitespace between sentences and any tokens that
+            # change when they are joined, so re-count the assembled chunk and hand trailing
+            # sentences back (then drop the overlap) until it fits
+            held = []
+            while True:
+                chunk = self._make_chunk(buffer, buffer_offset, current[0][0], current[-1][1])
+                if chunk is None or self.count_tokens([chunk.text])[0] <= self.max_tokens:
+                    break
+                if len(current) > overlap_count + 1:
+                    held.insert(0, current.pop())
+                elif overlap_count:
+                    current, overlap_count = current[overlap_count:], 0
+                else:
+                    # A single sentence, already within max_tokens on its own
+                    break
+            # Carry whole trailing sentences into the next chunk as overlap
+            overlap, overlap_tokens = [], 0
+            for sentence in reversed(current[1:]):
+                if overlap_tokens + sentence[2] > self.overlap_tokens:
+                    break
+                overlap.insert(0, sentence)
+                overlap_tokens += sentence[2]
+            current, current_tokens, overlap_count = overlap, overlap_tokens, len(overlap)
+            return chunk, held
+
+        def add(sentences: List[Tuple[int, int, int]]):
+            nonlocal current, current_tokens, overlap_count
+            pending = collections.deque(sentences)
+            while pending:
+                sentence = pending[0]
+                if current and current_tokens + sentence[2] > self.max_tokens:
+                    if len(current) == overlap_count:
+                        # The overlap and this sentence don't fit together: drop the overlap
+                        current, current_tokens, overlap_count = [], 0, 0
+                    else:
+                        chunk, held = flush()
+                        pending.extendleft(reversed(held))
+                        if chunk:
+                            yield chunk
+                        continue
+                pending.popleft()
+                current.append(sentence)
+                current_tokens += sentence[2]
+
+        for piece in pieces:
+            if not first_piece and separator:
+                buffer += separator
+            buffer += piece
+            first_piece = False
+            if len(buffer) - scanned < WINDOW_CHARS:
+                continue
+            sentences, scanned = self._split(buffer, buffer_offset, scanned, final=False)
+            yield from add(sentences)
+            # Drop text that no future chunk can include
+            keep_from = min(current[0][0] - buffer_offset, scanned) if current else scanned
+            if keep_from > 0:
+                buffer = buffer[keep_from:]
+                buffer_offset += keep_from
+                scanned -= keep_from
+
+        sentences, scanned = self._split(buffer, buffer_offset, scanned, final=True)
+        yield from add(sentences)
+        while len(current) > overlap_count:
+            chunk, held = flush()
+            if chunk:
+                yield chunk
+            yield from add(held)
+
+    def _make_chunk(self, buffer: str, buffer_offset: int, start: int, end: int) -> Optional[Chunk]:
+        raw = buffer[start - buffer_offset:end - buffer_offset]
+        text = raw.strip()
+        if not text:
+            return None
+        leading = len(raw) - len(raw.lstrip())
+        return Chunk(text, start + leading, start + leading + len(text))
+
+    def _split(self, buffer: str, buffer_offset: int, scanned: int, final: bool) -> Tuple[List[Tuple[int, int, int]], int]:
+        """
+        Sentences (start, end, tokens) between `scanned` and the last boundary in the buffer
+        (the end of the buffer when `final`); returns them with the new scan position
+        """
+        cuts = [(match.end(1), match.end()) for match in BOUNDARY_PATTERN.finditer(buffer, scanned)]
+        spans = list(zip([scanned] + [after for _, after in cuts], [end for end, _ in cuts]))
+        position = cuts[-1][1] if cuts else scanned
+        tail_end = len(buffer)
+        if not final and tail_end - position >= WINDOW_CHARS:
+            # No boundary for a whole window: cut at the last whitespace so the buffer stays bounded
+            cut = buffer.rfind(" ", position, tail_end)
+            if cut <= position:
+                cut = tail_end
+            spans.append((position, cut))
+            position = cut
+        elif final and tail_end > position:
+            spans.append((position, tail_end))
+            position = tail_end
+        if not spans:
+            return [], position
+
+        if self.tokenizer is None:
+            counts = [self._estimate_tokens(end - start) for start, end in spans]
+        else:
+            counts = self.count_tokens([buffer[start:end] for start, end in spans])
+        if max(counts) <= self.max_tokens:
+            return [(buffer_offset + start, buffer_offset + end, tokens) for (start, end), tokens in zip(spans, counts)], position
+        sentences = []
+        for (start, end), tokens in zip(spans, counts):
+            if tokens > self.max_tokens:
+                sentences.extend(self._split_long(buffer, buffer_offset, start, end))
+            else:
+                sentences.append((buffer_offset + start, buffer_offset + end, tokens))
+        return sentences, position
+
+    def _split_long(self, buffer: str, buffer_offset: int, start: int, end: int) -> List[Tuple[int, int, int]]:
+        """
+        Cut a sentence longer than max_tokens into pieces of at most max_tokens tokens
+        """
+        text = buffer[start:end]
+        pieces = []
+        if self.tokenizer is not None:
+            offsets = self.tokenizer(
+                text,
+                add_special_tokens=False,
+                return_attention_mask=False,
+                return_token_type_ids=False,
+                return_offsets_mapping=True
+            )["offset_mapping"]
+            for first in range(0, len(offsets), self.max_tokens):
+                last = min(first + self.max_tokens, len(offsets)) - 1
+                piece_end = offsets[last + 1][0] if last + 1 < len(offsets) else len(text)
+                pieces.append((offsets[first][0], piece_end, last - first + 1))
+        else:
+            width = max(1, int(self.max_tokens * self.chars_per_token) - 1)
+            position = 0
+            while position < len(text):
+                piece_end = min(position + width, len(text))
+                if piece_end < len(text):
+                    # Prefer cutting between words
+                    space = text.rfind(" ", position + width // 2, piece_end)
+                    if space > position:
+                        piece_end = space
+                pieces.append((position, piece_end, self.count_tokens([text[position:piece_end]])[0]))
+                position = piece_end
+        return [
+            (buffer_offset + start + piece_start, buffer_offset + start + piece_end, tokens)
+            for piece_start, piece_end, tokens in pieces
+        ]
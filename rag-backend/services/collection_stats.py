@@ -0,0 +1,80 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class CollectionStatsStore:
+    """
+    Per-document chunk aggregates behind /stats, shared by the ingestion worker and every
+    API worker. A document's row is recomputed from its chunks whenever they change, so
+    /stats sums one row per document instead of scanning all chunk metadata.
+    Rows are {"chunks": int, "characters": int, "file_types": {file_type: chunks}}.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or settings.CACHE_DB_PATH
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS document_stats ("
+            "document_id TEXT PRIMARY KEY, chunks INTEGER NOT NULL, characters INTEGER NOT NULL, file_types TEXT NOT NULL)"
+        )
+        # Set once the table has been filled from a full scan of an existing collection
+        self._connection.execute("CREATE TABLE IF NOT EXISTS document_stats_info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def put(self, documentId: str, aggregates: Optional[dict]):
+        """
+        Replace a document's row; None (no chunks left) removes it
+        """
+        with self._lock:
+            if aggregates is None:
+                self._connection.execute("DELETE FROM document_stats WHERE document_id = ?", (documentId,))
+            else:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO document_stats (document_id, chunks, characters, file_types) VALUES (?, ?, ?, ?)",
+                    (documentId, aggregates["chunks"], aggregates["characters"], json.dumps(aggregates["file_types"]))
+                )
+
+    def load(self) -> Optional[Dict[str, dict]]:
+        """
+        All rows by documentId, or None until the table has been backfilled
+        """
+        with self._lock:
+            if self._connection.execute("SELECT 1 FROM document_stats_info WHERE key = 'backfilled'").fetchone() is None:
+                return None
+            rows = self._connection.execute("SELECT document_id, chunks, characters, file_types FROM document_stats").fetchall()
+        return {
+            documentId: {"chunks": chunks, "characters": characters, "file_types": json.loads(file_types)}
+            for documentId, chunks, characters, file_types in rows
+        }
+
+    def backfill(self, documents: Dict[str, dict]):
+        """
+        Fill the table from a full scan. Rows written meanwhile by put() are newer and kept.
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO document_stats (document_id, chunks, characters, file_types) VALUES (?, ?, ?, ?)",
+                    [
+                        (documentId, aggregates["chunks"], aggregates["characters"], json.dumps(aggregates["file_types"]))
+                        for documentId, aggregates in documents.items()
+                    ]
+                )
+                self._connection.execute("INSERT OR REPLACE INTO document_stats_info (key, value) VALUES ('backfilled', '1')")
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+        logger.info(f"Backfilled collection stats for {len(documents)} documents")
@@ -0,0 +1,144 @@
+import logging
+import math
+import re
+from typing import Any, Dict, List
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+
+# Longest chunk overlap we try to stitch when merging neighbouring chunks
+MAX_MERGE_OVERLAP = 400
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (roughly 4 characters per token for English text)
+    """
+    return math.ceil(len(text) / settings.CONTEXT_CHARS_PER_TOKEN)
+
+def _parse_model_budgets(value: str) -> Dict[str, int]:
+    budgets = {}
+    for entry in value.split(","):
+        if ":" in entry:
+            model, budget = entry.rsplit(":", 1)
+            budgets[model.strip()] = int(budget)
+    return budgets
+
+class ContextBuilder:
+    """
+    Assembles retrieved chunks into prompt context: merges neighbouring chunks
+    of the same document, drops near-duplicates and packs the result into a
+    per-model token budget, in relevance order.
+    """
+
+    def __init__(self):
+        self.default_budget = settings.CONTEXT_TOKEN_BUDGET
+        self.model_budgets = _parse_model_budgets(settings.CONTEXT_TOKEN_BUDGETS)
+        self.shingle_size = settings.CONTEXT_SHINGLE_SIZE
+        self.duplicate_threshold = settings.CONTEXT_DUPLICATE_THRESHOLD
+
+    def token_budget(self, model: str) -> int:
+        return self.model_budgets.get(model, self.default_budget)
+
+    def build(self, context: List[Dict[str, Any]], model: str = None) -> List[Dict[str, Any]]:
+        """
+        Return the context items to put in the prompt, each {"document", "metadata"}
+        """
+        items = self._merge_adjacent(context)
+        items = self._drop_near_duplicates(items)
+        packed = self._pack(items, self.token_budget(model))
+        logger.info(f"Packed {len(context)} retrieved chunks into {len(packed)} context items")
+        return packed
+
+    def _merge_adjacent(self, context: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Merge consecutive chunks (by chunk_index) of the same document, removing their overlap
+        """
+        runs: Dict[Any, List[Dict[str, Any]]] = {}
+        for rank, item in enumerate(context):
+            metadata = item.get('metadata') or {}
+            entry = {
+                "rank": rank,
+                "document": item.get('document') or '',
+                "metadata": metadata,
+                "index": metadata.get('chunk_index')
+            }
+            runs.setdefault(metadata.get('documentId', rank), []).append(entry)
+
+        merged = []
+        for entries in runs.values():
+            indexed = sorted((e for e in entries if e["index"] is not None), key=lambda e: e["index"])
+            merged.extend(e for e in entries if e["index"] is None)
+            current = None
+            for entry in indexed:
+                if current is not None and entry["index"] == current["last_index"] + 1:
+                    current["document"] = self._stitch(current["document"], entry["document"])
+                    current["last_index"] = entry["index"]
+                    current["rank"] = min(current["rank"], entry["rank"])
+                    continue
+                if current is not None and entry["index"] == current["last_index"]:
+                    continue
+                current = dict(entry, last_index=entry["index"], metadata=dict(entry["metadata"]))
+                merged.append(current)
+
+        for item in merged:
+            if item.get("last_index") is not None and item["last_index"] != item["index"]:
+                item["metadata"]["chunk_index_end"] = item["last_index"]
+        return sorted(merged, key=lambda item: item["rank"])
+
+    def _stitch(self, first: str, second: str) -> str:
+        """
+        Join two consecutive chunks, dropping the text they share
+        """
+        probe = second[:min(50, len(second))]
+        if probe:
+            position = first.rfind(probe, max(0, len(first) - MAX_MERGE_OVERLAP))
+            if position != -1 and second.startswith(first[position:]):
+                return first[:position] + second
+        return first + " " + second
+
+    def _shingles(self, text: str) -> set:
+        words = _WORD_RE.findall(text.lower())
+        if len(words) < self.shingle_size:
+            return {" ".join(words)} if words else set()
+        return {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def _drop_near_duplicates(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Drop items whose word shingles are mostly contained in a higher-ranked item
+        (this also catches chunks already covered by a merged run). Candidate sets
+        are small, so shingles are compared exactly rather than with MinHash.
+        """
+        kept = []
+        kept_shingles = []
+        for item in items:
+            shingles = self._shingles(item["document"])
+            duplicate = False
+            for other in kept_shingles:
+                if shingles and len(shingles & other) / len(shingles) >= self.duplicate_threshold:
+                    duplicate = True
+                    break
+            if not duplicate:
+                kept.append(item)
+                kept_shingles.append(shingles)
+        return kept
+
+    def _pack(self, items: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+        """
+        Take items in relevance order while they fit in the token budget
+        """
+        packed = []
+        used = 0
+        for item in items:
+            tokens = estimate_tokens(item["document"])
+            if used + tokens > budget:
+                if not packed:
+                    # Always keep (a truncated version of) the most relevant item
+                    max_chars = budget * settings.CONTEXT_CHARS_PER_TOKEN
+                    packed.append({"document": item["document"][:max_chars], "metadata": item["metadata"]})
+                    used = budget
+                continue
+            packed.append({"document": item["document"], "metadata": item["metadata"]})
+            used += tokens
+        return packed
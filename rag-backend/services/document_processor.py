@@ -1,21 +1,32 @@
-import os
+import asyncio
 import logging
-from typing import List, Dict, Any
-from services.s3_service import S3Service
+from typing import List
+from config import settings
+from services.s3_service import get_s3_service
 from services.vector_db_service import VectorDBService
 from services.nest_api_service import NestAPIService
+from services.answer_cache import DocumentVersionStore
+from services.ingest_pool import IngestionPool
+from services.ingestion_batcher import IngestionBatcher
+from services.text_extractor import get_file_extension
 
 logger = logging.getLogger(__name__)
 
 class DocumentProcessor:
     def __init__(self):
-        self.s3_service = S3Service()
+        self.s3_service = get_s3_service()
         self.vector_db_service = VectorDBService()
         self.nest_api_service = NestAPIService()
+        self.document_versions = DocumentVersionStore()
+        self.ingest_pool = IngestionPool(local_encoder=self.vector_db_service.create_embeddings)
+        # Chunks from concurrent documents share fixed-size embedding batches
+        self.ingestion_batcher = IngestionBatcher(self.ingest_pool, self.vector_db_service)
     
     async def process_document(self, file_key: str, documentId: str, sqs_attempt: int = 1, max_sqs_attempts: int = 3):
         """
-        Process a document: download from S3, extract text, create embeddings, and store in vector DB
+        Process a document: stream it from S3, extract text, create embeddings, and store in vector DB.
+        Blocking I/O runs in threads and CPU-bound work in the ingestion pool, so several
+        documents can be processed concurrently.
         """
      
         try:
@@ -26,203 +37,131 @@ class DocumentProcessor:
                 f"Document processing started (SQS attempt {sqs_attempt}/{max_sqs_attempts})"
             )
             
-            # Download file from S3
-            local_file_path = self.s3_service.download_file(file_key)
+            if settings.S3_STREAMING_INGEST:
+                # Extractors read the object straight from S3 (in the pool workers too), no temp file
+                source = await asyncio.to_thread(self.s3_service.describe, file_key)
+            else:
+                # Download file from S3
+                source = await asyncio.to_thread(self.s3_service.download_file, file_key)
             
             try:
-                # Extract text content
-                text_chunks = self._extract_text_content(local_file_path, file_key)
+                # Chunk IDs are derived from (documentId, chunk text), so retries and re-uploads
+                # overwrite instead of duplicating, and unchanged chunks are not re-embedded
+                existing = await asyncio.to_thread(self.vector_db_service.get_document_chunk_metadata, documentId)
+                current_ids = set()
+                new_chunks = 0
+                stale_chunks = 0
+                moved_chunks = 0
+                # Unchanged chunks whose position moved: their metadata is rewritten, in batches, without re-embedding
+                moved_ids, moved_metadata = [], []
+                
+                # Stream chunks out of the extractor into the batcher as they are produced,
+                # so even very large files never sit in memory as a whole
+                chunk_count = 0
+                file_type = get_file_extension(file_key)
+                tracker = self.ingestion_batcher.open_document(documentId)
+                chunk_groups = self.ingest_pool.iter_chunks(
+                    source, file_key, group_size=self.ingestion_batcher.batch_size
+                )
+                try:
+                    async for chunk_group in chunk_groups:
+                        for chunk in chunk_group:
+                            chunk_id = self.vector_db_service.make_chunk_id(documentId, chunk.text)
+                            if chunk_id in current_ids:
+                                # Identical text repeated within the document
+                                continue
+                            current_ids.add(chunk_id)
+                            chunk_count += 1
+                            metadata = {
+                                "source": file_key,
+                                "documentId": documentId,
+                                "chunk_index": chunk_count - 1,
+                                "file_type": file_type,
+                                "char_count": len(chunk.text),
+                                # Position of the chunk in the extracted text
+                                "char_start": chunk.start,
+                                "char_end": chunk.end
+                            }
+                            if chunk.page_number is not None:
+                                metadata["page_number"] = chunk.page_number
+                                metadata["page_end"] = chunk.page_end
+                            if chunk_id in existing:
+                                if existing[chunk_id] != metadata:
+                                    moved_ids.append(chunk_id)
+                                    moved_metadata.append(metadata)
+                                    if len(moved_ids) >= self.ingestion_batcher.batch_size:
+                                        moved_chunks += await self._update_metadata(moved_ids, moved_metadata)
+                                continue
+                            await self.ingestion_batcher.add(tracker, chunk.text, metadata, chunk_id)
+                            new_chunks += 1
+                    moved_chunks += await self._update_metadata(moved_ids, moved_metadata)
+                    self.ingestion_batcher.close_document(tracker)
+                    await tracker.wait()
+                    
+                    # Replace the document: with the new version fully persisted, drop chunks it no longer has
+                    if chunk_count:
+                        stale_chunks = await asyncio.to_thread(
+                            self.vector_db_service.delete_document_chunks, documentId, current_ids
+                        )
+                finally:
+                    # Stops the extractor promptly if we bailed out early
+                    await chunk_groups.aclose()
+                    self.ingestion_batcher.close_document(tracker)
+                    if new_chunks or moved_chunks:
+                        # The document's chunks changed (even on a partial write), so cached answers are stale;
+                        # delete_document_chunks bumps the version itself when it removes stale chunks
+                        await asyncio.to_thread(self.document_versions.bump, documentId)
+                    if new_chunks and not stale_chunks:
+                        # delete_document_chunks already refreshed the /stats row after removing stale chunks
+                        await asyncio.to_thread(self.vector_db_service.refresh_document_stats, documentId)
                 
-                if not text_chunks:
+                if not chunk_count:
                     logger.info(f"No text content could be extracted from the document: {file_key}")
                     return {"status": 'failed', "message": 'No text content could be extracted from the document'}
                 
-                # Create metadata for each chunk
-                metadata_list = []
-                for i, chunk in enumerate(text_chunks):
-                    metadata = {
-                        "source": file_key,
-                        "documentId": documentId,
-                        "chunk_index": i,
-                        "total_chunks": len(text_chunks),
-                        "file_type": self._get_file_extension(file_key)
-                    }
-                    metadata_list.append(metadata)
-                
-                # Store in vector database
-                self.vector_db_service.add_documents(
-                    documents=text_chunks,
-                    metadata=metadata_list
+                logger.info(
+                    f"Document {documentId}: {new_chunks} new, {chunk_count - new_chunks} unchanged "
+                    f"({moved_chunks} moved), {stale_chunks} stale chunks removed"
                 )
                 
                 # Update status to completed
                 await self.nest_api_service.update_injection_status(
                     documentId,
                     "completed",
-                    f"Successfully processed {len(text_chunks)} text chunks"
+                    f"Successfully processed {chunk_count} text chunks"
                 )
                 
-                logger.info(f"Successfully processed document {file_key} with {len(text_chunks)} chunks")
+                logger.info(f"Successfully processed document {file_key} with {chunk_count} chunks")
+                return {"status": 'success', "message": f'Processed {chunk_count} chunks'}
             except Exception as e:
                 logger.error(f"Error processing document {file_key} (SQS attempt {sqs_attempt}/{max_sqs_attempts}): {e}")
                 return {"status": 'failed', "message": 'Error processing document'}
         
             finally:
                 # Clean up temporary file
-                self.s3_service.delete_local_file(local_file_path)
-                return {"status": 'success', "message": f'Processed {len(text_chunks)} chunks'}
+                if isinstance(source, str):
+                    await asyncio.to_thread(self.s3_service.delete_local_file, source)
                 
             
         except Exception as e:
             logger.error(f"Error processing document {file_key} (SQS attempt {sqs_attempt}/{max_sqs_attempts}): {e}")
             return {"status": 'failed', "message": 'Error processing document'}
     
-    def _extract_text_content(self, file_path: str, file_key: str) -> List[str]:
-        """
-        Extract text content from different file types
-        """
-        file_extension = self._get_file_extension(file_key).lower()
-        
-        try:
-            if file_extension in ['txt', 'md']:
-                return self._extract_text_file(file_path)
-            elif file_extension in ['pdf']:
-                return self._extract_pdf_content(file_path)
-            elif file_extension in ['docx', 'doc']:
-                return self._extract_word_content(file_path)
-            elif file_extension in ['csv']:
-                return self._extract_csv_content(file_path)
-            else:
-                logger.warning(f"Unsupported file type: {file_extension}")
-                return []
-                
-        except Exception as e:
-            logger.error(f"Error extracting content from {file_path}: {e}")
-            return []
-    
-    def _extract_text_file(self, file_path: str) -> List[str]:
-        """
-        Extract text from plain text files
-        """
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-            return self._chunk_text(content)
-        except UnicodeDecodeError:
-            # Try with different encoding
-            try:
-                with open(file_path, 'r', encoding='latin-1') as file:
-                    content = file.read()
-                return self._chunk_text(content)
-            except Exception as e:
-                logger.error(f"Error reading text file with latin-1 encoding: {e}")
-                return []
-    
-    def _extract_pdf_content(self, file_path: str) -> List[str]:
-        """
-        Extract text from PDF files
-        """
-        try:
-            import PyPDF2
-            text_chunks = []
-            
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page_num, page in enumerate(pdf_reader.pages):
-                    text = page.extract_text()
-                    if text.strip():
-                        text_chunks.append(text)
-            
-            # Flatten and chunk the text
-            all_text = " ".join(text_chunks)
-            return self._chunk_text(all_text)
-            
-        except ImportError:
-            logger.error("PyPDF2 not installed. Install with: pip install PyPDF2")
-            return []
-        except Exception as e:
-            logger.error(f"Error extracting PDF content: {e}")
-            return []
-    
-    def _extract_word_content(self, file_path: str) -> List[str]:
-        """
-        Extract text from Word documents
-        """
-        try:
-            from docx import Document
-            doc = Document(file_path)
-            text_chunks = []
-            
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    text_chunks.append(paragraph.text)
-            
-            # Flatten and chunk the text
-            all_text = " ".join(text_chunks)
-            return self._chunk_text(all_text)
-            
-        except ImportError:
-            logger.error("python-docx not installed. Install with: pip install python-docx")
-            return []
-        except Exception as e:
-            logger.error(f"Error extracting Word document content: {e}")
-            return []
-    
-    def _extract_csv_content(self, file_path: str) -> List[str]:
-        """
-        Extract text from CSV files
-        """
-        try:
-            import csv
-            text_chunks = []
-            
-            with open(file_path, 'r', encoding='utf-8') as file:
-                csv_reader = csv.reader(file)
-                for row_num, row in enumerate(csv_reader):
-                    if row:  # Skip empty rows
-                        row_text = " | ".join(str(cell) for cell in row if cell)
-                        if row_text.strip():
-                            text_chunks.append(f"Row {row_num + 1}: {row_text}")
-            
-            return text_chunks
-            
-        except Exception as e:
-            logger.error(f"Error extracting CSV content: {e}")
-            return []
-    
-    def _chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
+    async def _update_metadata(self, ids: List[str], metadata: List[dict]) -> int:
         """
-        Split text into overlapping chunks
+        Write and clear a batch of metadata-only updates; returns its size
         """
-        if len(text) <= chunk_size:
-            return [text]
-        
-        chunks = []
-        start = 0
-        
-        while start < len(text):
-            end = start + chunk_size
-            
-            # Try to break at sentence boundary
-            if end < len(text):
-                # Look for sentence endings
-                for i in range(end, max(start + chunk_size - 100, start), -1):
-                    if text[i] in '.!?':
-                        end = i + 1
-                        break
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            start = end - overlap
-            if start >= len(text):
-                break
-        
-        return chunks
+        count = len(ids)
+        if count:
+            await asyncio.to_thread(self.vector_db_service.update_chunk_metadata, list(ids), list(metadata))
+            ids.clear()
+            metadata.clear()
+        return count
     
-    def _get_file_extension(self, file_key: str) -> str:
+    async def shutdown(self):
         """
-        Get file extension from file key
+        Stop the ingestion batcher, the process pool and the S3 transfer threads
         """
-        return os.path.splitext(file_key)[1][1:] if '.' in file_key else ''
+        await self.ingestion_batcher.stop()
+        self.ingest_pool.shutdown()
+        self.s3_service.close()
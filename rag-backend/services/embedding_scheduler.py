@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from typing import Callable, List, Optional
+from concurrent.futures import Executor
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingScheduler:
+    """
+    Micro-batches concurrent query embeddings: requests arriving within
+    `max_wait_ms` of each other (or until `max_batch_size` is reached) share
+    a single encode call, and each caller gets its own vector back.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], List[List[float]]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        executor: Optional[Executor] = None
+    ):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_seconds = max(0.0, max_wait_ms) / 1000.0
+        self.executor = executor
+        self._pending: list = []
+        self._has_items: Optional[asyncio.Event] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self):
+        # Events and the collector task are bound to the running loop, so create them lazily
+        if self._task is None or self._task.done():
+            self._has_items = asyncio.Event()
+            self._batch_full = asyncio.Event()
+            if self._pending:
+                self._has_items.set()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def embed(self, text: str) -> List[float]:
+        """
+        Embed a single text, batched together with other concurrent callers
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future))
+        self._has_items.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._batch_full.set()
+        metrics.set_gauge("embedding_scheduler.queue_depth", len(self._pending))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._has_items.wait()
+
+            # Give other requests a few milliseconds to join the batch
+            if len(self._pending) < self.max_batch_size and self.max_wait_seconds > 0:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.max_wait_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            if not self._pending:
+                self._has_items.clear()
+            if len(self._pending) < self.max_batch_size:
+                self._batch_full.clear()
+            metrics.set_gauge("embedding_scheduler.queue_depth", len(self._pending))
+
+            # Callers that went away (cancelled requests) don't need an embedding
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            texts = [text for text, _ in batch]
+            started = time.perf_counter()
+            try:
+                embeddings = await loop.run_in_executor(self.executor, self.encode_fn, texts)
+            except Exception as e:
+                logger.error(f"Error creating batched embeddings: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            metrics.increment("embedding_scheduler.batches")
+            metrics.increment("embedding_scheduler.items", len(batch))
+            metrics.observe("embedding_scheduler.batch_size", len(batch))
+            metrics.observe("embedding_scheduler.encode_seconds", time.perf_counter() - started)
+
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+
+    async def stop(self):
+        """
+        Cancel the collector task and fail any callers still waiting
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for _, future in self._pending:
+            if not future.done():
+                future.cancel()
+        self._pending = []
@@ -0,0 +1,60 @@
+import logging
+from typing import Dict
+import httpx
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+class HTTPClientManager:
+    """
+    Long-lived, pooled httpx clients shared by every request in the process
+    (one per upstream), created at startup and closed at shutdown.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self.http2 = settings.HTTP2_ENABLED and _http2_available()
+
+    def _create_client(self, name: str) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS
+        )
+        logger.info(f"Creating pooled HTTP client '{name}' (http2={self.http2})")
+        return httpx.AsyncClient(limits=limits, http2=self.http2)
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """
+        Shared client for an upstream; created on first use if startup did not create it
+        """
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._create_client(name)
+            self._clients[name] = client
+        return client
+
+    def start(self, *names: str):
+        for name in names:
+            self.get(name)
+
+    async def close(self):
+        for name, client in list(self._clients.items()):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Error closing HTTP client '{name}': {e}")
+        self._clients.clear()
+        logger.info("HTTP clients closed")
+
+http_clients = HTTPClientManager()
+
+OLLAMA_CLIENT = "ollama"
+NEST_API_CLIENT = "nest_api"
@@ -0,0 +1,245 @@
+import asyncio
+import collections
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple
+from config import settings
+from services.chunker import Chunk
+from services.text_extractor import DocumentSource, TextExtractor, get_file_extension, open_seekable_source
+
+logger = logging.getLogger(__name__)
+
+# Per-process state for pool workers
+_text_extractor: Optional[TextExtractor] = None
+_embedding_model = None
+
+def _init_pool_worker(torch_threads: int):
+    """
+    Pool worker initializer: keep each process from oversubscribing the CPU
+    """
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+
+# Chunk groups buffered between an extracting pool worker and the consumer
+STREAM_QUEUE_MAX_GROUPS = 4
+# How often a consumer waiting on the chunk queue checks whether the producer died or it was cancelled
+STREAM_QUEUE_POLL_SECONDS = 1.0
+# Returned by _get_until_done when the producer exited without queueing the end-of-stream marker
+_PRODUCER_EXITED = object()
+
+def _take(iterator: Iterator[Chunk], count: int) -> List[Chunk]:
+    group = []
+    for item in iterator:
+        group.append(item)
+        if len(group) >= count:
+            break
+    return group
+
+def _put_until_cancelled(chunk_queue, item, cancelled) -> bool:
+    while True:
+        try:
+            chunk_queue.put(item, timeout=1.0)
+            return True
+        except queue.Full:
+            if cancelled.is_set():
+                return False
+
+def _get_until_done(chunk_queue, producer_done, stopped):
+    """
+    Next item from the chunk queue; _PRODUCER_EXITED once the producer has finished and the
+    queue is drained (e.g. the pool process died before queueing None), or the consumer stopped
+    """
+    while not stopped.is_set():
+        # Read the flag before polling: everything the producer queued is visible once it's set
+        finished = producer_done.is_set()
+        try:
+            return chunk_queue.get(timeout=0 if finished else STREAM_QUEUE_POLL_SECONDS)
+        except queue.Empty:
+            if finished:
+                return _PRODUCER_EXITED
+    return _PRODUCER_EXITED
+
+def stream_text_chunks(source: DocumentSource, file_key: str, group_size: int, chunk_queue, cancelled):
+    """
+    Extract and chunk a document inside a pool worker, handing chunk groups to the
+    consumer through a bounded queue as they are produced
+    """
+    global _text_extractor
+    if _text_extractor is None:
+        _text_extractor = TextExtractor()
+    try:
+        iterator = _text_extractor.iter_chunks(source, file_key)
+        while not cancelled.is_set():
+            group = _take(iterator, group_size)
+            if not group or not _put_until_cancelled(chunk_queue, group, cancelled):
+                break
+    finally:
+        # End-of-stream marker; errors are re-raised to the consumer through the future
+        _put_until_cancelled(chunk_queue, None, cancelled)
+
+def count_pdf_pages(source: DocumentSource) -> int:
+    import PyPDF2
+    # Ranged reads for S3 objects: a page range task only fetches the parts of the file it parses
+    with open_seekable_source(source, prefer_ranges=True) as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+def extract_pdf_pages(source: DocumentSource, start: int, end: int) -> List[str]:
+    """
+    Text of pages [start, end) of a PDF, extracted inside a pool worker
+    """
+    import PyPDF2
+    with open_seekable_source(source, prefer_ranges=True) as file:
+        reader = PyPDF2.PdfReader(file)
+        return [reader.pages[index].extract_text() or "" for index in range(start, end)]
+
+def encode_texts(texts: List[str]) -> List[List[float]]:
+    """
+    Embed texts with a model loaded once per pool worker
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        from sentence_transformers import SentenceTransformer
+        _embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL_NAME)
+    return _embedding_model.encode(texts).tolist()
+
+class IngestionPool:
+    """
+    Runs the CPU-bound ingestion steps (text extraction and chunk embedding)
+    in a process pool so concurrent documents use all the worker's cores.
+    With WORKER_PROCESS_POOL_SIZE=0 the steps run in threads instead, using
+    `local_encoder` (the in-process model) for embeddings. `pool_encoder` is the
+    picklable function run on the pool for embeddings.
+
+    Streaming extraction jobs block while their chunk queue is full, and that
+    queue only drains once the pool has embedded earlier chunks, so at most
+    size - 1 documents stream from the pool at a time; further documents are
+    extracted in a thread of this process and one pool slot is always left to encoding.
+    """
+
+    def __init__(
+        self,
+        size: int = None,
+        local_encoder: Callable[[List[str]], List[List[float]]] = None,
+        pool_encoder: Callable[[List[str]], List[List[float]]] = None
+    ):
+        self.size = settings.WORKER_PROCESS_POOL_SIZE if size is None else size
+        self.local_encoder = local_encoder or encode_texts
+        self.pool_encoder = pool_encoder or encode_texts
+        self.executor = None
+        self._manager = None
+        # Streaming extraction jobs currently holding a pool process (touched only from the event loop)
+        self._streaming_producers = 0
+        if self.size > 0:
+            torch_threads = max(1, (os.cpu_count() or 1) // self.size)
+            # spawn: forking a process that already loaded torch/boto3 is not safe
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_pool_worker,
+                initargs=(torch_threads,)
+            )
+            # Queues and events that can be shared with pool workers
+            self._manager = multiprocessing.get_context("spawn").Manager()
+            logger.info(f"Ingestion process pool started with {self.size} workers ({torch_threads} torch threads each)")
+
+    async def _run(self, func, *args):
+        if self.executor is None:
+            return await asyncio.to_thread(func, *args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _iter_pdf_pages(self, source: DocumentSource) -> Iterator[Tuple[int, str]]:
+        """
+        Extract a PDF's pages in ranges of PDF_PAGES_PER_TASK across the pool and yield
+        (page_number, text) in page order. At most PDF_MAX_PENDING_RANGES ranges are in
+        flight or waiting to be consumed, which bounds memory for very large files.
+        """
+        page_count = self.executor.submit(count_pdf_pages, source).result()
+        size = max(1, settings.PDF_PAGES_PER_TASK)
+        starts = iter(range(0, page_count, size))
+        pending = collections.deque()
+
+        def submit_next():
+            start = next(starts, None)
+            if start is not None:
+                pending.append((start, self.executor.submit(extract_pdf_pages, source, start, min(start + size, page_count))))
+
+        for _ in range(max(1, settings.PDF_MAX_PENDING_RANGES)):
+            submit_next()
+        try:
+            while pending:
+                start, future = pending.popleft()
+                texts = future.result()
+                submit_next()
+                for offset, text in enumerate(texts):
+                    yield start + offset + 1, text
+        finally:
+            # Consumer stopped early: drop ranges that haven't started
+            for _, future in pending:
+                future.cancel()
+
+    async def iter_chunks(self, source: DocumentSource, file_key: str, group_size: int = 64) -> AsyncIterator[List[Chunk]]:
+        """
+        Yield groups of text chunks as the document is extracted, with bounded buffering
+        """
+        parallel_pdf = self.executor is not None and get_file_extension(file_key).lower() == "pdf"
+        # PDF page-range jobs run to completion on their own, so only streaming jobs need a free slot
+        pool_stream = self.executor is not None and not parallel_pdf and self._streaming_producers < self.size - 1
+        if not pool_stream:
+            if parallel_pdf:
+                # Pages are extracted in parallel on the pool and chunked here, in order
+                iterator = TextExtractor().iter_page_chunks(self._iter_pdf_pages(source))
+            else:
+                iterator = TextExtractor().iter_chunks(source, file_key)
+            while True:
+                group = await asyncio.to_thread(_take, iterator, group_size)
+                if not group:
+                    return
+                yield group
+
+        self._streaming_producers += 1
+        chunk_queue = self._manager.Queue(maxsize=STREAM_QUEUE_MAX_GROUPS)
+        cancelled = self._manager.Event()
+        future = asyncio.get_running_loop().run_in_executor(
+            self.executor, stream_text_chunks, source, file_key, group_size, chunk_queue, cancelled
+        )
+        future.add_done_callback(self._release_streaming_producer)
+        producer_done = threading.Event()
+        future.add_done_callback(lambda _: producer_done.set())
+        stopped = threading.Event()
+        try:
+            while True:
+                group = await asyncio.to_thread(_get_until_done, chunk_queue, producer_done, stopped)
+                if group is None or group is _PRODUCER_EXITED:
+                    break
+                yield group
+            # Re-raises the producer's error, including BrokenProcessPool when its process died
+            await future
+        finally:
+            # Consumer stopped early: release the queue getter thread and let the producer
+            # exit instead of blocking on a full queue
+            stopped.set()
+            if not future.done():
+                cancelled.set()
+
+    def _release_streaming_producer(self, future):
+        self._streaming_producers -= 1
+
+    async def encode(self, texts: List[str]) -> List[List[float]]:
+        if self.executor is None:
+            return await asyncio.to_thread(self.local_encoder, texts)
+        return await self._run(self.pool_encoder, texts)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from config import settings
+from services.ingest_pool import IngestionPool
+from services.metrics import metrics
+from services.vector_db_service import VectorDBService
+
+logger = logging.getLogger(__name__)
+
+class DocumentTracker:
+    """
+    Tracks one document's chunks through the batcher; `wait()` returns once
+    every chunk submitted for the document has been persisted.
+    """
+
+    def __init__(self, documentId: str):
+        self.documentId = documentId
+        self.submitted = 0
+        self.persisted = 0
+        self.closed = False
+        self.future = asyncio.get_running_loop().create_future()
+
+    def _check_done(self):
+        if self.closed and self.persisted >= self.submitted and not self.future.done():
+            self.future.set_result(self.persisted)
+
+    def mark_persisted(self):
+        self.persisted += 1
+        self._check_done()
+
+    def fail(self, error: Exception):
+        if not self.future.done():
+            self.future.set_exception(error)
+
+    async def wait(self) -> int:
+        """
+        Wait until all of the document's chunks are persisted; returns the chunk count
+        """
+        return await self.future
+
+class IngestionBatcher:
+    """
+    Accumulates chunks across documents into fixed-size embedding batches,
+    flushing when a batch is full or after `max_wait_ms`, and writes each
+    batch to the vector database in one bulk call.
+    """
+
+    def __init__(
+        self,
+        ingest_pool: IngestionPool,
+        vector_db_service: VectorDBService,
+        batch_size: int = None,
+        max_wait_ms: float = None,
+        max_pending_chunks: int = None,
+        max_concurrent_flushes: int = None
+    ):
+        self.ingest_pool = ingest_pool
+        self.vector_db_service = vector_db_service
+        self.batch_size = max(1, batch_size or settings.INGEST_BATCH_SIZE)
+        self.max_wait_seconds = (settings.INGEST_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self.max_pending_chunks = max(self.batch_size, max_pending_chunks or settings.INGEST_MAX_PENDING_CHUNKS)
+        self.max_concurrent_flushes = max(1, max_concurrent_flushes or ingest_pool.size or 1)
+        self._pending: List[Dict[str, Any]] = []
+        self._open_documents = 0
+        self._has_items: Optional[asyncio.Event] = None
+        self._flush_now: Optional[asyncio.Event] = None
+        self._capacity: Optional[asyncio.Semaphore] = None
+        self._flush_slots: Optional[asyncio.Semaphore] = None
+        self._flushes: set = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self):
+        # Loop-bound primitives are created lazily inside the running loop
+        if self._task is None or self._task.done():
+            self._has_items = asyncio.Event()
+            self._flush_now = asyncio.Event()
+            self._capacity = asyncio.Semaphore(self.max_pending_chunks)
+            self._flush_slots = asyncio.Semaphore(self.max_concurrent_flushes)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def open_document(self, documentId: str) -> DocumentTracker:
+        """
+        Start submitting chunks for a document
+        """
+        self._ensure_started()
+        self._open_documents += 1
+        return DocumentTracker(documentId)
+
+    async def add(self, tracker: DocumentTracker, text: str, metadata: dict, chunk_id: str = None):
+        """
+        Queue one chunk; waits when too many chunks are pending (backpressure)
+        """
+        await self._capacity.acquire()
+        tracker.submitted += 1
+        self._pending.append({"text": text, "metadata": metadata, "id": chunk_id, "tracker": tracker})
+        self._has_items.set()
+        if len(self._pending) >= self.batch_size:
+            self._flush_now.set()
+        metrics.set_gauge("ingestion_batcher.pending_chunks", len(self._pending))
+
+    def close_document(self, tracker: DocumentTracker):
+        """
+        No more chunks will be submitted for this document
+        """
+        if tracker.closed:
+            return
+        tracker.closed = True
+        self._open_documents -= 1
+        # Nobody else is producing chunks, so there is no point waiting for a fuller batch
+        if self._open_documents == 0 and self._pending:
+            self._flush_now.set()
+        tracker._check_done()
+
+    async def _run(self):
+        while True:
+            await self._has_items.wait()
+
+            if len(self._pending) < self.batch_size and self._open_documents > 0:
+                try:
+                    await asyncio.wait_for(self._flush_now.wait(), self.max_wait_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self._pending[:self.batch_size]
+            self._pending = self._pending[self.batch_size:]
+            if not self._pending:
+                self._has_items.clear()
+            if len(self._pending) < self.batch_size and (self._open_documents > 0 or not self._pending):
+                self._flush_now.clear()
+            metrics.set_gauge("ingestion_batcher.pending_chunks", len(self._pending))
+            if not batch:
+                continue
+
+            await self._flush_slots.acquire()
+            task = asyncio.create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Dict[str, Any]]):
+        started = time.perf_counter()
+        try:
+            texts = [entry["text"] for entry in batch]
+            ids = [entry["id"] for entry in batch]
+            embeddings = await self.ingest_pool.encode(texts)
+            await asyncio.to_thread(
+                self.vector_db_service.add_documents,
+                documents=texts,
+                metadata=[entry["metadata"] for entry in batch],
+                ids=ids if all(ids) else None,
+                embeddings=embeddings
+            )
+        except Exception as e:
+            logger.error(f"Error flushing ingestion batch of {len(batch)} chunks: {e}")
+            for entry in batch:
+                entry["tracker"].fail(e)
+        else:
+            metrics.increment("ingestion_batcher.batches")
+            metrics.observe("ingestion_batcher.batch_size", len(batch))
+            metrics.observe("ingestion_batcher.flush_seconds", time.perf_counter() - started)
+            documents = len({entry["tracker"].documentId for entry in batch})
+            logger.info(f"Persisted batch of {len(batch)} chunks from {documents} documents")
+            for entry in batch:
+                entry["tracker"].mark_persisted()
+        finally:
+            for _ in batch:
+                self._capacity.release()
+            self._flush_slots.release()
+
+    async def stop(self):
+        """
+        Wait for running flushes and stop the batching loop
+        """
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
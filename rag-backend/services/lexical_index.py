@@ -0,0 +1,175 @@
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Words plus identifier-like tokens such as "sku-1234" or "v2.0"
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+_STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how i in is it its of on or that the this
+to was were what when where which who why will with you your do does did can
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased terms; compound identifiers are indexed whole and as their parts
+    """
+    tokens = []
+    for match in _TOKEN_RE.findall(text.lower()):
+        if match in _STOPWORDS:
+            continue
+        tokens.append(match)
+        parts = re.split(r"[-_./]", match)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part and part not in _STOPWORDS)
+    return tokens
+
+class LexicalIndex:
+    """
+    Persistent BM25 inverted index kept alongside the vector collection.
+    Stored in SQLite so the ingestion worker can write while API workers read.
+    """
+
+    def __init__(self, db_path: str = None, k1: float = 1.2, b: float = 0.75):
+        self.db_path = db_path or settings.LEXICAL_INDEX_PATH
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "chunk_id TEXT PRIMARY KEY, document_id TEXT, length INTEGER NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS chunks_document_id ON chunks (document_id)")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS postings ("
+                "term TEXT NOT NULL, chunk_id TEXT NOT NULL, tf INTEGER NOT NULL, "
+                "PRIMARY KEY (term, chunk_id)) WITHOUT ROWID"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS postings_chunk_id ON postings (chunk_id)")
+            # Chunk count and total length for BM25, kept current by triggers so searches
+            # don't aggregate the whole chunks table. The row is seeded after the triggers
+            # exist, so writes from other processes are counted exactly once.
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS stats ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), chunk_count INTEGER NOT NULL, total_length INTEGER NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS chunks_insert_stats AFTER INSERT ON chunks BEGIN "
+                "UPDATE stats SET chunk_count = chunk_count + 1, total_length = total_length + NEW.length; END"
+            )
+            self._connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS chunks_delete_stats AFTER DELETE ON chunks BEGIN "
+                "UPDATE stats SET chunk_count = chunk_count - 1, total_length = total_length - OLD.length; END"
+            )
+            self._connection.execute(
+                "INSERT OR IGNORE INTO stats (id, chunk_count, total_length) "
+                "SELECT 0, COUNT(*), COALESCE(SUM(length), 0) FROM chunks"
+            )
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[dict]):
+        """
+        Index (or re-index) chunks
+        """
+        rows = []
+        postings = []
+        for chunk_id, text, metadata in zip(ids, documents, metadatas):
+            terms = Counter(tokenize(text or ""))
+            rows.append((chunk_id, (metadata or {}).get("documentId"), sum(terms.values())))
+            postings.extend((term, chunk_id, tf) for term, tf in terms.items())
+        with self._lock, self._connection:
+            self._delete_ids(ids)
+            self._connection.executemany("INSERT INTO chunks (chunk_id, document_id, length) VALUES (?, ?, ?)", rows)
+            self._connection.executemany("INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)", postings)
+
+    def delete(self, ids: List[str]):
+        with self._lock, self._connection:
+            self._delete_ids(ids)
+
+    def _delete_ids(self, ids: List[str]):
+        id_rows = [(chunk_id,) for chunk_id in ids]
+        self._connection.executemany("DELETE FROM postings WHERE chunk_id = ?", id_rows)
+        self._connection.executemany("DELETE FROM chunks WHERE chunk_id = ?", id_rows)
+
+    def search(self, query: str, documentsId: Optional[List[str]] = None, n_results: int = 5) -> List[Tuple[str, float]]:
+        """
+        Top chunks by BM25 score as (chunk_id, score), optionally limited to some documents
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        term_placeholders = ",".join("?" for _ in terms)
+        with self._lock:
+            total_chunks, total_length = self._connection.execute(
+                "SELECT chunk_count, total_length FROM stats WHERE id = 0"
+            ).fetchone()
+            if not total_chunks:
+                return []
+            document_frequency = dict(self._connection.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({term_placeholders}) GROUP BY term",
+                terms
+            ).fetchall())
+
+            # Skip terms present in most chunks: they barely move the score but dominate the scan
+            terms = [
+                term for term in terms
+                if 0 < document_frequency.get(term, 0) <= settings.LEXICAL_MAX_DF_RATIO * total_chunks
+            ]
+            if not terms:
+                return []
+
+            term_placeholders = ",".join("?" for _ in terms)
+            if documentsId:
+                # Scoped: start from the documents' chunks (document_id index) and probe each
+                # chunk's postings by primary key, instead of scanning every posting of the terms.
+                # CROSS JOIN keeps SQLite from reordering the loops.
+                sql = (
+                    "SELECT c.chunk_id, p.term, p.tf, c.length FROM chunks c "
+                    "CROSS JOIN postings p ON p.chunk_id = c.chunk_id "
+                    f"WHERE c.document_id IN ({','.join('?' for _ in documentsId)}) "
+                    f"AND p.term IN ({term_placeholders})"
+                )
+                params = list(documentsId) + terms
+            else:
+                sql = (
+                    "SELECT p.chunk_id, p.term, p.tf, c.length FROM postings p "
+                    "JOIN chunks c ON c.chunk_id = p.chunk_id "
+                    f"WHERE p.term IN ({term_placeholders})"
+                )
+                params = list(terms)
+            rows = self._connection.execute(sql, params).fetchall()
+
+        average_length = total_length / total_chunks if total_chunks else 1.0
+        scores: Dict[str, float] = {}
+        for chunk_id, term, tf, length in rows:
+            df = document_frequency[term]
+            idf = math.log(1 + (total_chunks - df + 0.5) / (df + 0.5))
+            norm = tf + self.k1 * (1 - self.b + self.b * length / (average_length or 1.0))
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse several ranked ID lists: score(id) = sum over lists of 1 / (k + rank)
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
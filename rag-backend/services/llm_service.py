@@ -1,11 +1,28 @@
 import logging
 from config import settings
-from typing import List, Dict, Any
-import httpx
+from typing import List, Dict, Any, AsyncIterator
 import json
+import hashlib
+from services.http_clients import http_clients, OLLAMA_CLIENT
+from services.context_builder import ContextBuilder
 
 logger = logging.getLogger(__name__)
 
+PROMPT_TEMPLATE = """Based on the following context, please answer the question below.
+
+        Context:
+        {context}
+
+        Question: {question}
+
+        Please provide a clear and concise answer based only on the information provided in the context. If the context doesn't contain enough information to answer the question completely, please say so."""
+
+class LLMServiceError(Exception):
+    """
+    Raised when the LLM could not produce an answer; the message is safe to show to users
+    """
+    pass
+
 class LLMService:
     def __init__(self, ):
          # Ollama configuration (completely free and open source)
@@ -13,9 +30,19 @@ class LLMService:
         self.model = getattr(settings, 'OLLAMA_MODEL', 'phi3')  # or 'llama2'
         self.max_tokens = 1000
         self.temperature = 0.7
+        self.prompt_template = PROMPT_TEMPLATE
+        self.context_builder = ContextBuilder()
+    
+    @property
+    def prompt_template_version(self) -> str:
+        """
+        Short fingerprint of the prompt template, used in answer cache keys
+        """
+        return hashlib.sha1(self.prompt_template.encode("utf-8")).hexdigest()[:12]
     
-    async def generate_answer(self, question: str, context: List[Dict[str, Any]]) -> str:
-        # Generate an answer using the LLM based on the question and retrieved context
+    async def generate_answer(self, question: str, context: List[Dict[str, Any]], raise_errors: bool = False) -> str:
+        # Generate an answer using the LLM based on the question and retrieved context.
+        # With raise_errors=True failures raise LLMServiceError instead of returning the error text.
         
         try:
             # Prepare context for the prompt
@@ -27,49 +54,101 @@ class LLMService:
             # Use Ollama (free and open source)
             ans = await self._generate_ollama_answer(prompt)
             return ans
-                
+        
+        except LLMServiceError as e:
+            if raise_errors:
+                raise
+            return str(e)
         except Exception as e:
             logger.error(f"Unexpected error in LLM service: {e}")
-            return "Sorry, I encountered an unexpected error while processing your question."
+            message = "Sorry, I encountered an unexpected error while processing your question."
+            if raise_errors:
+                raise LLMServiceError(message) from e
+            return message
+    
+    async def stream_answer(self, question: str, context: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        """
+        Stream answer tokens from Ollama as they are generated.
+        Raises LLMServiceError if generation fails.
+        """
+        context_text = self._prepare_context(context)
+        prompt = self._create_prompt(question, context_text)
+        
+        try:
+            client = http_clients.get(OLLAMA_CLIENT)
+            async with client.stream(
+                "POST",
+                f"{self.ollama_base_url}/api/generate",
+                json=self._build_ollama_payload(prompt, stream=True),
+                timeout=120.0
+            ) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    logger.error(f"Ollama API error: {response.status_code} - {body.decode(errors='replace')}")
+                    raise LLMServiceError(f"Error calling Ollama API: {response.status_code}")
+                
+                # Ollama streams one JSON object per line
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('error'):
+                        raise LLMServiceError(f"Error calling Ollama API: {chunk['error']}")
+                    token = chunk.get('response', '')
+                    if token:
+                        yield token
+                    if chunk.get('done'):
+                        break
+        
+        except LLMServiceError:
+            raise
+        except Exception as e:
+            logger.error(f"Ollama streaming API error: {e}")
+            raise LLMServiceError(f"Sorry, I encountered an error while processing your question: {str(e)}")
+    
+    def _build_ollama_payload(self, prompt: str, stream: bool = False) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {
+                "temperature": self.temperature,
+                "num_predict": self.max_tokens
+            }
+        }
     
     async def _generate_ollama_answer(self, prompt: str) -> str:
         # Generate answer using Ollama (free and open source)
         try:
-            async with httpx.AsyncClient() as client:
-                    payload = {
-                        "model": self.model,
-                        "prompt": prompt,
-                        "stream": False,
-                        "options": {
-                            "temperature": self.temperature,
-                            "num_predict": self.max_tokens
-                        }
-                    }
-                    print(f"{self.ollama_base_url}/api/generate")
-                    response = await client.post(
-                        f"{self.ollama_base_url}/api/generate",
-                        json=payload,
-                        timeout=120.0
-                    )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        return result.get('response', '').strip()
-                    else:
-                        logger.error(f"Ollama API error: {response.status_code} - {response.text}")
-                        return f"Error calling Ollama API: {response.status_code}"       
+            client = http_clients.get(OLLAMA_CLIENT)
+            payload = self._build_ollama_payload(prompt)
+            response = await client.post(
+                f"{self.ollama_base_url}/api/generate",
+                json=payload,
+                timeout=120.0
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                return result.get('response', '').strip()
+            else:
+                logger.error(f"Ollama API error: {response.status_code} - {response.text}")
+                raise LLMServiceError(f"Error calling Ollama API: {response.status_code}")
             
+        except LLMServiceError:
+            raise
         except Exception as e:
             logger.error(f"Ollama API error: {e}")
-            return f"Sorry, I encountered an error while processing your question: {str(e)}"
+            raise LLMServiceError(f"Sorry, I encountered an error while processing your question: {str(e)}")
     
     def _prepare_context(self, context: List[Dict[str, Any]]) -> str:
         # Prepare the context for the prompt
         if not context:
             return "No relevant context found."
         
+        # Merge overlapping neighbours, drop near-duplicates and fit the model's token budget
         context_parts = []
-        for i, item in enumerate(context, 1):
+        for i, item in enumerate(self.context_builder.build(context, self.model), 1):
             doc_text = item.get('document', '')
             metadata = item.get('metadata', {})
             source = metadata.get('source', 'Unknown source')
@@ -82,14 +161,7 @@ class LLMService:
         """
         Create the prompt for the LLM
         """
-        return f"""Based on the following context, please answer the question below.
-
-        Context:
-        {context}
-
-        Question: {question}
-
-        Please provide a clear and concise answer based only on the information provided in the context. If the context doesn't contain enough information to answer the question completely, please say so."""
+        return self.prompt_template.format(context=context, question=question)
     
     def set_model(self, model: str):
         """
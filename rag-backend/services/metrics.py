@@ -0,0 +1,46 @@
+import threading
+from typing import Dict, Any
+
+class MetricsRegistry:
+    """
+    Minimal in-process metrics registry (counters, gauges and value summaries)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._summaries: Dict[str, Dict[str, float]] = {}
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                self._summaries[name] = {"count": 1, "sum": value, "min": value, "max": value, "last": value}
+                return
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["min"] = min(summary["min"], value)
+            summary["max"] = max(summary["max"], value)
+            summary["last"] = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            summaries = {}
+            for name, summary in self._summaries.items():
+                summaries[name] = dict(summary, avg=summary["sum"] / summary["count"])
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "summaries": summaries
+            }
+
+metrics = MetricsRegistry()
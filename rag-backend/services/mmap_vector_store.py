@@ -0,0 +1,628 @@
+import importlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from config import settings
+from services.metrics import metrics
+from services.vector_store import VectorStore, QUERY_INCLUDE, GET_INCLUDE
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_DTYPES = ("float32", "float16")
+SUPPORTED_QUANTIZATION = ("none", "int8")
+
+# Rows scored per step on the brute-force path; bounds the float32 working set
+SCAN_BLOCK_ROWS = 65536
+# Rows per step when the scanned matrix is not float32 (int8 codes, float16): each block is
+# converted to float32 per query, so it is kept small (about 6 MB at 384 dimensions)
+CONVERTED_SCAN_BLOCK_ROWS = 4096
+
+# store_info code_scale of stores with one int8 scale per row (older stores hold a single global scale)
+ROW_CODE_SCALES = "row"
+
+# SQLite host parameter limit is 999 on older builds
+SQL_BATCH = 500
+
+def _normalize(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _top_k(rows: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Best k (row, score) pairs per query, highest score first; inputs are (queries, candidates)
+    """
+    if scores.shape[1] > k:
+        keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        rows = np.take_along_axis(rows, keep, axis=1)
+        scores = np.take_along_axis(scores, keep, axis=1)
+    order = np.argsort(-scores, axis=1)
+    return np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+class _HnswlibIndex:
+    """
+    hnswlib graph over store rows (labels are row numbers)
+    """
+
+    filters_deleted = True
+
+    def __init__(self, dim: int, capacity: int):
+        import hnswlib
+        self._index = hnswlib.Index(space="ip", dim=dim)
+        self._index.init_index(
+            max_elements=max(capacity, 1024),
+            ef_construction=settings.VECTOR_STORE_HNSW_EF_CONSTRUCTION,
+            M=settings.VECTOR_STORE_HNSW_M
+        )
+        self.live = 0
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray):
+        needed = self._index.get_current_count() + len(rows)
+        if needed > self._index.get_max_elements():
+            self._index.resize_index(max(needed, 2 * self._index.get_max_elements()))
+        self._index.add_items(vectors, rows)
+        self.live += len(rows)
+
+    def remove(self, rows: np.ndarray):
+        for row in rows:
+            try:
+                self._index.mark_deleted(int(row))
+                self.live -= 1
+            except RuntimeError:
+                # Row was never indexed (added and deleted between refreshes)
+                pass
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, self.live)
+        self._index.set_ef(max(settings.VECTOR_STORE_HNSW_EF_SEARCH, k))
+        labels, distances = self._index.knn_query(queries, k=k)
+        return labels.astype(np.int64), 1.0 - distances
+
+class _FaissIndex:
+    """
+    FAISS HNSW graph over store rows. FAISS graphs cannot delete, so tombstoned
+    rows stay in the graph and are filtered out by the store.
+    """
+
+    filters_deleted = False
+
+    def __init__(self, dim: int, capacity: int):
+        import faiss
+        self._hnsw = faiss.IndexHNSWFlat(dim, settings.VECTOR_STORE_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        self._hnsw.hnsw.efConstruction = settings.VECTOR_STORE_HNSW_EF_CONSTRUCTION
+        self._index = faiss.IndexIDMap(self._hnsw)
+        self.live = 0
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray):
+        self._index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), rows.astype(np.int64))
+        self.live += len(rows)
+
+    def remove(self, rows: np.ndarray):
+        self.live -= len(rows)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        self._hnsw.hnsw.efSearch = max(settings.VECTOR_STORE_HNSW_EF_SEARCH, k)
+        scores, labels = self._index.search(np.ascontiguousarray(queries, dtype=np.float32), k)
+        return labels, scores
+
+_ANN_BACKENDS = {"hnswlib": _HnswlibIndex, "faiss": _FaissIndex}
+
+def _load_ann_backend(name: str):
+    """
+    ANN index class for VECTOR_STORE_ANN (auto, hnswlib, faiss or none), or None
+    """
+    name = (name or "none").lower()
+    if name == "none":
+        return None
+    if name != "auto" and name not in _ANN_BACKENDS:
+        raise ValueError(f"Unknown ANN backend: {name}")
+    for candidate in (["hnswlib", "faiss"] if name == "auto" else [name]):
+        try:
+            importlib.import_module(candidate)
+            return _ANN_BACKENDS[candidate]
+        except ImportError:
+            if name != "auto":
+                logger.warning(f"{candidate} is not installed, large unscoped queries will use brute force. Install with: pip install {candidate}")
+    return None
+
+class MmapVectorStore(VectorStore):
+    """
+    In-process vector store: normalized embeddings live in a memory-mapped
+    float32/float16 matrix, ids, text and metadata in an SQLite sidecar.
+    Scoped (documentId) and small queries are scored exactly with NumPy; unscoped
+    queries over large corpora use an hnswlib/FAISS graph built in the background.
+    With int8 quantization, unscoped scans read a 1-byte-per-dimension copy of the
+    matrix and only the best candidates are rescored from the float vectors (no ANN
+    graph is built unless a backend is named explicitly).
+    Rows are append-only (updates and deletes tombstone the old row), so API
+    processes only have to map new rows and apply tombstones written by the worker.
+    """
+
+    def __init__(
+        self,
+        path: str = None,
+        dtype: str = None,
+        ann: str = None,
+        ann_threshold: int = None,
+        quantization: str = None,
+        rescore_multiplier: int = None
+    ):
+        self.path = path or settings.VECTOR_STORE_PATH
+        os.makedirs(self.path, exist_ok=True)
+        self.name = os.path.basename(os.path.abspath(self.path))
+        self.vectors_path = os.path.join(self.path, "vectors.bin")
+        self.codes_path = os.path.join(self.path, "codes.bin")
+        self.code_scales_path = os.path.join(self.path, "code_scales.bin")
+        self.ann_threshold = settings.VECTOR_STORE_ANN_THRESHOLD if ann_threshold is None else ann_threshold
+        self.rescore_multiplier = max(1, rescore_multiplier or settings.VECTOR_STORE_RESCORE_MULTIPLIER)
+        self._lock = threading.RLock()
+
+        self._connection = sqlite3.connect(
+            os.path.join(self.path, "chunks.sqlite3"), timeout=30.0, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "row INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL, document_id TEXT, document TEXT, "
+            "metadata TEXT, deleted INTEGER NOT NULL DEFAULT 0, seq INTEGER NOT NULL)"
+        )
+        self._connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS chunks_live_id ON chunks (chunk_id) WHERE deleted = 0")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS chunks_live_document ON chunks (document_id) WHERE deleted = 0")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS chunks_seq ON chunks (seq)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS store_info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        info = self._read_info()
+        requested = dtype or settings.VECTOR_STORE_DTYPE
+        if "dtype" in info and info["dtype"] != requested:
+            logger.warning(f"Vector store at {self.path} holds {info['dtype']} vectors, ignoring VECTOR_STORE_DTYPE={requested}")
+        self.dtype = np.dtype(info.get("dtype", requested))
+        if self.dtype.name not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported vector store dtype: {self.dtype.name}")
+        requested = quantization or settings.VECTOR_STORE_QUANTIZATION
+        if "quantization" in info and info["quantization"] != requested:
+            logger.warning(f"Vector store at {self.path} uses {info['quantization']} quantization, ignoring VECTOR_STORE_QUANTIZATION={requested}")
+        self.quantization = info.get("quantization", requested)
+        if self.quantization not in SUPPORTED_QUANTIZATION:
+            raise ValueError(f"Unsupported vector store quantization: {self.quantization}")
+        self.code_scale = self._global_code_scale(info)
+        # An ANN graph holds its own float32 copy of every vector in RAM, which undoes the int8
+        # saving, so quantized stores only build one when a backend is named explicitly
+        ann = (ann or settings.VECTOR_STORE_ANN).lower()
+        if self.quantization == "int8" and ann == "auto":
+            ann = "none"
+        elif self.quantization == "int8" and ann != "none":
+            logger.info(f"Vector store at {self.path} is int8 quantized but VECTOR_STORE_ANN={ann}: the graph keeps float32 vectors in memory")
+        self._ann_class = _load_ann_backend(ann)
+        self.dim = int(info["dim"]) if "dim" in info else None
+
+        # In-memory view of the store, brought up to date by _refresh()
+        self._matrix = None
+        self._codes = None
+        self._code_scales = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._live_count = 0
+        self._seq = 0
+        self._ann = None
+        self._ann_building = False
+
+    def _read_info(self) -> Dict[str, str]:
+        return dict(self._connection.execute("SELECT key, value FROM store_info").fetchall())
+
+    def _write_info(self, **values):
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO store_info (key, value) VALUES (?, ?)",
+            [(key, str(value)) for key, value in values.items()]
+        )
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        # Last write wins for IDs repeated within one call
+        positions = list({chunk_id: i for i, chunk_id in enumerate(ids)}.values())
+        vectors = _normalize(embeddings)[positions]
+
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                info = self._read_info()
+                dim = int(info.get("dim", vectors.shape[1]))
+                if vectors.shape[1] != dim:
+                    raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match store dimension {dim}")
+                first_row = int(info.get("rows", 0))
+                seq = int(info.get("seq", 0)) + 1
+
+                # Vectors are written before the rows are committed, so readers never map a row without its vector
+                self._write_rows(self.vectors_path, first_row, vectors.astype(self.dtype))
+                if self.quantization == "int8":
+                    codes, scales = self._encode(vectors, info)
+                    self._write_rows(self.codes_path, first_row, codes)
+                    if scales is not None:
+                        self._write_rows(self.code_scales_path, first_row, scales[:, None])
+                self._tombstone([ids[i] for i in positions], seq)
+                self._connection.executemany(
+                    "INSERT INTO chunks (row, chunk_id, document_id, document, metadata, seq) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            first_row + offset,
+                            ids[i],
+                            (metadatas[i] or {}).get("documentId"),
+                            documents[i],
+                            json.dumps(metadatas[i] or {}),
+                            seq
+                        )
+                        for offset, i in enumerate(positions)
+                    ]
+                )
+                self._write_info(
+                    dim=dim,
+                    dtype=self.dtype.name,
+                    quantization=self.quantization,
+                    rows=first_row + len(positions),
+                    seq=seq
+                )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+            self.dim = dim
+
+    @staticmethod
+    def _global_code_scale(info: Dict[str, str]) -> Optional[float]:
+        scale = info.get("code_scale")
+        return None if scale is None or scale == ROW_CODE_SCALES else float(scale)
+
+    def _encode(self, vectors: np.ndarray, info: Dict[str, str]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Symmetric int8 codes, each row scaled by its own largest component (returned as float32
+        scales), so no value is ever clipped. Stores created with a single global scale keep it.
+        """
+        if self._global_code_scale(info) is not None:
+            return np.clip(np.rint(vectors * (127.0 / self.code_scale)), -127, 127).astype(np.int8), None
+        if "code_scale" not in info:
+            self._write_info(code_scale=ROW_CODE_SCALES)
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-6).astype(np.float32)
+        codes = np.clip(np.rint(vectors * (127.0 / scales[:, None])), -127, 127).astype(np.int8)
+        return codes, scales
+
+    def _write_rows(self, path: str, first_row: int, values: np.ndarray):
+        row_bytes = values.dtype.itemsize * values.shape[1]
+        start = first_row * row_bytes
+        end = start + len(values) * row_bytes
+        with open(path, "r+b" if os.path.exists(path) else "w+b") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < end:
+                # Grow geometrically so appends don't resize the file every batch
+                file.truncate(max(end, 2 * size))
+            file.seek(start)
+            file.write(values.tobytes())
+
+    def _tombstone(self, ids: List[str], seq: int):
+        self._connection.executemany(
+            "UPDATE chunks SET deleted = 1, seq = ? WHERE chunk_id = ? AND deleted = 0",
+            [(seq, chunk_id) for chunk_id in ids]
+        )
+
+    def update_metadata(self, ids, metadatas):
+        # Rows keep their vectors and sequence number: readers fetch metadata from SQLite on every query
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.executemany(
+                    "UPDATE chunks SET metadata = ? WHERE chunk_id = ? AND deleted = 0",
+                    [(json.dumps(metadata or {}), chunk_id) for chunk_id, metadata in zip(ids, metadatas)]
+                )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def delete(self, ids):
+        if not ids:
+            return
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                seq = int(self._read_info().get("seq", 0)) + 1
+                self._tombstone(ids, seq)
+                self._write_info(seq=seq)
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def _refresh(self):
+        """
+        Map new rows and apply tombstones written since the last refresh (possibly by another process)
+        """
+        info = self._read_info()
+        seq = int(info.get("seq", 0))
+        if seq == self._seq:
+            return
+        rows = int(info["rows"])
+        self.dim = int(info["dim"])
+        if rows > len(self._alive):
+            self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+            if self.quantization == "int8":
+                self._codes = np.memmap(self.codes_path, dtype=np.int8, mode="r", shape=(rows, self.dim))
+                self.code_scale = self._global_code_scale(info)
+                if self.code_scale is None:
+                    self._code_scales = np.memmap(self.code_scales_path, dtype=np.float32, mode="r", shape=(rows,))
+            alive = np.zeros(rows, dtype=bool)
+            alive[:len(self._alive)] = self._alive
+            self._alive = alive
+
+        added, removed = self._changes(self._seq, seq)
+        self._alive[added] = True
+        self._alive[removed] = False
+        if self._ann is not None:
+            self._apply_to_ann(self._ann, added, removed)
+        self._live_count = int(self._alive.sum())
+        self._seq = seq
+
+    def _changes(self, since_seq: int, until_seq: int) -> Tuple[np.ndarray, np.ndarray]:
+        changed = np.array(
+            self._connection.execute(
+                "SELECT row, deleted FROM chunks WHERE seq > ? AND seq <= ?", (since_seq, until_seq)
+            ).fetchall(),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        return changed[changed[:, 1] == 0, 0], changed[changed[:, 1] == 1, 0]
+
+    def _apply_to_ann(self, index, added: np.ndarray, removed: np.ndarray):
+        if len(removed):
+            index.remove(removed)
+        if len(added):
+            index.add(added, np.asarray(self._matrix[added], dtype=np.float32))
+
+    def _maybe_build_ann(self):
+        if self._ann_class is None or self._ann is not None or self._ann_building:
+            return
+        if self._live_count < self.ann_threshold:
+            return
+        self._ann_building = True
+        threading.Thread(target=self.build_ann, name="vector-store-ann-build", daemon=True).start()
+
+    def build_ann(self):
+        """
+        Build the ANN graph from the mapped rows. Normally started in the background by the first
+        large unscoped query (which uses brute force until the graph is ready); call it directly to warm up.
+        """
+        if self._ann_class is None:
+            return
+        started = time.perf_counter()
+        self._ann_building = True
+        try:
+            with self._lock:
+                self._refresh()
+                seq, matrix, alive = self._seq, self._matrix, self._alive.copy()
+            if matrix is None:
+                return
+            logger.info(f"Building {self._ann_class.__name__.strip('_')} over {int(alive.sum())} vectors")
+            index = self._ann_class(self.dim, len(alive))
+            rows = np.flatnonzero(alive)
+            for start in range(0, len(rows), SCAN_BLOCK_ROWS):
+                block = rows[start:start + SCAN_BLOCK_ROWS]
+                index.add(block, np.asarray(matrix[block], dtype=np.float32))
+
+            with self._lock:
+                # Catch up with writes refreshed while the graph was building
+                self._apply_to_ann(index, *self._changes(seq, self._seq))
+                self._ann = index
+            elapsed = time.perf_counter() - started
+            metrics.observe("vector_store.ann_build_seconds", elapsed)
+            logger.info(f"ANN index ready in {elapsed:.1f}s")
+        except Exception as e:
+            logger.error(f"Error building ANN index, falling back to brute force: {e}")
+            self._ann_class = None
+        finally:
+            self._ann_building = False
+
+    def query(self, query_embeddings, n_results, documentsId=None, include=QUERY_INCLUDE):
+        queries = _normalize(query_embeddings)
+        with self._lock:
+            self._refresh()
+            matrix, codes, alive, live_count = self._matrix, self._codes, self._alive, self._live_count
+            code_scales = self._code_scales
+            scope = self._scoped_rows(documentsId, len(alive)) if documentsId else None
+
+        if matrix is None or not live_count or n_results <= 0:
+            rows = scores = [np.empty(0, dtype=np.int64) for _ in queries]
+        elif scope is not None:
+            rows, scores = self._score_rows(matrix, scope, queries, n_results)
+        else:
+            found = self._ann_search(queries, n_results, alive, live_count)
+            if found is not None:
+                rows, scores = found
+            elif codes is not None:
+                candidates, _ = self._scan(
+                    codes, alive, queries, n_results * self.rescore_multiplier,
+                    scale=1.0 / 127.0 if code_scales is not None else self.code_scale / 127.0,
+                    row_scales=code_scales
+                )
+                rows, scores = self._rescore(matrix, candidates, queries, n_results)
+            else:
+                rows, scores = self._scan(matrix, alive, queries, n_results)
+        return self._format_query(rows, scores, include)
+
+    def _scoped_rows(self, documentsId: Sequence[str], mapped_rows: int) -> np.ndarray:
+        rows = []
+        documentsId = list(documentsId)
+        for start in range(0, len(documentsId), SQL_BATCH):
+            batch = documentsId[start:start + SQL_BATCH]
+            rows.extend(row for (row,) in self._connection.execute(
+                f"SELECT row FROM chunks WHERE deleted = 0 AND document_id IN ({','.join('?' for _ in batch)})",
+                batch
+            ))
+        rows = np.array(sorted(rows), dtype=np.int64)
+        # Rows committed by another process after this refresh are not mapped yet
+        return rows[rows < mapped_rows]
+
+    def _score_rows(self, matrix, rows: np.ndarray, queries: np.ndarray, k: int):
+        """
+        Exact scores for a subset of rows (scoped queries cost time proportional to the scope)
+        """
+        if not len(rows):
+            return [np.empty(0, dtype=np.int64) for _ in queries], [np.empty(0) for _ in queries]
+        scores = (np.asarray(matrix[rows], dtype=np.float32) @ queries.T).T
+        return _top_k(np.broadcast_to(rows, scores.shape), scores, k)
+
+    def _scan(self, matrix, alive: np.ndarray, queries: np.ndarray, k: int, scale: float = 1.0, row_scales=None):
+        """
+        Top-k over all live rows, scored block by block (exact unless `matrix` holds int8 codes,
+        whose scores are multiplied by `scale` and, per row, by `row_scales`)
+        """
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        block_rows = SCAN_BLOCK_ROWS if matrix.dtype == np.float32 else CONVERTED_SCAN_BLOCK_ROWS
+        for start in range(0, len(alive), block_rows):
+            end = min(len(alive), start + block_rows)
+            mask = alive[start:end]
+            if not mask.any():
+                continue
+            # Score the whole block and mask tombstones afterwards, rather than copying the live rows out
+            scores = (np.asarray(matrix[start:end], dtype=np.float32) @ queries.T).T
+            if scale != 1.0:
+                scores *= scale
+            if row_scales is not None:
+                scores *= row_scales[start:end]
+            scores[:, ~mask] = -np.inf
+            best_rows, best_scores = _top_k(
+                np.concatenate([best_rows, np.broadcast_to(np.arange(start, end), scores.shape)], axis=1),
+                np.concatenate([best_scores, scores], axis=1),
+                k
+            )
+        live = np.isfinite(best_scores)
+        return [rows[found] for rows, found in zip(best_rows, live)], [scores[found] for scores, found in zip(best_scores, live)]
+
+    def _rescore(self, matrix, candidates: List[np.ndarray], queries: np.ndarray, k: int):
+        """
+        Exact float scores for each query's quantized candidates; only these rows of the float matrix are read
+        """
+        rows, scores = [], []
+        for query, query_rows in zip(queries, candidates):
+            query_rows = np.sort(query_rows)
+            exact = np.asarray(matrix[query_rows], dtype=np.float32) @ query
+            order = np.argsort(-exact)[:k]
+            rows.append(query_rows[order])
+            scores.append(exact[order])
+        return rows, scores
+
+    def _ann_search(self, queries: np.ndarray, k: int, alive: np.ndarray, live_count: int):
+        """
+        Top-k from the ANN graph, or None when it is not available (brute force is used instead)
+        """
+        if self._ann_class is None or live_count < self.ann_threshold:
+            return None
+        with self._lock:
+            index = self._ann
+            if index is None:
+                self._maybe_build_ann()
+                return None
+            fetch = k if index.filters_deleted else 2 * k
+            try:
+                labels, scores = index.search(queries, fetch)
+            except RuntimeError as e:
+                logger.warning(f"ANN search failed, using brute force: {e}")
+                return None
+
+        expected = min(k, live_count)
+        rows, kept_scores = [], []
+        for query_labels, query_scores in zip(labels, scores):
+            valid = (query_labels >= 0) & (query_labels < len(alive))
+            valid[valid] = alive[query_labels[valid]]
+            if valid.sum() < expected:
+                return None
+            rows.append(query_labels[valid][:k])
+            kept_scores.append(query_scores[valid][:k])
+        return rows, kept_scores
+
+    def _fetch_rows(self, rows: List[int], include: Sequence[str] = QUERY_INCLUDE) -> Dict[int, tuple]:
+        # Chunk text is only read from SQLite when it was asked for
+        document_column = "document" if "documents" in include else "NULL"
+        metadata_column = "metadata" if "metadatas" in include else "NULL"
+        fetched = {}
+        with self._lock:
+            for start in range(0, len(rows), SQL_BATCH):
+                batch = rows[start:start + SQL_BATCH]
+                for row, chunk_id, document, metadata in self._connection.execute(
+                    f"SELECT row, chunk_id, {document_column}, {metadata_column} FROM chunks WHERE row IN ({','.join('?' for _ in batch)})",
+                    batch
+                ):
+                    fetched[row] = (chunk_id, document, metadata)
+        return fetched
+
+    def _format_query(self, rows, scores, include) -> Dict[str, Any]:
+        fetched = self._fetch_rows(sorted({int(row) for query_rows in rows for row in query_rows}), include)
+        results = {"ids": [], "documents": None, "metadatas": None, "distances": None}
+        for field in ("documents", "metadatas", "distances"):
+            if field in include:
+                results[field] = []
+        for query_rows, query_scores in zip(rows, scores):
+            hits = [(fetched[int(row)], float(score)) for row, score in zip(query_rows, query_scores) if int(row) in fetched]
+            results["ids"].append([chunk_id for (chunk_id, _, _), _ in hits])
+            if results["documents"] is not None:
+                results["documents"].append([document for (_, document, _), _ in hits])
+            if results["metadatas"] is not None:
+                results["metadatas"].append([json.loads(metadata) for (_, _, metadata), _ in hits])
+            if results["distances"] is not None:
+                results["distances"].append([1.0 - score for _, score in hits])
+        return results
+
+    def get(self, ids=None, documentId=None, include=GET_INCLUDE, limit=None, offset=0):
+        # Metadata-only pages (/stats, /export) don't read the chunk text
+        document_column = "document" if "documents" in include else "NULL"
+        metadata_column = "metadata" if "metadatas" in include else "NULL"
+        sql = f"SELECT row, chunk_id, {document_column}, {metadata_column} FROM chunks WHERE deleted = 0"
+        params: List[Any] = []
+        if documentId is not None:
+            sql += " AND document_id = ?"
+            params.append(documentId)
+
+        with self._lock:
+            if ids is None:
+                sql += " ORDER BY row LIMIT ? OFFSET ?"
+                found = self._connection.execute(sql, params + [-1 if limit is None else limit, offset]).fetchall()
+            else:
+                found = []
+                for start in range(0, len(ids), SQL_BATCH):
+                    batch = ids[start:start + SQL_BATCH]
+                    found.extend(self._connection.execute(
+                        sql + f" AND chunk_id IN ({','.join('?' for _ in batch)})", params + list(batch)
+                    ))
+                found = found[offset:None if limit is None else offset + limit]
+            if "embeddings" in include:
+                self._refresh()
+                matrix, mapped_rows = self._matrix, len(self._alive)
+                found = [entry for entry in found if entry[0] < mapped_rows]
+
+        results = {"ids": [chunk_id for _, chunk_id, _, _ in found], "documents": None, "metadatas": None, "embeddings": None}
+        if "documents" in include:
+            results["documents"] = [document for _, _, document, _ in found]
+        if "metadatas" in include:
+            results["metadatas"] = [json.loads(metadata) for _, _, _, metadata in found]
+        if "embeddings" in include:
+            rows = np.array([row for row, _, _, _ in found], dtype=np.int64)
+            results["embeddings"] = np.asarray(matrix[rows], dtype=np.float32).tolist() if len(rows) else []
+        return results
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self._live_count
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+            self._matrix = None
+            self._codes = None
+            self._code_scales = None
+            self._ann = None
@@ -2,6 +2,7 @@ import httpx
 import time
 from typing import Optional, Dict, Any
 from config import settings
+from services.http_clients import http_clients, NEST_API_CLIENT
 
 class NestAPIService:
     def __init__(self):
@@ -21,26 +22,25 @@ class NestAPIService:
             return self._service_token
         
         try:
-            # Use httpx for service authentication
-            import httpx
-            async with httpx.AsyncClient() as client:
-                auth_response = await client.post(
-                    f"{self.base_url}/service-auth/authenticate",
-                    json={
-                        "serviceId": self.service_id,
-                        "serviceSecret": self.service_secret
-                    },
-                    headers={"Content-Type": "application/json"},
-                    timeout=10.0
-                )
-                
-                if auth_response.status_code == 200:
-                    auth_data = auth_response.json()
-                    self._service_token = auth_data["data"]["accessToken"]
-                    self._token_expires_at = current_time + auth_data["data"]["expiresIn"]
-                    return self._service_token
-                else:
-                    raise Exception(f"Service authentication failed: {auth_response.status_code}")
+            # Use the shared, pooled client for service authentication
+            client = http_clients.get(NEST_API_CLIENT)
+            auth_response = await client.post(
+                f"{self.base_url}/service-auth/authenticate",
+                json={
+                    "serviceId": self.service_id,
+                    "serviceSecret": self.service_secret
+                },
+                headers={"Content-Type": "application/json"},
+                timeout=10.0
+            )
+            
+            if auth_response.status_code == 200:
+                auth_data = auth_response.json()
+                self._service_token = auth_data["data"]["accessToken"]
+                self._token_expires_at = current_time + auth_data["data"]["expiresIn"]
+                return self._service_token
+            else:
+                raise Exception(f"Service authentication failed: {auth_response.status_code}")
                 
         except Exception as e:
             print(f"Failed to authenticate service: {e}")
@@ -58,9 +58,9 @@ class NestAPIService:
         url = f"{self.base_url}{endpoint}"
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.request(method, url, **kwargs)
-                return response
+            client = http_clients.get(NEST_API_CLIENT)
+            response = await client.request(method, url, **kwargs)
+            return response
         except Exception as e:
             print(f"Request failed: {e}")
             raise
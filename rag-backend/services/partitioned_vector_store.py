@@ -0,0 +1,438 @@
+import collections
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from config import settings
+from services.cache import LRUCache
+from services.vector_store import VectorStore, QUERY_INCLUDE, GET_INCLUDE
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = "documents-"
+PARTITION_MODES = ("hash", "document")
+# In document mode every chunk is also written to this partition, which serves unscoped
+# queries, counts and paging instead of visiting every document's partition
+GLOBAL_PARTITION = f"{PARTITION_PREFIX}all"
+# Partition names recently found not to exist (unknown file_ids), remembered for list_ttl
+MISSING_PARTITION_CACHE_SIZE = 4096
+
+class _OpenPartition:
+    """
+    An open partition and the number of calls using it; evicted partitions close once unused
+    """
+    __slots__ = ("store", "users", "evicted")
+
+    def __init__(self, store: VectorStore):
+        self.store = store
+        self.users = 0
+        self.evicted = False
+
+class PartitionedVectorStore(VectorStore):
+    """
+    Routes chunks into several child stores (partitions) by documentId, so that
+    file_id-scoped queries only touch the partitions holding those documents and
+    cost time proportional to them, not to the whole corpus.
+    "hash" mode spreads documents over a fixed number of buckets, and unscoped queries
+    fan out to all of them with the per-partition top-k lists merged by distance.
+    "document" mode gives every document its own partition and also keeps every chunk
+    in a global partition, which answers unscoped queries, counts and paging.
+    At most `max_open` partitions stay open (least recently used ones are closed).
+    The partition list and partitions found missing are cached for `list_ttl` seconds,
+    since the ingestion worker may create partitions from another process.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        open_partition: Callable[[str], VectorStore],
+        list_partitions: Callable[[], List[str]],
+        partition_exists: Callable[[str], bool],
+        mode: str = None,
+        partitions: int = None,
+        max_open: int = None,
+        list_ttl: float = None
+    ):
+        self.path = path
+        self.mode = (mode or settings.VECTOR_STORE_PARTITION_MODE).lower()
+        if self.mode not in PARTITION_MODES:
+            raise ValueError(f"Unknown partition mode: {self.mode}")
+        self.partitions = max(1, partitions or settings.VECTOR_STORE_PARTITIONS)
+        self.max_open = max(1, max_open or settings.VECTOR_STORE_MAX_OPEN_PARTITIONS)
+        self.list_ttl = settings.VECTOR_STORE_PARTITION_LIST_TTL_SECONDS if list_ttl is None else list_ttl
+        self.name = f"documents[{self.mode}]"
+        self._open_partition = open_partition
+        self._list_partitions = list_partitions
+        self._partition_exists = partition_exists
+        self._missing = LRUCache(
+            max_size=MISSING_PARTITION_CACHE_SIZE if self.list_ttl > 0 else 0,
+            ttl_seconds=self.list_ttl,
+            name="partition_missing_cache"
+        )
+        self._stores: "collections.OrderedDict[str, _OpenPartition]" = collections.OrderedDict()
+        self._known: set = set()
+        self._names: Optional[List[str]] = None
+        self._listed_at = 0.0
+        # Where the last unfiltered page ended: (offset, partition names, partition index, offset in partition)
+        self._page_cursor: Optional[Tuple[int, Tuple[str, ...], int, int]] = None
+        self._lock = threading.Lock()
+
+    def partition_for(self, documentId: Optional[str]) -> str:
+        digest = hashlib.sha1(str(documentId or "").encode("utf-8")).hexdigest()
+        if self.mode == "document":
+            return f"{PARTITION_PREFIX}{digest[:24]}"
+        return f"{PARTITION_PREFIX}{int(digest[:8], 16) % self.partitions:04d}"
+
+    def _relist(self):
+        # Caller holds the lock
+        self._known = (set(self._list_partitions()) | set(self._stores)) - {GLOBAL_PARTITION}
+        self._names = sorted(self._known)
+        self._listed_at = time.monotonic()
+
+    def _partition_names(self) -> List[str]:
+        with self._lock:
+            if self._names is None or time.monotonic() - self._listed_at > self.list_ttl:
+                self._relist()
+            return self._names
+
+    def _fanout_names(self) -> List[str]:
+        """
+        Partitions that together hold every chunk exactly once
+        """
+        return [GLOBAL_PARTITION] if self.mode == "document" else self._partition_names()
+
+    @contextmanager
+    def _lease(self, name: str, create: bool = False) -> Iterator[Optional[VectorStore]]:
+        """
+        Use a partition, opening it if needed; without `create`, partitions that don't exist yet give None
+        """
+        to_close = []
+        with self._lock:
+            entry = self._stores.get(name)
+            if entry is None:
+                if not create and name not in self._known:
+                    # Another process (the ingestion worker) may have created it since we last
+                    # looked; a name found missing is not checked again for list_ttl seconds
+                    if self._missing.get(name) is not None:
+                        entry = False
+                    elif not self._partition_exists(name):
+                        self._missing.put(name, True)
+                        entry = False
+                if entry is None:
+                    entry = _OpenPartition(self._open_partition(name))
+                    self._stores[name] = entry
+                    if name not in self._known and name != GLOBAL_PARTITION:
+                        self._known.add(name)
+                        self._names = None
+                    while len(self._stores) > self.max_open:
+                        _, evicted = self._stores.popitem(last=False)
+                        evicted.evicted = True
+                        if evicted.users == 0:
+                            to_close.append(evicted.store)
+            else:
+                self._stores.move_to_end(name)
+            if entry:
+                entry.users += 1
+        self._close_stores(to_close)
+        if not entry:
+            yield None
+            return
+        try:
+            yield entry.store
+        finally:
+            with self._lock:
+                entry.users -= 1
+                close = entry.evicted and entry.users == 0
+            if close:
+                self._close_stores([entry.store])
+
+    def _close_stores(self, stores: List[VectorStore]):
+        for store in stores:
+            try:
+                store.close()
+            except Exception as e:
+                logger.error(f"Error closing partition {getattr(store, 'name', '?')}: {e}")
+
+    def _each_partition(self) -> Iterator[VectorStore]:
+        for name in self._fanout_names():
+            with self._lease(name) as store:
+                if store is not None:
+                    yield store
+
+    def _group_ids(self, ids: Sequence[str]) -> Dict[Optional[str], List[str]]:
+        """
+        Group chunk IDs by partition using the documentId prefix of deterministic chunk IDs
+        ("{documentId}:{hash}"); other IDs are grouped under None and looked up everywhere
+        """
+        groups: Dict[Optional[str], List[str]] = {}
+        for chunk_id in ids:
+            name = self.partition_for(chunk_id.rsplit(":", 1)[0]) if ":" in chunk_id else None
+            groups.setdefault(name, []).append(chunk_id)
+        return groups
+
+    def _stores_for_ids(self, ids: Sequence[str], include_global: bool = False):
+        """
+        (store, ids) pairs for the partitions holding the given chunks; with `include_global`,
+        document mode also yields the global partition so writes reach both copies
+        """
+        for name, group in self._group_ids(ids).items():
+            if name is None:
+                for store in self._each_partition():
+                    yield store, group
+            else:
+                with self._lease(name) as store:
+                    if store is not None:
+                        yield store, group
+        if include_global and self.mode == "document":
+            with self._lease(GLOBAL_PARTITION) as store:
+                if store is not None:
+                    yield store, list(ids)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        groups: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            groups.setdefault(self.partition_for((metadata or {}).get("documentId")), []).append(i)
+        if self.mode == "document":
+            groups[GLOBAL_PARTITION] = list(range(len(ids)))
+        for name, positions in groups.items():
+            with self._lease(name, create=True) as store:
+                store.upsert(
+                    ids=[ids[i] for i in positions],
+                    embeddings=[embeddings[i] for i in positions],
+                    documents=[documents[i] for i in positions],
+                    metadatas=[metadatas[i] for i in positions]
+                )
+
+    def query(self, query_embeddings, n_results, documentsId=None, include=QUERY_INCLUDE):
+        if documentsId:
+            names = sorted({self.partition_for(documentId) for documentId in documentsId})
+            # A per-document partition holds only that document, so it needs no filter
+            child_filter = None if self.mode == "document" else documentsId
+        else:
+            names = self._fanout_names()
+            child_filter = None
+
+        child_include = list(dict.fromkeys(list(include) + ["distances"]))
+        merged: List[List[tuple]] = [[] for _ in query_embeddings]
+        for name in names:
+            with self._lease(name) as store:
+                if store is None:
+                    continue
+                results = store.query(query_embeddings, n_results, documentsId=child_filter, include=child_include)
+            for q, ids in enumerate(results['ids']):
+                for i, chunk_id in enumerate(ids):
+                    merged[q].append((
+                        results['distances'][q][i],
+                        chunk_id,
+                        results['documents'][q][i] if results.get('documents') else None,
+                        results['metadatas'][q][i] if results.get('metadatas') else None
+                    ))
+
+        formatted = {"ids": [], "documents": None, "metadatas": None, "distances": None}
+        for field in ("documents", "metadatas", "distances"):
+            if field in include:
+                formatted[field] = []
+        for hits in merged:
+            hits = sorted(hits, key=lambda hit: hit[0])[:n_results]
+            formatted["ids"].append([hit[1] for hit in hits])
+            if formatted["distances"] is not None:
+                formatted["distances"].append([hit[0] for hit in hits])
+            if formatted["documents"] is not None:
+                formatted["documents"].append([hit[2] for hit in hits])
+            if formatted["metadatas"] is not None:
+                formatted["metadatas"].append([hit[3] for hit in hits])
+        return formatted
+
+    def get(self, ids=None, documentId=None, include=GET_INCLUDE, limit=None, offset=0):
+        if ids is None and documentId is None:
+            return self._get_page(include, limit, offset)
+
+        merged = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+
+        def collect(store, group):
+            page = store.get(ids=group, documentId=documentId, include=include)
+            merged["ids"].extend(page['ids'])
+            for field in ("documents", "metadatas", "embeddings"):
+                if field in include and page.get(field) is not None:
+                    merged[field].extend(page[field])
+
+        if ids is not None:
+            for store, group in self._stores_for_ids(ids):
+                collect(store, group)
+        else:
+            with self._lease(self.partition_for(documentId)) as store:
+                if store is not None:
+                    collect(store, None)
+        end = None if limit is None else offset + limit
+        return {
+            field: values[offset:end] if (field == "ids" or field in include) else None
+            for field, values in merged.items()
+        }
+
+    def _get_page(self, include, limit, offset):
+        """
+        Page across partitions in name order. A page that starts where the previous one
+        ended resumes from a cursor; other offsets skip whole partitions by their counts.
+        """
+        names = tuple(self._fanout_names())
+        cursor = self._page_cursor
+        if cursor is not None and cursor[0] == offset and cursor[1] == names:
+            index, inner, resumed = cursor[2], cursor[3], True
+        else:
+            index, inner, resumed = 0, offset, False
+
+        merged = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        remaining = limit
+        while index < len(names) and (remaining is None or remaining > 0):
+            with self._lease(names[index]) as store:
+                if store is None:
+                    index, inner = index + 1, 0
+                    continue
+                if not resumed and inner > 0:
+                    size = store.count()
+                    if inner >= size:
+                        index, inner = index + 1, inner - size
+                        continue
+                page = store.get(include=include, limit=remaining, offset=inner)
+            merged["ids"].extend(page['ids'])
+            for field in ("documents", "metadatas", "embeddings"):
+                if field in include and page.get(field) is not None:
+                    merged[field].extend(page[field])
+            if remaining is not None:
+                remaining -= len(page['ids'])
+                if remaining <= 0:
+                    inner += len(page['ids'])
+                    break
+            index, inner = index + 1, 0
+        self._page_cursor = (offset + len(merged["ids"]), names, index, inner)
+        return {field: values if (field == "ids" or field in include) else None for field, values in merged.items()}
+
+    def update_metadata(self, ids, metadatas):
+        by_id = dict(zip(ids, metadatas))
+        for store, group in self._stores_for_ids(ids, include_global=True):
+            store.update_metadata(group, [by_id[chunk_id] for chunk_id in group])
+
+    def delete(self, ids):
+        for store, group in self._stores_for_ids(ids, include_global=True):
+            store.delete(group)
+
+    def count(self) -> int:
+        return sum(store.count() for store in self._each_partition())
+
+    def ensure_global_index(self, page_size: int = None) -> int:
+        """
+        Document mode: fill the global partition from the per-document partitions when it is
+        missing (stores partitioned before it was kept). Returns the number of chunks copied.
+        """
+        names = self._list_partitions()
+        if self.mode != "document" or GLOBAL_PARTITION in names or not names:
+            return 0
+        page_size = page_size or settings.STATS_PAGE_SIZE
+        logger.warning(f"Building the global partition of {self.path} from {len(names)} document partitions")
+        copied = 0
+        for name in sorted(names):
+            offset = 0
+            while True:
+                with self._lease(name) as source:
+                    page = source.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset)
+                if not page['ids']:
+                    break
+                with self._lease(GLOBAL_PARTITION, create=True) as target:
+                    target.upsert(page['ids'], page['embeddings'], page['documents'], page['metadatas'])
+                offset += len(page['ids'])
+                copied += len(page['ids'])
+        logger.info(f"Copied {copied} chunks into the global partition")
+        return copied
+
+    def close(self):
+        with self._lock:
+            entries = list(self._stores.values())
+            self._stores.clear()
+            for entry in entries:
+                entry.evicted = True
+        self._close_stores([entry.store for entry in entries if entry.users == 0])
+
+def open_partitioned_store(
+    backend: str,
+    path: str,
+    mode: str = None,
+    partitions: int = None,
+    max_open: int = None,
+    list_ttl: float = None,
+    **store_options
+) -> PartitionedVectorStore:
+    """
+    Partitioned store whose partitions are Chroma collections in one client, or mmap stores in subdirectories
+    """
+    if backend == "chroma":
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+        from services.vector_store import ChromaVectorStore
+
+        client = chromadb.PersistentClient(path=path, settings=ChromaSettings(anonymized_telemetry=False))
+
+        def open_partition(name: str) -> VectorStore:
+            return ChromaVectorStore(path=path, collection_name=name, client=client)
+
+        def list_partitions() -> List[str]:
+            # list_collections returns Collection objects on older Chroma versions and names on newer ones
+            names = [getattr(collection, "name", collection) for collection in client.list_collections()]
+            return [name for name in names if name.startswith(PARTITION_PREFIX)]
+
+        def partition_exists(name: str) -> bool:
+            try:
+                client.get_collection(name)
+                return True
+            except Exception:
+                return False
+
+        def unpartitioned_count() -> int:
+            try:
+                return client.get_collection("documents").count()
+            except Exception:
+                return 0
+    elif backend == "mmap":
+        from services.mmap_vector_store import MmapVectorStore
+
+        os.makedirs(path, exist_ok=True)
+
+        def open_partition(name: str) -> VectorStore:
+            return MmapVectorStore(path=os.path.join(path, name), **store_options)
+
+        def list_partitions() -> List[str]:
+            return [
+                name for name in os.listdir(path)
+                if name.startswith(PARTITION_PREFIX) and os.path.isdir(os.path.join(path, name))
+            ]
+
+        def partition_exists(name: str) -> bool:
+            return os.path.isdir(os.path.join(path, name))
+
+        def unpartitioned_count() -> int:
+            # An unpartitioned mmap store keeps its SQLite file at the root of the same path
+            sidecar = os.path.join(path, "chunks.sqlite3")
+            if not os.path.exists(sidecar):
+                return 0
+            with closing(sqlite3.connect(sidecar)) as connection:
+                return connection.execute("SELECT COUNT(*) FROM chunks WHERE deleted = 0").fetchone()[0]
+    else:
+        raise ValueError(f"Unknown vector store backend: {backend}")
+
+    store = PartitionedVectorStore(
+        path, open_partition, list_partitions, partition_exists,
+        mode=mode, partitions=partitions, max_open=max_open, list_ttl=list_ttl
+    )
+    # Chunks stored before partitioning was enabled would silently drop out of every query
+    legacy = unpartitioned_count()
+    if legacy:
+        raise RuntimeError(
+            f"{path} holds {legacy} unpartitioned chunks that VECTOR_STORE_PARTITION_MODE={store.mode} would not see. "
+            f"Copy them into a new path with: python migrate_vector_store.py --partition-mode {store.mode} "
+            f"--target-backend {backend} --target-path <new path>, then point the store at it (or re-ingest into an empty path)"
+        )
+    store.ensure_global_index()
+    return store
@@ -0,0 +1,58 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class Reranker:
+    """
+    Cross-encoder reranking of retrieved candidates, scored in batches
+    under a latency deadline
+    """
+
+    def __init__(self):
+        self.model_name = settings.RERANK_MODEL_NAME
+        self.batch_size = settings.RERANK_BATCH_SIZE
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Load the cross-encoder (once)
+        """
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                started = time.perf_counter()
+                self._model = CrossEncoder(self.model_name)
+                logger.info(f"Loaded reranker {self.model_name} in {time.perf_counter() - started:.2f}s")
+        return self._model
+
+    def rerank(
+        self,
+        query: str,
+        candidates: List[Dict[str, Any]],
+        top_k: int,
+        deadline: Optional[float] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Rescore candidates against the query and keep the best top_k.
+        Returns None if the time.monotonic() deadline passes before all batches are scored,
+        so the caller can fall back to vector order.
+        """
+        if not candidates:
+            return []
+        model = self.load()
+
+        scores = []
+        for start in range(0, len(candidates), self.batch_size):
+            if deadline is not None and time.monotonic() > deadline:
+                return None
+            batch = candidates[start:start + self.batch_size]
+            pairs = [(query, candidate.get('document') or '') for candidate in batch]
+            scores.extend(float(score) for score in model.predict(pairs, batch_size=self.batch_size))
+
+        ranked = sorted(zip(scores, range(len(candidates))), key=lambda item: item[0], reverse=True)[:top_k]
+        return [dict(candidates[index], rerank_score=score) for score, index in ranked]
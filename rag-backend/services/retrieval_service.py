@@ -0,0 +1,212 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import settings
+from services.vector_db_service import VectorDBService
+from services.embedding_scheduler import EmbeddingScheduler
+from services.cache import normalize_query
+from services.metrics import metrics
+from services.reranker import Reranker
+from services.vector_store import QUERY_INCLUDE
+
+logger = logging.getLogger(__name__)
+
+class RetrievalService:
+    """
+    Runs the blocking retrieval path (query embedding + vector search) on a
+    bounded thread pool so it never stalls the FastAPI event loop.
+    """
+
+    def __init__(self, vector_db_service: VectorDBService):
+        self.vector_db_service = vector_db_service
+        self.max_workers = settings.RETRIEVAL_MAX_WORKERS
+        self.max_concurrency = settings.RETRIEVAL_MAX_CONCURRENCY
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="retrieval"
+        )
+        # Created lazily so it binds to the running event loop
+        self._semaphore = None
+        # Concurrent query embeddings share one encode call
+        self.embedding_scheduler = EmbeddingScheduler(
+            self.vector_db_service.create_embeddings,
+            max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+            executor=self.executor
+        )
+        # Optional cross-encoder stage over a larger candidate set
+        self.reranker = Reranker() if settings.RERANK_ENABLED else None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a blocking retrieval call on the retrieval executor, respecting the concurrency limit
+        """
+        async with self._get_semaphore():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor,
+                functools.partial(func, *args, **kwargs)
+            )
+
+    async def embed_query(self, query: str) -> list[float]:
+        """
+        Query embedding through the cache, falling back to the batching scheduler on a miss.
+        The normalized text is embedded, so every query sharing a cache key gets the same vector.
+        """
+        cache = self.vector_db_service.query_embedding_cache
+        cache_key = normalize_query(query)
+        embedding = cache.get(cache_key)
+        if embedding is None:
+            embedding = await self.embedding_scheduler.embed(cache_key)
+            cache.put(cache_key, embedding)
+        return embedding
+
+    async def embed_queries(self, queries: list[str]) -> list[list[float]]:
+        """
+        Embeddings for many queries: cached ones are reused and all misses share one encode call
+        """
+        cache = self.vector_db_service.query_embedding_cache
+        keys = [normalize_query(query) for query in queries]
+        embeddings = {key: cache.get(key) for key in keys}
+        missing = [key for key in dict.fromkeys(keys) if embeddings[key] is None]
+        if missing:
+            encoded = await self.run(self.vector_db_service.create_embeddings, missing)
+            for key, embedding in zip(missing, encoded):
+                embeddings[key] = embedding
+                cache.put(key, embedding)
+        return [embeddings[key] for key in keys]
+
+    def _search_include(self, include: list[str]) -> list[str]:
+        # The cross-encoder needs the chunk text even when the caller doesn't
+        return list(include) + ["documents"] if self.reranker and "documents" not in include else list(include)
+    
+    async def search_similar(self, query: str, documentsId: list[str] = None, n_results: int = 5, include: list[str] = QUERY_INCLUDE) -> list[dict]:
+        """
+        Embed the query (cached, micro-batched) and search the vector store off the event loop,
+        plus the optional rerank stage.
+        Fields left out of `include` are not read from the store and come back as None.
+        """
+        try:
+            timings = {}
+            started = time.perf_counter()
+            query_embedding = await self.embed_query(query)
+            timings["embed"] = time.perf_counter() - started
+            
+            # With reranking, retrieve a larger candidate set and let the cross-encoder pick the best
+            candidates = max(settings.RERANK_CANDIDATES, n_results) if self.reranker else n_results
+            started = time.perf_counter()
+            results = await self.run(
+                self.vector_db_service.search_by_embedding,
+                query_embedding,
+                documentsId=documentsId,
+                n_results=candidates,
+                query_text=query,
+                include=self._search_include(include)
+            )
+            timings["search"] = time.perf_counter() - started
+            
+            if self.reranker:
+                started = time.perf_counter()
+                results = await self._rerank(query, results, n_results, include)
+                timings["rerank"] = time.perf_counter() - started
+            
+            for stage, seconds in timings.items():
+                metrics.observe(f"retrieval.{stage}_seconds", seconds)
+            stage_summary = ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items())
+            logger.info(f"Found {len(results)} similar documents for query: {query} ({stage_summary})")
+            return results
+        except Exception as e:
+            logger.error(f"Error searching vector database: {e}")
+            raise
+    
+    async def search_batch(self, queries: list[str], documentsIds: list[list[str]], n_results: list[int], include: list[str] = QUERY_INCLUDE) -> list[list[dict]]:
+        """
+        Retrieve context for many questions at once: one encode call for all uncached questions,
+        then one multi-embedding vector query per distinct (document scope, n_results) group.
+        Returns one result list per question, in input order.
+        """
+        try:
+            timings = {}
+            started = time.perf_counter()
+            embeddings = await self.embed_queries(queries)
+            timings["embed"] = time.perf_counter() - started
+            
+            # Vector store filters apply to a whole query call, so questions are grouped by scope
+            groups: dict = {}
+            for i, (documentsId, n) in enumerate(zip(documentsIds, n_results)):
+                scope = tuple(sorted(set(documentsId))) if documentsId else ()
+                groups.setdefault((scope, n), []).append(i)
+            
+            results: list = [None] * len(queries)
+            
+            async def search_group(scope: tuple, n: int, positions: list[int]):
+                candidates = max(settings.RERANK_CANDIDATES, n) if self.reranker else n
+                group_results = await self.run(
+                    self.vector_db_service.search_by_embeddings,
+                    [embeddings[i] for i in positions],
+                    documentsId=list(scope),
+                    n_results=candidates,
+                    query_texts=[queries[i] for i in positions],
+                    include=self._search_include(include)
+                )
+                for i, result in zip(positions, group_results):
+                    results[i] = result
+            
+            started = time.perf_counter()
+            await asyncio.gather(*(search_group(scope, n, positions) for (scope, n), positions in groups.items()))
+            timings["search"] = time.perf_counter() - started
+            
+            if self.reranker:
+                started = time.perf_counter()
+                results = list(await asyncio.gather(*(
+                    self._rerank(query, result, n, include) for query, result, n in zip(queries, results, n_results)
+                )))
+                timings["rerank"] = time.perf_counter() - started
+            
+            for stage, seconds in timings.items():
+                metrics.observe(f"retrieval.batch_{stage}_seconds", seconds)
+            metrics.observe("retrieval.batch_size", len(queries))
+            stage_summary = ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items())
+            logger.info(f"Retrieved context for {len(queries)} questions in {len(groups)} scope groups ({stage_summary})")
+            return results
+        except Exception as e:
+            logger.error(f"Error searching vector database for a batch of questions: {e}")
+            raise
+    
+    async def _rerank(self, query: str, candidates: list[dict], n_results: int, include: list[str] = QUERY_INCLUDE) -> list[dict]:
+        """
+        Cross-encoder rerank within the latency budget; falls back to vector order when the
+        budget is exceeded or the cross-encoder fails
+        """
+        # The budget includes time spent waiting for an executor thread
+        deadline = time.monotonic() + settings.RERANK_BUDGET_MS / 1000.0
+        try:
+            reranked = await self.run(self.reranker.rerank, query, candidates, n_results, deadline)
+            if reranked is None:
+                metrics.increment("retrieval.rerank_fallbacks")
+                logger.warning(f"Rerank budget of {settings.RERANK_BUDGET_MS}ms exceeded, using vector order")
+        except Exception as e:
+            metrics.increment("retrieval.rerank_errors")
+            logger.error(f"Error reranking candidates, using vector order: {e}")
+            reranked = None
+        if reranked is None:
+            reranked = candidates[:n_results]
+        if "documents" not in include:
+            # The text was only fetched for the cross-encoder
+            reranked = [dict(result, document=None) for result in reranked]
+        return reranked
+    
+    async def shutdown(self):
+        """
+        Stop the embedding scheduler and the retrieval executor
+        """
+        await self.embedding_scheduler.stop()
+        self.executor.shutdown(wait=False)
+        logger.info("Retrieval executor shut down")
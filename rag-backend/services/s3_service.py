@@ -1,21 +1,245 @@
-import boto3
+import collections
+import io
 import tempfile
+import threading
+import time
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Iterator, NamedTuple, Optional
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
+from s3transfer.manager import TransferManager
+from s3transfer.subscribers import BaseSubscriber
 from config import settings
+from services.aws_clients import aws_clients
+from services.metrics import metrics
 import logging
 
 logger = logging.getLogger(__name__)
 
+def record_throughput(kind: str, file_key: str, size: int, seconds: float):
+    """
+    Per-object transfer metrics: s3.<kind>_mbps and s3.<kind>_bytes
+    """
+    mbps = size / 1e6 / max(seconds, 1e-6)
+    metrics.observe(f"s3.{kind}_mbps", mbps)
+    metrics.increment(f"s3.{kind}_bytes", size)
+    logger.info(f"S3 {kind} of {file_key}: {size / 1e6:.1f} MB in {seconds:.2f}s ({mbps:.1f} MB/s)")
+
+class _KnownSize(BaseSubscriber):
+    """
+    Tells the transfer manager the object size, which saves it a HEAD request
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def on_queued(self, future, **kwargs):
+        future.meta.provide_transfer_size(self.size)
+
+class S3Object(NamedTuple):
+    """
+    An object to stream from S3; picklable, so pool workers can open it themselves
+    """
+    bucket: str
+    key: str
+    size: int
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Seekable read-only file over an S3 object. Reads are served by ranged GETs of
+    S3_RANGE_BLOCK_BYTES blocks, keeping the most recent S3_RANGE_CACHE_BLOCKS in memory,
+    so formats that need random access (PDF, DOCX) never need a local copy.
+    """
+
+    def __init__(self, client, obj: S3Object, block_size: int = None, cache_blocks: int = None):
+        self.client = client
+        self.obj = obj
+        self.block_size = max(1, block_size or settings.S3_RANGE_BLOCK_BYTES)
+        self.cache_blocks = max(1, cache_blocks or settings.S3_RANGE_CACHE_BLOCKS)
+        self.position = 0
+        self.requests = 0
+        self.fetched = 0
+        self.fetch_seconds = 0.0
+        self._blocks: "collections.OrderedDict[int, bytes]" = collections.OrderedDict()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.obj.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        self.position = max(0, self.position)
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        if self.position >= self.obj.size:
+            return 0
+        index, start = divmod(self.position, self.block_size)
+        block = self._block(index)
+        count = min(len(buffer), len(block) - start)
+        buffer[:count] = block[start:start + count]
+        self.position += count
+        return count
+
+    def _block(self, index: int) -> bytes:
+        block = self._blocks.get(index)
+        if block is not None:
+            self._blocks.move_to_end(index)
+            return block
+        start = index * self.block_size
+        end = min(start + self.block_size, self.obj.size) - 1
+        started = time.perf_counter()
+        response = self.client.get_object(Bucket=self.obj.bucket, Key=self.obj.key, Range=f"bytes={start}-{end}")
+        block = response["Body"].read()
+        self.fetch_seconds += time.perf_counter() - started
+        self.fetched += len(block)
+        self.requests += 1
+        self._blocks[index] = block
+        if len(self._blocks) > self.cache_blocks:
+            self._blocks.popitem(last=False)
+        return block
+
+    def close(self):
+        if not self.closed:
+            logger.debug(f"Read s3://{self.obj.bucket}/{self.obj.key} with {self.requests} ranged GETs")
+            if self.requests:
+                # Time spent in the GETs only, not in the reader's parsing between them
+                record_throughput("range", self.obj.key, self.fetched, self.fetch_seconds)
+            self._blocks.clear()
+        super().close()
+
 class S3Service:
     def __init__(self):
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_REGION
-        )
+        self.s3_client = aws_clients.get("s3")
         self.bucket_name = settings.AWS_S3_BUCKET
+        # Large objects are fetched as S3_TRANSFER_PART_BYTES ranged GETs, S3_TRANSFER_MAX_CONCURRENCY
+        # at a time; one transfer manager (and part executor) serves all concurrent ingestion tasks
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.S3_TRANSFER_THRESHOLD_BYTES,
+            multipart_chunksize=settings.S3_TRANSFER_PART_BYTES,
+            max_concurrency=settings.S3_TRANSFER_MAX_CONCURRENCY
+        )
+        self._transfer_manager: Optional[TransferManager] = None
+        self._part_executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def transfer_manager(self) -> TransferManager:
+        if self._transfer_manager is None:
+            with self._lock:
+                if self._transfer_manager is None:
+                    self._transfer_manager = TransferManager(self.s3_client, self.transfer_config)
+        return self._transfer_manager
+    
+    @property
+    def part_executor(self) -> ThreadPoolExecutor:
+        if self._part_executor is None:
+            with self._lock:
+                if self._part_executor is None:
+                    self._part_executor = ThreadPoolExecutor(
+                        max_workers=max(1, settings.S3_TRANSFER_MAX_CONCURRENCY), thread_name_prefix="s3-part"
+                    )
+        return self._part_executor
+    
+    def describe(self, file_key: str) -> S3Object:
+        """
+        Size of an object, as a handle the extractors can stream from
+        """
+        try:
+            response = self.s3_client.head_object(Bucket=self.bucket_name, Key=file_key)
+            return S3Object(self.bucket_name, file_key, response["ContentLength"])
+        except ClientError as e:
+            logger.error(f"Error reading metadata of {file_key} from S3: {e}")
+            raise
+    
+    def iter_blocks(self, obj: S3Object, block_size: int) -> Iterator[bytes]:
+        """
+        Stream an object's bytes block by block, in order. Objects of at least
+        S3_TRANSFER_THRESHOLD_BYTES are read ahead as parallel ranged GETs.
+        """
+        started = time.perf_counter()
+        read = 0
+        try:
+            if obj.size < settings.S3_TRANSFER_THRESHOLD_BYTES or settings.S3_TRANSFER_MAX_CONCURRENCY <= 1:
+                body = self.s3_client.get_object(Bucket=obj.bucket, Key=obj.key)["Body"]
+                try:
+                    for block in body.iter_chunks(block_size):
+                        read += len(block)
+                        yield block
+                finally:
+                    body.close()
+            else:
+                for part in self._iter_parts(obj):
+                    for start in range(0, len(part), block_size):
+                        yield part[start:start + block_size]
+                    read += len(part)
+        finally:
+            # Wall time, so this includes the consumer's processing between blocks
+            record_throughput("stream", obj.key, read, time.perf_counter() - started)
+    
+    def _iter_parts(self, obj: S3Object) -> Iterator[bytes]:
+        """
+        Ranged GETs of S3_TRANSFER_PART_BYTES, up to S3_TRANSFER_MAX_CONCURRENCY in flight, yielded in order
+        """
+        part_size = max(1, settings.S3_TRANSFER_PART_BYTES)
+        starts = iter(range(0, obj.size, part_size))
+        pending = collections.deque()
+        
+        def fetch(start: int) -> bytes:
+            end = min(start + part_size, obj.size) - 1
+            response = self.s3_client.get_object(Bucket=obj.bucket, Key=obj.key, Range=f"bytes={start}-{end}")
+            return response["Body"].read()
+        
+        def submit_next():
+            start = next(starts, None)
+            if start is not None:
+                pending.append(self.part_executor.submit(fetch, start))
+        
+        for _ in range(max(1, settings.S3_TRANSFER_MAX_CONCURRENCY)):
+            submit_next()
+        try:
+            while pending:
+                part = pending.popleft().result()
+                submit_next()
+                yield part
+        finally:
+            # Consumer stopped early: drop parts that haven't started
+            for future in pending:
+                future.cancel()
+    
+    def open_seekable(self, obj: S3Object, prefer_ranges: bool = False) -> IO[bytes]:
+        """
+        Seekable binary file over an object, for formats that need random access.
+        Objects up to S3_SPOOL_MEMORY_BYTES are read into memory, larger ones spill to a
+        temp file up to S3_SPOOL_MAX_BYTES, and beyond that (or with `prefer_ranges`, for
+        readers that only touch part of the file) reads are served by ranged GETs.
+        """
+        if prefer_ranges or obj.size > settings.S3_SPOOL_MAX_BYTES:
+            return io.BufferedReader(S3RangeReader(self.s3_client, obj), buffer_size=64 * 1024)
+        # The size is known up front, so the spool is either memory or an anonymous temp file
+        spool = io.BytesIO() if obj.size <= settings.S3_SPOOL_MEMORY_BYTES else tempfile.TemporaryFile()
+        try:
+            started = time.perf_counter()
+            self.transfer_manager.download(obj.bucket, obj.key, spool, subscribers=[_KnownSize(obj.size)]).result()
+            record_throughput("download", obj.key, obj.size, time.perf_counter() - started)
+            spool.seek(0)
+            return spool
+        except Exception:
+            spool.close()
+            raise
     
     def download_file(self, file_key: str) -> str:
         """
@@ -28,8 +252,10 @@ class S3Service:
             temp_file.close()
             
             # Download the file from S3
-            self.s3_client.download_file(self.bucket_name, file_key, temp_file_path)
+            started = time.perf_counter()
+            self.transfer_manager.download(self.bucket_name, file_key, temp_file_path).result()
             logger.info(f"Successfully downloaded {file_key} from S3 to {temp_file_path}")
+            record_throughput("download", file_key, os.path.getsize(temp_file_path), time.perf_counter() - started)
             
             return temp_file_path
             
@@ -49,4 +275,25 @@ class S3Service:
                 os.unlink(file_path)
                 logger.info(f"Deleted temporary file: {file_path}")
         except Exception as e:
-            logger.error(f"Error deleting temporary file {file_path}: {e}")
\ No newline at end of file
+            logger.error(f"Error deleting temporary file {file_path}: {e}")
+    
+    def close(self):
+        """
+        Stop the transfer threads
+        """
+        if self._transfer_manager is not None:
+            self._transfer_manager.shutdown()
+        if self._part_executor is not None:
+            self._part_executor.shutdown(wait=False)
+
+# One client per process, shared by the worker's handlers and by each pool worker
+_s3_service: Optional[S3Service] = None
+_s3_service_lock = threading.Lock()
+
+def get_s3_service() -> S3Service:
+    global _s3_service
+    if _s3_service is None:
+        with _s3_service_lock:
+            if _s3_service is None:
+                _s3_service = S3Service()
+    return _s3_service
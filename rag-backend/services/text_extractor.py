@@ -0,0 +1,186 @@
+import os
+import codecs
+import logging
+from bisect import bisect_right
+from typing import IO, TYPE_CHECKING, Iterable, Iterator, List, Tuple, Union
+from services.chunker import Chunk, Chunker
+
+if TYPE_CHECKING:
+    from services.s3_service import S3Object
+
+logger = logging.getLogger(__name__)
+
+# Bytes read per step when streaming plain-text files
+TEXT_READ_BLOCK_SIZE = 64 * 1024
+
+# A local file path, or an S3 object streamed without a local copy
+DocumentSource = Union[str, "S3Object"]
+
+def get_file_extension(file_key: str) -> str:
+    """
+    Get file extension from file key
+    """
+    return os.path.splitext(file_key)[1][1:] if '.' in file_key else ''
+
+def iter_source_blocks(source: DocumentSource, block_size: int = TEXT_READ_BLOCK_SIZE) -> Iterator[bytes]:
+    """
+    Stream a document's bytes sequentially (S3 objects through the get_object body)
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as file:
+            while True:
+                block = file.read(block_size)
+                if not block:
+                    break
+                yield block
+    else:
+        from services.s3_service import get_s3_service
+        yield from get_s3_service().iter_blocks(source, block_size)
+
+def open_seekable_source(source: DocumentSource, prefer_ranges: bool = False) -> IO[bytes]:
+    """
+    Seekable binary file for formats that need random access (PDF, DOCX)
+    """
+    if isinstance(source, str):
+        return open(source, 'rb')
+    from services.s3_service import get_s3_service
+    return get_s3_service().open_seekable(source, prefer_ranges=prefer_ranges)
+
+class TextExtractor:
+    """
+    Streaming text extraction and chunking for supported file types.
+    Extractors yield text incrementally and the chunker emits chunks as soon
+    as they are complete, so memory stays bounded regardless of file size.
+    Sources are local paths or S3 objects; S3 objects are streamed, and only
+    formats that need random access get a seekable (spooled or ranged) reader.
+    Holds no clients of its own and only a tokenizer, so it can run inside a process pool.
+    """
+
+    def __init__(self, chunker: Chunker = None):
+        self.chunker = chunker or Chunker()
+
+    def iter_chunks(self, source: DocumentSource, file_key: str) -> Iterator[Chunk]:
+        """
+        Yield text chunks (with their character offsets) for a file as they are extracted
+        """
+        file_extension = get_file_extension(file_key).lower()
+
+        try:
+            if file_extension in ['txt', 'md']:
+                yield from self.chunker.chunk_stream(self._iter_text(source, file_key))
+            elif file_extension in ['pdf']:
+                yield from self.iter_page_chunks(self._iter_pdf_pages(source))
+            elif file_extension in ['docx', 'doc']:
+                yield from self.chunker.chunk_stream(self._iter_word_paragraphs(source), separator="\n\n")
+            elif file_extension in ['csv']:
+                # Every CSV row is already a chunk
+                offset = 0
+                for row_text in self._iter_csv_rows(source, file_key):
+                    yield Chunk(row_text, offset, offset + len(row_text))
+                    offset += len(row_text) + 1
+            else:
+                logger.warning(f"Unsupported file type: {file_extension}")
+
+        except ImportError as e:
+            logger.error(f"Missing dependency for {file_extension} files: {e}. Install with: pip install PyPDF2 python-docx")
+        except Exception as e:
+            logger.error(f"Error extracting content from {file_key}: {e}")
+            raise
+
+    def iter_page_chunks(self, pages: Iterable[Tuple[int, str]], separator: str = "\n\n") -> Iterator[Chunk]:
+        """
+        Chunk a stream of (page_number, text) pages in order, tagging every chunk
+        with the first and last page it spans
+        """
+        # Offset of each page in the joined text, mirroring how the chunker joins pieces
+        page_starts: List[int] = []
+        page_numbers: List[int] = []
+
+        def texts() -> Iterator[str]:
+            offset = 0
+            for page_number, text in pages:
+                if not text or not text.strip():
+                    continue
+                if page_starts:
+                    offset += len(separator)
+                page_starts.append(offset)
+                page_numbers.append(page_number)
+                offset += len(text)
+                yield text
+
+        for chunk in self.chunker.chunk_stream(texts(), separator=separator):
+            first = bisect_right(page_starts, chunk.start) - 1
+            last = bisect_right(page_starts, chunk.end - 1) - 1
+            yield chunk._replace(page_number=page_numbers[first], page_end=page_numbers[last])
+
+    def _iter_text(self, source: DocumentSource, file_key: str) -> Iterator[str]:
+        """
+        Stream decoded text, falling back to latin-1 for undecodable bytes
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        blocks = iter_source_blocks(source)
+        while True:
+            block = next(blocks, b"")
+            final = not block
+            try:
+                text = decoder.decode(block, final=final)
+            except UnicodeDecodeError:
+                # Not UTF-8: decode this block and everything after it as latin-1
+                logger.warning(f"{file_key} is not valid UTF-8, falling back to latin-1")
+                pending, _ = decoder.getstate()
+                decoder = codecs.getincrementaldecoder('latin-1')()
+                text = decoder.decode(pending + block, final=final)
+            if text:
+                yield text
+            if final:
+                break
+
+    def _iter_lines(self, source: DocumentSource, file_key: str) -> Iterator[str]:
+        """
+        Stream decoded text line by line, keeping line endings (as csv.reader expects)
+        """
+        partial = ""
+        for text in self._iter_text(source, file_key):
+            lines = (partial + text).split("\n")
+            partial = lines.pop()
+            for line in lines:
+                yield line + "\n"
+        if partial:
+            yield partial
+
+    def _iter_pdf_pages(self, source: DocumentSource) -> Iterator[Tuple[int, str]]:
+        """
+        Stream (page_number, text) from PDF files, one page at a time
+        """
+        import PyPDF2
+
+        with open_seekable_source(source) as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            for page_number, page in enumerate(pdf_reader.pages, start=1):
+                yield page_number, page.extract_text() or ""
+
+    def _iter_word_paragraphs(self, source: DocumentSource) -> Iterator[str]:
+        """
+        Stream text from Word documents, one paragraph at a time
+        """
+        from docx import Document
+
+        with open_seekable_source(source) as file:
+            doc = Document(file)
+
+            for paragraph in doc.paragraphs:
+                if paragraph.text.strip():
+                    yield paragraph.text
+
+    def _iter_csv_rows(self, source: DocumentSource, file_key: str) -> Iterator[str]:
+        """
+        Stream CSV rows as text chunks
+        """
+        import csv
+
+        csv_reader = csv.reader(self._iter_lines(source, file_key))
+        for row_num, row in enumerate(csv_reader):
+            if row:  # Skip empty rows
+                row_text = " | ".join(str(cell) for cell in row if cell)
+                if row_text.strip():
+                    yield f"Row {row_num + 1}: {row_text}"
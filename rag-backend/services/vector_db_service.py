@@ -1,33 +1,110 @@
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-from sentence_transformers import SentenceTransformer
 import logging
+import threading
+import time
 from config import settings
-import os
+from services.answer_cache import DocumentVersionStore
+from services.cache import LRUCache
+from services.collection_stats import CollectionStatsStore
+from services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from services.vector_store import VectorStore, create_vector_store, QUERY_INCLUDE
+import hashlib
 
 logger = logging.getLogger(__name__)
 
+# One embedding model per process. Loaded in the gunicorn master before forking
+# (PRELOAD_EMBEDDING_MODEL), the workers share its weights copy-on-write.
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+def load_embedding_model():
+    """
+    The process-wide SentenceTransformer, loaded on first use
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_model_lock:
+            if _embedding_model is None:
+                started = time.perf_counter()
+                from sentence_transformers import SentenceTransformer
+                _embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL_NAME)
+                logger.info(f"Loaded embedding model {settings.EMBEDDING_MODEL_NAME} in {time.perf_counter() - started:.2f}s")
+    return _embedding_model
+
 class VectorDBService:
     def __init__(self):
-        # Initialize ChromaDB
-        self.chroma_client = chromadb.PersistentClient(
-            path=settings.CHROMA_PERSIST_DIRECTORY,
-            settings=ChromaSettings(
-                anonymized_telemetry=False
-            )
+        # The vector store and the embedding model are opened on first use (or by load()),
+        # so constructing the service is cheap and importing main doesn't block startup
+        self._store = None
+        self._document_versions = None
+        self._collection_stats = None
+        self._store_lock = threading.Lock()
+        
+        # Query embeddings keyed on the normalized question (query path only)
+        self.query_embedding_cache = LRUCache(
+            max_size=settings.QUERY_EMBEDDING_CACHE_SIZE,
+            ttl_seconds=settings.QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+            name="query_embedding_cache"
         )
         
-        # Initialize sentence transformer model
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Optional BM25 index fused with vector results
+        self.lexical_index = LexicalIndex() if settings.HYBRID_SEARCH_ENABLED else None
         
-        # Get or create collection
-        self.collection = self.chroma_client.get_or_create_collection(
-            name="documents",
-            metadata={"hnsw:space": "cosine"}
-        )
+        self.stats_cache = LRUCache(max_size=1, ttl_seconds=settings.STATS_CACHE_SECONDS, name="stats_cache")
+        # Only one caller rescans the collection on a stats cache miss, the others wait for its result
+        self._stats_lock = threading.Lock()
         
         logger.info("VectorDB service initialized successfully")
     
+    @property
+    def store(self) -> VectorStore:
+        # Vector store backend (Chroma or the in-process mmap store)
+        if self._store is None:
+            with self._store_lock:
+                if self._store is None:
+                    self._store = create_vector_store()
+        return self._store
+    
+    @property
+    def document_versions(self) -> DocumentVersionStore:
+        # Bumped when chunks are deleted, so cached answers citing them are invalidated
+        if self._document_versions is None:
+            with self._store_lock:
+                if self._document_versions is None:
+                    self._document_versions = DocumentVersionStore()
+        return self._document_versions
+    
+    @property
+    def collection_stats(self) -> CollectionStatsStore:
+        # Per-document aggregates behind /stats, refreshed whenever a document's chunks change
+        if self._collection_stats is None:
+            with self._store_lock:
+                if self._collection_stats is None:
+                    self._collection_stats = CollectionStatsStore()
+        return self._collection_stats
+    
+    @property
+    def embedding_model(self):
+        return load_embedding_model()
+    
+    @property
+    def is_loaded(self) -> bool:
+        return self._store is not None and _embedding_model is not None
+    
+    def load(self) -> dict:
+        """
+        Open the vector store and load the embedding model now instead of on first use.
+        Returns the seconds spent per step.
+        """
+        timings = {}
+        started = time.perf_counter()
+        self.store.count()
+        timings["vector_store"] = time.perf_counter() - started
+        started = time.perf_counter()
+        # A first encode also pays for lazy framework initialization
+        self.create_embeddings(["warm-up"])
+        timings["embedding_model"] = time.perf_counter() - started
+        return timings
+    
     def create_embeddings(self, texts: list[str]) -> list[list[float]]:
         """
         Create embeddings for a list of texts
@@ -39,16 +116,76 @@ class VectorDBService:
             logger.error(f"Error creating embeddings: {e}")
             raise
     
-    def add_documents(self, documents: list[str], metadata: list[dict] = None, ids: list[str] = None):
+    @staticmethod
+    def make_chunk_id(documentId: str, text: str) -> str:
+        """
+        Deterministic chunk ID: the same text in the same document always maps to the same ID
+        """
+        return f"{documentId}:{hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]}"
+    
+    def get_document_chunk_ids(self, documentId: str) -> set[str]:
+        """
+        IDs of all chunks currently stored for a document
+        """
+        try:
+            results = self.store.get(documentId=documentId, include=[])
+            return set(results['ids'])
+        except Exception as e:
+            logger.error(f"Error listing chunks for document {documentId}: {e}")
+            raise
+    
+    def get_document_chunk_metadata(self, documentId: str) -> dict[str, dict]:
+        """
+        Metadata of all chunks currently stored for a document, by chunk ID
+        """
+        try:
+            results = self.store.get(documentId=documentId, include=["metadatas"])
+            return {chunk_id: metadata or {} for chunk_id, metadata in zip(results['ids'], results['metadatas'])}
+        except Exception as e:
+            logger.error(f"Error listing chunks for document {documentId}: {e}")
+            raise
+    
+    def update_chunk_metadata(self, ids: list[str], metadata: list[dict]):
+        """
+        Update the metadata of stored chunks whose text is unchanged (no re-embedding)
+        """
+        try:
+            if ids:
+                self.store.update_metadata(ids, metadata)
+                logger.info(f"Updated metadata of {len(ids)} unchanged chunks")
+        except Exception as e:
+            logger.error(f"Error updating chunk metadata: {e}")
+            raise
+    
+    def delete_document_chunks(self, documentId: str, keep_ids: set[str] = None) -> int:
+        """
+        Delete a document's chunks, except those in keep_ids; returns the number deleted
+        """
+        try:
+            stale_ids = self.get_document_chunk_ids(documentId) - set(keep_ids or ())
+            if stale_ids:
+                self.store.delete(list(stale_ids))
+                if self.lexical_index is not None:
+                    self.lexical_index.delete(list(stale_ids))
+                self.document_versions.bump(documentId)
+                self.refresh_document_stats(documentId)
+                logger.info(f"Deleted {len(stale_ids)} stale chunks for document {documentId}")
+            return len(stale_ids)
+        except Exception as e:
+            logger.error(f"Error deleting chunks for document {documentId}: {e}")
+            raise
+    
+    def add_documents(self, documents: list[str], metadata: list[dict] = None, ids: list[str] = None, embeddings: list[list[float]] = None):
         """
-        Add documents to the vector database
+        Add documents to the vector database (embeddings are computed unless provided)
         """
         try:
             if not documents:
                 return
             
             # Create embeddings
-            embeddings = self.create_embeddings(documents)
+            if embeddings is None:
+                embeddings = self.create_embeddings(documents)
             
             # Generate IDs if not provided
             if ids is None:
@@ -59,13 +196,15 @@ class VectorDBService:
             if metadata is None:
                 metadata = [{"source": "unknown"} for _ in documents]
             
-            # Add to collection
-            self.collection.add(
+            # Upsert, so re-writing a deterministic chunk ID replaces it instead of duplicating it
+            self.store.upsert(
+                ids=ids,
                 embeddings=embeddings,
                 documents=documents,
-                metadatas=metadata,
-                ids=ids
+                metadatas=metadata
             )
+            if self.lexical_index is not None:
+                self.lexical_index.add(ids, documents, metadata)
             
             logger.info(f"Added {len(documents)} documents to vector database")
             
@@ -73,64 +212,219 @@ class VectorDBService:
             logger.error(f"Error adding documents to vector database: {e}")
             raise
     
-    def search_similar(self, query: str, documentsId: list[str] = [],  n_results: int = 5,) -> list[dict]:
+    def search_by_embedding(self, query_embedding: list[float], documentsId: list[str] = [], n_results: int = 5, query_text: str = None, include: list[str] = QUERY_INCLUDE) -> list[dict]:
         """
-        Search for similar documents in the vector database
+        Search for similar documents using a precomputed query embedding.
+        With hybrid search enabled and query_text given, vector and BM25 results are fused.
         """
-        try:
-            # Create query embedding
-            query_embedding = self.create_embeddings([query])[0]
-            where = {}
-            if documentsId and len(documentsId) > 0:
-                where = {"documentId": {"$in": documentsId}}
-            # Search in collection
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                include=["documents", "metadatas", "distances"],
-                where=where   
-            )
-            
-            # Format results
+        return self.search_by_embeddings(
+            [query_embedding], documentsId, n_results, query_texts=[query_text] if query_text else None, include=include
+        )[0]
+    
+    def search_by_embeddings(self, query_embeddings: list[list[float]], documentsId: list[str] = [], n_results: int = 5, query_texts: list[str] = None, include: list[str] = QUERY_INCLUDE) -> list[list[dict]]:
+        """
+        Search several precomputed query embeddings over the same document scope in one
+        vector store query; returns one result list per embedding.
+        Fields left out of `include` ("documents", "metadatas") are not read from the store and come back as None.
+        """
+        hybrid = self.lexical_index is not None and query_texts is not None
+        candidates = n_results * settings.HYBRID_CANDIDATE_MULTIPLIER if hybrid else n_results
+        include = [field for field in ("documents", "metadatas") if field in include] + ["distances"]
+        
+        # Search in the vector store
+        results = self.store.query(
+            query_embeddings=query_embeddings,
+            n_results=candidates,
+            documentsId=documentsId,
+            include=include
+        )
+        
+        # Format results
+        all_results = []
+        for q in range(len(query_embeddings)):
             formatted_results = []
-            if results['documents'] and results['documents'][0]:
-                for i in range(len(results['documents'][0])):
+            if results['ids'] and results['ids'][q]:
+                for i in range(len(results['ids'][q])):
                     formatted_results.append({
-                        'document': results['documents'][0][i],
-                        'metadata': results['metadatas'][0][i] if results['metadatas'] else {},
-                        'distance': results['distances'][0][i] if results['distances'] else 0.0
+                        'id': results['ids'][q][i],
+                        'document': results['documents'][q][i] if "documents" in include else None,
+                        'metadata': (results['metadatas'][q][i] if results['metadatas'] else {}) if "metadatas" in include else None,
+                        'distance': results['distances'][q][i] if results['distances'] else 0.0
                     })
             
-            logger.info(f"Found {len(formatted_results)} similar documents for query: {query}")
-            return formatted_results
-            
-        except Exception as e:
-            logger.error(f"Error searching vector database: {e}")
-            raise
+            if hybrid and query_texts[q]:
+                formatted_results = self._fuse_lexical_results(formatted_results, query_texts[q], documentsId, n_results, candidates, include)
+            all_results.append(formatted_results)
+        return all_results
+    
+    def _fuse_lexical_results(self, vector_results: list[dict], query_text: str, documentsId: list[str], n_results: int, candidates: int, include: list[str] = QUERY_INCLUDE) -> list[dict]:
+        """
+        Reciprocal rank fusion of vector results with BM25 results for the same query
+        """
+        lexical_hits = self.lexical_index.search(query_text, documentsId, candidates)
+        if not lexical_hits:
+            return vector_results[:n_results]
+        
+        by_id = {result['id']: result for result in vector_results}
+        fused = reciprocal_rank_fusion(
+            [[result['id'] for result in vector_results], [chunk_id for chunk_id, _ in lexical_hits]],
+            k=settings.HYBRID_RRF_K
+        )[:n_results]
+        
+        # Lexical-only hits still need their text and metadata
+        missing = [chunk_id for chunk_id, _ in fused if chunk_id not in by_id]
+        if missing:
+            fields = [field for field in ("documents", "metadatas") if field in include]
+            fetched = self.store.get(ids=missing, include=fields)
+            for i, chunk_id in enumerate(fetched['ids']):
+                by_id[chunk_id] = {
+                    'id': chunk_id,
+                    'document': fetched['documents'][i] if "documents" in fields else None,
+                    'metadata': (fetched['metadatas'][i] or {}) if "metadatas" in fields else None,
+                    'distance': None
+                }
+        
+        fused_results = []
+        for chunk_id, score in fused:
+            if chunk_id in by_id:
+                fused_results.append(dict(by_id[chunk_id], score=score))
+        return fused_results
     
     def get_collection_stats(self) -> dict:
         """
-        Get statistics about the collection
+        Get cheap aggregate statistics about the collection (no chunk text is returned).
+        They are summed from per-document aggregates kept current at ingest and delete time;
+        results are also cached for STATS_CACHE_SECONDS.
         """
         try:
-            count = self.collection.count()
-            docs = self.collection.get(include=["metadatas", "documents"])
-
-            return {
-                "total_documents": count,
-                "collection_name": self.collection.name,
-                "docs": docs
-            }
+            stats = self.stats_cache.get("stats")
+            if stats is not None:
+                return stats
+            with self._stats_lock:
+                stats = self.stats_cache.get("stats")
+                if stats is None:
+                    stats = self._compute_collection_stats()
+                    self.stats_cache.put("stats", stats)
+            return stats
         except Exception as e:
             logger.error(f"Error getting collection stats: {e}")
             raise
     
+    def refresh_document_stats(self, documentId: str):
+        """
+        Recompute one document's /stats aggregates from its chunks (after they were added or deleted)
+        """
+        try:
+            page = self.store.get(documentId=documentId, include=["metadatas"])
+            self.collection_stats.put(documentId, self._aggregate_pages([page]).get(documentId))
+        except Exception as e:
+            logger.error(f"Error refreshing stats for document {documentId}: {e}")
+            raise
+    
+    def _compute_collection_stats(self) -> dict:
+        documents = self.collection_stats.load()
+        if documents is None:
+            # Collections ingested before aggregates were kept: scan all metadata once
+            started = time.perf_counter()
+            documents = self._aggregate_pages(self._iter_pages(include=["metadatas"]))
+            self.collection_stats.backfill(documents)
+            logger.info(f"Scanned collection stats for {len(documents)} documents in {time.perf_counter() - started:.2f}s")
+            documents = self.collection_stats.load()
+        
+        chunks_per_file_type = {}
+        for aggregates in documents.values():
+            for file_type, chunks in aggregates["file_types"].items():
+                chunks_per_file_type[file_type] = chunks_per_file_type.get(file_type, 0) + chunks
+        chunks_per_document = {documentId: aggregates["chunks"] for documentId, aggregates in documents.items()}
+        return {
+            "total_documents": sum(chunks_per_document.values()),
+            "collection_name": self.store.name,
+            "document_count": len(chunks_per_document),
+            "chunks_per_document": chunks_per_document,
+            "chunks_per_file_type": chunks_per_file_type,
+            "total_characters": sum(aggregates["characters"] for aggregates in documents.values()),
+            "index_size_bytes": self.store.size_bytes()
+        }
+    
+    def _aggregate_pages(self, pages) -> dict[str, dict]:
+        """
+        Chunk count, characters and chunks per file type of every documentId in the pages
+        """
+        documents = {}
+        for page in pages:
+            missing_char_count = {}
+            for chunk_id, metadata in zip(page['ids'], page['metadatas']):
+                metadata = metadata or {}
+                documentId = metadata.get("documentId", "unknown")
+                file_type = metadata.get("file_type", "unknown")
+                aggregates = documents.setdefault(documentId, {"chunks": 0, "characters": 0, "file_types": {}})
+                aggregates["chunks"] += 1
+                aggregates["file_types"][file_type] = aggregates["file_types"].get(file_type, 0) + 1
+                if "char_count" in metadata:
+                    aggregates["characters"] += metadata["char_count"]
+                else:
+                    missing_char_count[chunk_id] = documentId
+            
+            # Chunks ingested before char_count was recorded: measure their text
+            if missing_char_count:
+                legacy = self.store.get(ids=list(missing_char_count), include=["documents"])
+                for chunk_id, document in zip(legacy['ids'], legacy['documents']):
+                    documents[missing_char_count[chunk_id]]["characters"] += len(document or "")
+        return documents
+    
+    def iter_chunks(self, offset: int = 0, limit: int = None, include_documents: bool = False):
+        """
+        Page through stored chunks, yielding one dict per chunk without loading the whole collection
+        """
+        include = ["metadatas", "documents"] if include_documents else ["metadatas"]
+        for page in self._iter_pages(include=include, offset=offset, limit=limit):
+            for i, chunk_id in enumerate(page['ids']):
+                chunk = {"id": chunk_id, "metadata": page['metadatas'][i]}
+                if include_documents:
+                    chunk["document"] = page['documents'][i]
+                yield chunk
+    
+    def _iter_pages(self, include: list[str], offset: int = 0, limit: int = None):
+        page_size = settings.STATS_PAGE_SIZE
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            page = self.store.get(include=include, limit=size, offset=offset)
+            if not page['ids']:
+                break
+            yield page
+            offset += len(page['ids'])
+            if remaining is not None:
+                remaining -= len(page['ids'])
+            if len(page['ids']) < size:
+                break
+    
+    def rebuild_lexical_index(self) -> int:
+        """
+        Index every stored chunk in the BM25 index (for collections created before hybrid search)
+        """
+        if self.lexical_index is None:
+            raise RuntimeError("Hybrid search is disabled (HYBRID_SEARCH_ENABLED=false)")
+        indexed = 0
+        for page in self._iter_pages(include=["documents", "metadatas"]):
+            self.lexical_index.add(page['ids'], page['documents'], page['metadatas'])
+            indexed += len(page['ids'])
+            logger.info(f"Indexed {indexed} chunks in the lexical index")
+        return indexed
+    
     def delete_documents(self, ids: list[str]):
         """
-        Delete documents by IDs
+        Delete documents by IDs and bump the versions of the documents they belonged to
         """
         try:
-            self.collection.delete(ids=ids)
+            found = self.store.get(ids=ids, include=["metadatas"])
+            documentIds = sorted({(metadata or {}).get("documentId") for metadata in found['metadatas']} - {None})
+            self.store.delete(ids)
+            if self.lexical_index is not None:
+                self.lexical_index.delete(ids)
+            for documentId in documentIds:
+                self.document_versions.bump(documentId)
+                self.refresh_document_stats(documentId)
             logger.info(f"Deleted {len(ids)} documents from vector database")
         except Exception as e:
             logger.error(f"Error deleting documents: {e}")
@@ -0,0 +1,152 @@
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+QUERY_INCLUDE = ("documents", "metadatas", "distances")
+GET_INCLUDE = ("documents", "metadatas")
+
+class VectorStore:
+    """
+    Storage engine behind VectorDBService. Results use Chroma's shapes:
+    `query` returns {"ids": [[...]], "documents": [[...]], "metadatas": [[...]], "distances": [[...]]}
+    (one inner list per query embedding, cosine distance) and `get` returns
+    {"ids": [...], "documents": [...], "metadatas": [...]}. Fields not requested are None.
+    """
+
+    name = "documents"
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[dict]):
+        raise NotImplementedError
+
+    def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int,
+        documentsId: Optional[Sequence[str]] = None,
+        include: Sequence[str] = QUERY_INCLUDE
+    ) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        documentId: Optional[str] = None,
+        include: Sequence[str] = GET_INCLUDE,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def update_metadata(self, ids: List[str], metadatas: List[dict]):
+        """
+        Replace the metadata of stored chunks, keeping their text and embeddings
+        """
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]):
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Release files and connections held by the store
+        """
+
+    def size_bytes(self) -> int:
+        """
+        Bytes used on disk by the store
+        """
+        return directory_size(self.path)
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+class ChromaVectorStore(VectorStore):
+    """
+    Chroma persistent collection (HNSW index, cosine space)
+    """
+
+    def __init__(self, path: str = None, collection_name: str = "documents", client=None):
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+
+        self.path = path or settings.CHROMA_PERSIST_DIRECTORY
+        self.client = client or chromadb.PersistentClient(
+            path=self.path,
+            settings=ChromaSettings(
+                anonymized_telemetry=False
+            )
+        )
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name,
+            metadata={"hnsw:space": "cosine"}
+        )
+        self.name = self.collection.name
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(embeddings=embeddings, documents=documents, metadatas=metadatas, ids=ids)
+
+    def query(self, query_embeddings, n_results, documentsId=None, include=QUERY_INCLUDE):
+        where = {}
+        if documentsId:
+            where = {"documentId": {"$in": list(documentsId)}}
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            include=list(include),
+            where=where
+        )
+
+    def get(self, ids=None, documentId=None, include=GET_INCLUDE, limit=None, offset=0):
+        kwargs = {"include": list(include)}
+        if ids is not None:
+            kwargs["ids"] = ids
+        if documentId is not None:
+            kwargs["where"] = {"documentId": documentId}
+        if limit is not None:
+            kwargs["limit"] = limit
+        if offset:
+            kwargs["offset"] = offset
+        return self.collection.get(**kwargs)
+
+    def update_metadata(self, ids, metadatas):
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+def create_vector_store(backend: str = None) -> VectorStore:
+    """
+    Build the vector store selected by VECTOR_STORE_BACKEND
+    """
+    backend = (backend or settings.VECTOR_STORE_BACKEND).lower()
+    if settings.VECTOR_STORE_PARTITION_MODE.lower() != "none":
+        from services.partitioned_vector_store import open_partitioned_store
+        path = settings.CHROMA_PERSIST_DIRECTORY if backend == "chroma" else settings.VECTOR_STORE_PATH
+        store = open_partitioned_store(backend, path)
+        logger.info(f"Using {backend} vector store at {path}, partitioned by {store.mode}")
+        return store
+    if backend == "chroma":
+        store = ChromaVectorStore()
+    elif backend == "mmap":
+        from services.mmap_vector_store import MmapVectorStore
+        store = MmapVectorStore()
+    else:
+        raise ValueError(f"Unknown vector store backend: {backend}")
+    logger.info(f"Using {backend} vector store at {store.path}")
+    return store
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# Run against the service modules without network access or model downloads
+os.environ.setdefault("CHUNK_TOKENIZER", "heuristic")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("AWS_REGION", "us-east-1")
+# Importing main opens the caches; keep their files out of the working tree
+os.environ.setdefault("CHROMA_PERSIST_DIRECTORY", tempfile.mkdtemp(prefix="rag-backend-tests-"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,19 @@
+from services import answer_cache as answer_cache_module
+from services.answer_cache import DocumentVersionStore, GLOBAL_SCOPE
+
+def test_get_versions_batches_large_scopes(tmp_path, monkeypatch):
+    monkeypatch.setattr(answer_cache_module, "SQL_BATCH", 7)
+    store = DocumentVersionStore(str(tmp_path / "cache.sqlite3"))
+    for i in range(0, 40, 3):
+        store.bump(f"doc-{i}")
+    store.bump("doc-3")
+
+    # More IDs than SQLite's host parameter limit, with duplicates
+    documentIds = [f"doc-{i}" for i in range(2000)] + ["doc-3", "doc-6"]
+    versions = store.get_versions(documentIds)
+
+    assert len(versions) == 2000
+    assert versions["doc-3"] == 2
+    assert versions["doc-0"] == versions["doc-39"] == 1
+    assert versions["doc-1"] == versions["doc-1999"] == 0
+    assert store.get_versions([GLOBAL_SCOPE]) == {GLOBAL_SCOPE: 15}
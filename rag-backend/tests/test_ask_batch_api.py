@@ -0,0 +1,139 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from config import settings
+from services.answer_cache import AnswerCache
+from services.llm_service import LLMServiceError
+
+class FakeRetrievalService:
+    """
+    One context chunk per question, none for questions containing "nothing"
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    async def search_batch(self, queries, documentsIds, n_results, include=None):
+        self.calls.append((list(queries), list(documentsIds), list(n_results)))
+        return [
+            [] if "nothing" in query else [{"id": f"ctx:{query}", "document": f"about {query}", "metadata": {}}]
+            for query in queries
+        ]
+
+class FakeLLMService:
+    """
+    Answers after a short delay and records how many generations ran at once;
+    questions containing "fail" raise like an unreachable model
+    """
+    model = "fake-model"
+    prompt_template_version = "test"
+
+    def __init__(self):
+        self.questions = []
+        self.running = 0
+        self.max_running = 0
+
+    async def generate_answer(self, question, context, raise_errors=False):
+        self.questions.append(question)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(0.01)
+            if "fail" in question:
+                raise LLMServiceError("The language model is unavailable")
+            return f"answer to {question}"
+        finally:
+            self.running -= 1
+
+@pytest.fixture
+def services(monkeypatch):
+    retrieval, llm = FakeRetrievalService(), FakeLLMService()
+    monkeypatch.setattr(main, "retrieval_service", retrieval)
+    monkeypatch.setattr(main, "llm_service", llm)
+    monkeypatch.setattr(main, "answer_cache", AnswerCache("memory"))
+    return retrieval, llm
+
+@pytest.fixture
+def client():
+    # Without the context manager the lifespan (and model warm-up) does not run
+    return TestClient(main.app)
+
+def ask_batch(client, questions):
+    response = client.post("/ask/batch", json={"questions": questions})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[-1]["type"] == "done"
+    answers = {event["index"]: event for event in events[:-1]}
+    assert len(answers) == len(events) - 1
+    return answers, events[-1]
+
+def test_batch_retrieves_once_and_streams_an_answer_per_question(services, client):
+    retrieval, llm = services
+
+    answers, done = ask_batch(client, [
+        {"question": "first", "file_id": ["doc-1"]},
+        {"question": "second", "max_context_results": 3},
+    ])
+
+    assert retrieval.calls == [(["first", "second"], [["doc-1"], None], [5, 3])]
+    assert answers[0]["question"] == "first" and answers[0]["answer"] == "answer to first"
+    assert answers[1]["context_used"] == [{"id": "ctx:second", "document": "about second", "metadata": {}}]
+    assert all(event["status"] == "completed" and not event["cached"] for event in answers.values())
+    assert done["count"] == 2 and done["cached"] == 0 and done["errors"] == 0
+    assert done["model"] == "fake-model"
+
+def test_cached_answers_skip_retrieval_and_generation(services, client):
+    retrieval, llm = services
+    ask_batch(client, [{"question": "first"}])
+
+    answers, done = ask_batch(client, [{"question": "First?"}, {"question": "new"}])
+
+    assert answers[0]["cached"] is True and answers[0]["answer"] == "answer to first"
+    assert answers[1]["cached"] is False
+    # Only the uncached question is retrieved and generated again
+    assert retrieval.calls[1] == (["new"], [None], [5])
+    assert llm.questions == ["first", "new"]
+    assert done["cached"] == 1
+
+def test_llm_errors_are_reported_per_question_and_not_cached(services, client):
+    retrieval, llm = services
+
+    answers, done = ask_batch(client, [{"question": "please fail"}, {"question": "fine"}])
+
+    assert answers[0]["status"] == "error" and answers[0]["answer"] == "The language model is unavailable"
+    assert answers[1]["status"] == "completed"
+    assert done["errors"] == 1
+
+    ask_batch(client, [{"question": "please fail"}])
+    assert llm.questions.count("please fail") == 2
+
+def test_questions_without_context_are_answered_without_the_llm(services, client):
+    retrieval, llm = services
+
+    answers, done = ask_batch(client, [{"question": "nothing here"}])
+
+    assert answers[0]["answer"] == main.NO_CONTEXT_ANSWER and answers[0]["status"] == "completed"
+    assert llm.questions == []
+
+def test_generations_run_with_bounded_concurrency(services, client, monkeypatch):
+    retrieval, llm = services
+    monkeypatch.setattr(settings, "ASK_BATCH_LLM_CONCURRENCY", 3)
+
+    answers, done = ask_batch(client, [{"question": f"question {n}"} for n in range(12)])
+
+    assert sorted(answers) == list(range(12))
+    assert all(answers[n]["answer"] == f"answer to question {n}" for n in range(12))
+    assert llm.max_running == 3
+
+def test_batch_rejects_empty_and_oversized_batches(services, client, monkeypatch):
+    retrieval, llm = services
+    monkeypatch.setattr(settings, "ASK_BATCH_MAX_QUESTIONS", 2)
+
+    assert client.post("/ask/batch", json={"questions": []}).status_code == 400
+    assert client.post("/ask/batch", json={"questions": [{"question": "q"}] * 3}).status_code == 400
+    assert retrieval.calls == []
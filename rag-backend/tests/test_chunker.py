@@ -0,0 +1,79 @@
+import random
+import re
+
+import pytest
+
+from services.chunker import WINDOW_CHARS, Chunker
+
+class WhitespaceTokenizer:
+    """
+    Fast-tokenizer stand-in where every word and every whitespace run is a token, so joining
+    sentences adds tokens that per-sentence counts don't see
+    """
+    _TOKEN_RE = re.compile(r"\S+|\s+")
+
+    def __call__(self, texts, return_offsets_mapping=False, **kwargs):
+        if isinstance(texts, str):
+            spans = [match.span() for match in self._TOKEN_RE.finditer(texts)]
+            return {"input_ids": list(range(len(spans))), "offset_mapping": spans}
+        return {"input_ids": [[0] * len(self._TOKEN_RE.findall(text)) for text in texts]}
+
+def random_text(seed: int, sentences: int = 400) -> str:
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(rng.randint(1, sentences)):
+        words = " ".join("w" * rng.randint(1, 12) for _ in range(rng.randint(1, 8)))
+        parts.append(words + rng.choice([".", "!", "?", ""]) + rng.choice([" ", "  \n\n   ", "\n", " " * rng.randint(1, 30)]))
+    return "".join(parts)
+
+@pytest.mark.parametrize("tokenizer", [None, WhitespaceTokenizer()], ids=["heuristic", "tokenizer"])
+def test_chunks_never_exceed_max_tokens(tokenizer):
+    chunker = Chunker(max_tokens=50, overlap_tokens=10, tokenizer=tokenizer, chars_per_token=3)
+    for seed in range(50):
+        text = random_text(seed)
+        chunks = chunker.chunk_text(text)
+        assert chunks
+        for chunk in chunks:
+            assert chunker.count_tokens([chunk.text])[0] <= chunker.max_tokens
+            assert text[chunk.start:chunk.end] == chunk.text
+
+def test_offsets_point_into_the_joined_stream():
+    chunker = Chunker(max_tokens=40, overlap_tokens=10, tokenizer=None, chars_per_token=3)
+    # Several windows of text, so the buffer is trimmed while chunks are emitted
+    pieces = [f"Paragraph {p} sentence {s} has a few words." for p in range(3000) for s in range(3)]
+    pieces = [" ".join(pieces[i:i + 3]) for i in range(0, len(pieces), 3)]
+    joined = "\n\n".join(pieces)
+    assert len(joined) > 2 * WINDOW_CHARS
+
+    chunks = list(chunker.chunk_stream(pieces, separator="\n\n"))
+    for chunk in chunks:
+        assert joined[chunk.start:chunk.end] == chunk.text
+    assert chunks[0].start == 0 and chunks[-1].end == len(joined)
+    assert all(later.start > earlier.start for earlier, later in zip(chunks, chunks[1:]))
+
+def test_overlap_repeats_whole_trailing_sentences():
+    text = " ".join(f"Sentence number {n} ends here." for n in range(200))
+    chunker = Chunker(max_tokens=40, overlap_tokens=12, tokenizer=None, chars_per_token=3)
+    chunks = chunker.chunk_text(text)
+    assert len(chunks) > 5
+    for earlier, later in zip(chunks, chunks[1:]):
+        overlap = text[later.start:earlier.end]
+        assert overlap and earlier.text.endswith(overlap) and later.text.startswith(overlap)
+        # The overlap starts at a sentence and stays within the overlap budget
+        assert overlap.startswith("Sentence number ")
+        assert chunker.count_tokens([overlap])[0] <= chunker.overlap_tokens
+
+    no_overlap = Chunker(max_tokens=40, overlap_tokens=0, tokenizer=None, chars_per_token=3).chunk_text(text)
+    assert all(later.start >= earlier.end for earlier, later in zip(no_overlap, no_overlap[1:]))
+    assert " ".join(chunk.text for chunk in no_overlap) == text
+
+@pytest.mark.parametrize("tokenizer", [None, WhitespaceTokenizer()], ids=["heuristic", "tokenizer"])
+def test_long_sentences_are_split_within_the_limit(tokenizer):
+    text = " ".join(f"word{n}" for n in range(2000))
+    chunker = Chunker(max_tokens=30, overlap_tokens=0, tokenizer=tokenizer, chars_per_token=3)
+    chunks = chunker.chunk_text(text)
+    assert len(chunks) > 10
+    for chunk in chunks:
+        assert chunker.count_tokens([chunk.text])[0] <= chunker.max_tokens
+        assert text[chunk.start:chunk.end] == chunk.text
+    assert " ".join(chunk.text for chunk in chunks).split() == text.split()
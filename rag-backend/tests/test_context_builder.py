@@ -0,0 +1,108 @@
+import pytest
+
+from config import settings
+from services.context_builder import ContextBuilder
+
+def chunk(text, documentId, index=None, **metadata):
+    metadata = dict(metadata, documentId=documentId)
+    if index is not None:
+        metadata["chunk_index"] = index
+    return {"document": text, "metadata": metadata}
+
+def words(prefix, count):
+    return " ".join(f"{prefix}{n}" for n in range(count))
+
+@pytest.fixture
+def builder(monkeypatch):
+    monkeypatch.setattr(settings, "CONTEXT_TOKEN_BUDGET", 10_000)
+    monkeypatch.setattr(settings, "CONTEXT_TOKEN_BUDGETS", "")
+    monkeypatch.setattr(settings, "CONTEXT_CHARS_PER_TOKEN", 4)
+    monkeypatch.setattr(settings, "CONTEXT_SHINGLE_SIZE", 5)
+    monkeypatch.setattr(settings, "CONTEXT_DUPLICATE_THRESHOLD", 0.8)
+    return ContextBuilder()
+
+def test_consecutive_chunks_are_stitched_without_their_overlap(builder):
+    first = words("alpha", 30)
+    # The next chunk repeats the last words of the previous one
+    second = " ".join(first.split()[-10:]) + " " + words("beta", 20)
+    context = [
+        chunk(second, "doc-a", 4),
+        chunk(words("other", 20), "doc-b", 0),
+        chunk(first, "doc-a", 3),
+    ]
+
+    items = builder.build(context)
+
+    assert [item["metadata"]["documentId"] for item in items] == ["doc-a", "doc-b"]
+    assert items[0]["document"] == first + " " + words("beta", 20)
+    assert items[0]["metadata"]["chunk_index"] == 3
+    assert items[0]["metadata"]["chunk_index_end"] == 4
+    # The caller's metadata is copied, not annotated in place
+    assert "chunk_index_end" not in context[2]["metadata"]
+
+def test_gaps_repeats_and_unindexed_chunks_are_not_merged(builder):
+    context = [
+        chunk(words("one", 20), "doc-a", 1),
+        chunk(words("three", 20), "doc-a", 3),
+        chunk(words("one", 20), "doc-a", 1),
+        chunk(words("loose", 20), "doc-a"),
+    ]
+
+    items = builder.build(context)
+
+    assert [item["document"] for item in items] == [words("one", 20), words("three", 20), words("loose", 20)]
+    assert all("chunk_index_end" not in item["metadata"] for item in items)
+
+def test_near_duplicates_of_higher_ranked_items_are_dropped(builder):
+    original = words("shared", 60)
+    # Only the last of its 56 shingles differs: well above the 0.8 containment threshold
+    near_copy = original.replace("shared59", "changed")
+    context = [
+        chunk(original, "doc-a"),
+        chunk(words("distinct", 60), "doc-b"),
+        chunk(near_copy, "doc-c"),
+        chunk(" ".join(original.split()[10:40]), "doc-d"),
+    ]
+
+    items = builder.build(context)
+
+    assert [item["metadata"]["documentId"] for item in items] == ["doc-a", "doc-b"]
+
+def test_a_partly_overlapping_item_is_kept(builder):
+    original = words("shared", 40)
+    half = " ".join(original.split()[:20]) + " " + words("fresh", 20)
+
+    items = builder.build([chunk(original, "doc-a"), chunk(half, "doc-b")])
+
+    assert [item["metadata"]["documentId"] for item in items] == ["doc-a", "doc-b"]
+
+def test_packing_keeps_relevance_order_within_the_budget(builder):
+    builder.default_budget = 10
+    context = [
+        chunk("a" * 16, "doc-a"),   # 4 tokens
+        chunk("b" * 40, "doc-b"),   # 10 tokens: does not fit after doc-a
+        chunk("c" * 20, "doc-c"),   # 5 tokens: fills the remaining budget
+        chunk("d" * 8, "doc-d"),    # 2 tokens: over budget
+    ]
+
+    items = builder.build(context)
+
+    assert [item["metadata"]["documentId"] for item in items] == ["doc-a", "doc-c"]
+
+def test_an_oversized_top_item_is_truncated_to_the_budget(builder):
+    builder.default_budget = 5
+
+    items = builder.build([chunk("x" * 100, "doc-a"), chunk("y" * 4, "doc-b")])
+
+    assert items == [{"document": "x" * 20, "metadata": {"documentId": "doc-a"}}]
+
+def test_per_model_budgets_override_the_default(monkeypatch):
+    monkeypatch.setattr(settings, "CONTEXT_TOKEN_BUDGET", 1500)
+    monkeypatch.setattr(settings, "CONTEXT_TOKEN_BUDGETS", "llama2:4096, mistral:8000")
+
+    builder = ContextBuilder()
+
+    assert builder.token_budget("llama2") == 4096
+    assert builder.token_budget("mistral") == 8000
+    assert builder.token_budget("phi2") == 1500
+    assert builder.token_budget(None) == 1500
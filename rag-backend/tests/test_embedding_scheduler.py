@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+import pytest
+
+from services.embedding_scheduler import EmbeddingScheduler
+
+class RecordingEncoder:
+    """
+    Encode function that records every batch and embeds a text as [len(text)]
+    """
+
+    def __init__(self, fail_on: str = None):
+        self.batches = []
+        self.fail_on = fail_on
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        if self.fail_on in texts:
+            raise RuntimeError("encoder failed")
+        return [[float(len(text))] for text in texts]
+
+def run_with(scheduler, scenario):
+    async def main():
+        try:
+            return await scenario()
+        finally:
+            await scheduler.stop()
+    return asyncio.run(main())
+
+def test_concurrent_callers_share_one_encode_call():
+    encoder = RecordingEncoder()
+    scheduler = EmbeddingScheduler(encoder, max_batch_size=32, max_wait_ms=50)
+    texts = ["a", "bb", "ccc", "dddd"]
+
+    embeddings = run_with(scheduler, lambda: asyncio.gather(*[scheduler.embed(text) for text in texts]))
+
+    assert encoder.batches == [texts]
+    assert embeddings == [[1.0], [2.0], [3.0], [4.0]]
+
+def test_full_batches_flush_without_waiting():
+    encoder = RecordingEncoder()
+    # A wait far longer than the test: only a full batch can flush early
+    scheduler = EmbeddingScheduler(encoder, max_batch_size=4, max_wait_ms=60_000)
+    texts = [str(n) * n for n in range(1, 9)]
+
+    started = time.perf_counter()
+    embeddings = run_with(scheduler, lambda: asyncio.gather(*[scheduler.embed(text) for text in texts]))
+
+    assert time.perf_counter() - started < 5
+    assert encoder.batches == [texts[:4], texts[4:]]
+    assert embeddings == [[float(n)] for n in range(1, 9)]
+
+def test_a_lone_request_flushes_after_the_wait():
+    encoder = RecordingEncoder()
+    scheduler = EmbeddingScheduler(encoder, max_batch_size=32, max_wait_ms=20)
+
+    async def scenario():
+        first = await scheduler.embed("first")
+        # Arrives after the first batch was encoded, so it gets a batch of its own
+        second = await scheduler.embed("second")
+        return first, second
+
+    assert run_with(scheduler, scenario) == ([5.0], [6.0])
+    assert encoder.batches == [["first"], ["second"]]
+
+def test_encode_errors_fail_the_batch_and_the_scheduler_keeps_running():
+    encoder = RecordingEncoder(fail_on="bad")
+    scheduler = EmbeddingScheduler(encoder, max_batch_size=32, max_wait_ms=20)
+
+    async def scenario():
+        failed = await asyncio.gather(scheduler.embed("bad"), scheduler.embed("good"), return_exceptions=True)
+        return failed, await scheduler.embed("later")
+
+    failed, later = run_with(scheduler, scenario)
+
+    assert all(isinstance(result, RuntimeError) for result in failed)
+    assert later == [5.0]
+    assert encoder.batches == [["bad", "good"], ["later"]]
+
+def test_cancelled_callers_are_left_out_of_the_batch():
+    encoder = RecordingEncoder()
+    scheduler = EmbeddingScheduler(encoder, max_batch_size=32, max_wait_ms=50)
+
+    async def scenario():
+        gone = asyncio.create_task(scheduler.embed("gone"))
+        kept = asyncio.create_task(scheduler.embed("kept"))
+        await asyncio.sleep(0)
+        gone.cancel()
+        return await kept
+
+    assert run_with(scheduler, scenario) == [4.0]
+    assert encoder.batches == [["kept"]]
+
+def test_stop_cancels_waiting_callers():
+    encoder = RecordingEncoder()
+    scheduler = EmbeddingScheduler(encoder, max_batch_size=32, max_wait_ms=60_000)
+
+    async def scenario():
+        waiting = asyncio.create_task(scheduler.embed("never"))
+        await asyncio.sleep(0)
+        await scheduler.stop()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+    run_with(scheduler, scenario)
+    assert encoder.batches == []
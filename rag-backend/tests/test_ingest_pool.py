@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from services.ingest_pool import IngestionPool
+from services.ingestion_batcher import IngestionBatcher
+
+def fake_encode(texts):
+    # Module-level so spawned pool workers can unpickle it
+    return [[float(len(text))] for text in texts]
+
+class FakeVectorDB:
+    def __init__(self):
+        self.count = 0
+
+    def add_documents(self, documents, metadata, ids=None, embeddings=None):
+        self.count += len(documents)
+
+async def ingest(pool, batcher, path, documentId):
+    tracker = batcher.open_document(documentId)
+    added = 0
+    async for group in pool.iter_chunks(path, path, group_size=batcher.batch_size):
+        for chunk in group:
+            await batcher.add(tracker, chunk.text, {"documentId": documentId}, None)
+            added += 1
+    batcher.close_document(tracker)
+    await tracker.wait()
+    return added
+
+@pytest.mark.parametrize("pool_size", [1, 2])
+def test_streaming_extraction_does_not_starve_encoding(tmp_path, pool_size):
+    """
+    More chunks than the batcher admits at once, with every pool slot that could stream
+    busy: extraction must not hold the processes the encodes need (used to hang at size 1)
+    """
+    paths = []
+    for index in range(2):
+        path = tmp_path / f"doc{index}.txt"
+        path.write_text("".join(f"Sentence number {n} of document {index} is here. " for n in range(20000)))
+        paths.append(str(path))
+
+    pool = IngestionPool(size=pool_size, pool_encoder=fake_encode)
+    vector_db = FakeVectorDB()
+
+    async def run():
+        batcher = IngestionBatcher(pool, vector_db, batch_size=16, max_wait_ms=10, max_pending_chunks=64)
+        try:
+            return await asyncio.wait_for(
+                asyncio.gather(*(ingest(pool, batcher, path, str(index)) for index, path in enumerate(paths))),
+                timeout=60
+            )
+        finally:
+            await batcher.stop()
+
+    try:
+        added = asyncio.run(run())
+    finally:
+        pool.shutdown()
+    assert all(count > 64 for count in added)
+    assert vector_db.count == sum(added)
+
+def test_consumer_fails_when_the_streaming_process_dies(tmp_path):
+    """
+    A pool process killed mid-stream (e.g. by the OOM killer) never queues the end marker:
+    the consumer must surface BrokenProcessPool instead of waiting on the queue forever
+    """
+    from concurrent.futures.process import BrokenProcessPool
+
+    path = tmp_path / "large.txt"
+    path.write_text("".join(f"Sentence number {n} is here. " for n in range(200000)))
+    pool = IngestionPool(size=2, pool_encoder=fake_encode)
+
+    async def run():
+        groups = 0
+        async for _ in pool.iter_chunks(str(path), str(path), group_size=16):
+            groups += 1
+            if groups == 1:
+                for process in list(pool.executor._processes.values()):
+                    process.kill()
+        return groups
+
+    try:
+        with pytest.raises(BrokenProcessPool):
+            asyncio.run(asyncio.wait_for(run(), timeout=60))
+    finally:
+        pool.shutdown()
@@ -0,0 +1,48 @@
+import sqlite3
+from services.lexical_index import LexicalIndex
+
+def stats_row(index: LexicalIndex):
+    return index._connection.execute("SELECT chunk_count, total_length FROM stats").fetchall()
+
+def table_totals(index: LexicalIndex):
+    return [index._connection.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks").fetchone()]
+
+def test_stats_row_follows_add_reindex_and_delete(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical.sqlite3"))
+    assert stats_row(index) == [(0, 0)]
+    index.add(["a", "b"], ["alpha beta gamma", "delta"], [{"documentId": "d1"}, {"documentId": "d2"}])
+    assert stats_row(index) == [(2, 4)]
+    # Re-indexing replaces the chunk instead of counting it twice
+    index.add(["a"], ["alpha"], [{"documentId": "d1"}])
+    assert stats_row(index) == [(2, 2)]
+    index.delete(["b", "missing"])
+    assert stats_row(index) == [(1, 1)] == table_totals(index)
+
+def test_stats_row_is_seeded_for_existing_indexes(tmp_path):
+    path = str(tmp_path / "lexical.sqlite3")
+    index = LexicalIndex(path)
+    index.add(["a", "b"], ["alpha beta", "gamma"], [{"documentId": "d1"}, {"documentId": "d2"}])
+    index._connection.close()
+    # An index written before the stats table existed
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute("DROP TRIGGER chunks_insert_stats")
+        connection.execute("DROP TRIGGER chunks_delete_stats")
+        connection.execute("DROP TABLE stats")
+    connection.close()
+
+    reopened = LexicalIndex(path)
+    assert stats_row(reopened) == [(2, 3)]
+
+def test_scoped_search_matches_unscoped_scores(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical.sqlite3"))
+    ids = [f"c{i}" for i in range(12)]
+    documents = [f"invoice {i} payment terms" if i % 2 else f"shipping {i} terms" for i in range(12)]
+    metadatas = [{"documentId": f"d{i % 3}"} for i in range(12)]
+    index.add(ids, documents, metadatas)
+
+    unscoped = dict(index.search("invoice shipping", n_results=12))
+    scoped = index.search("invoice shipping", documentsId=["d1"], n_results=12)
+    assert {chunk_id for chunk_id, _ in scoped} == {f"c{i}" for i in range(12) if i % 3 == 1}
+    for chunk_id, score in scoped:
+        assert score == unscoped[chunk_id]
@@ -0,0 +1,97 @@
+import numpy as np
+
+from services.mmap_vector_store import MmapVectorStore
+
+DIM = 16
+
+def random_vectors(count: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_update_metadata_keeps_text_and_vectors(tmp_path):
+    store = MmapVectorStore(path=str(tmp_path), ann="none")
+    vectors = random_vectors(3)
+    store.upsert(
+        ids=["d:a", "d:b", "d:c"],
+        embeddings=vectors.tolist(),
+        documents=["a", "b", "c"],
+        metadatas=[{"documentId": "d", "chunk_index": i} for i in range(3)]
+    )
+    store.update_metadata(["d:a", "d:c"], [{"documentId": "d", "chunk_index": 5}, {"documentId": "d", "chunk_index": 0}])
+
+    page = store.get(documentId="d", include=["documents", "metadatas"])
+    by_id = dict(zip(page["ids"], zip(page["documents"], page["metadatas"])))
+    assert by_id["d:a"] == ("a", {"documentId": "d", "chunk_index": 5})
+    assert by_id["d:b"] == ("b", {"documentId": "d", "chunk_index": 1})
+    assert by_id["d:c"] == ("c", {"documentId": "d", "chunk_index": 0})
+    results = store.query([vectors[2].tolist()], 1)
+    assert results["ids"][0] == ["d:c"]
+    assert results["metadatas"][0][0]["chunk_index"] == 0
+    assert store.count() == 3
+    store.close()
+
+def test_int8_scan_matches_exact_search_across_blocks(tmp_path, monkeypatch):
+    import services.mmap_vector_store as mmap_module
+    # Several quantized blocks, and no ANN graph, so the int8 scan + rescore path is used
+    monkeypatch.setattr(mmap_module, "CONVERTED_SCAN_BLOCK_ROWS", 64)
+    store = MmapVectorStore(path=str(tmp_path), ann="none", quantization="int8", rescore_multiplier=4)
+    vectors = random_vectors(1000, seed=1)
+    store.upsert(
+        ids=[f"d:{i}" for i in range(1000)],
+        embeddings=vectors.tolist(),
+        documents=[str(i) for i in range(1000)],
+        metadatas=[{"documentId": "d"} for _ in range(1000)]
+    )
+    queries = random_vectors(20, seed=2)
+    results = store.query(queries.tolist(), 5)
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :5]
+    for ids, expected in zip(results["ids"], exact):
+        assert ids == [f"d:{i}" for i in expected]
+    store.close()
+
+def test_int8_codes_are_not_clipped_by_earlier_batches(tmp_path):
+    store = MmapVectorStore(path=str(tmp_path), ann="none", quantization="int8")
+    # First batch: spread-out vectors with small components; later: one-hot vectors with a component of 1.0
+    spread = np.full((1, DIM), 1.0 / np.sqrt(DIM), dtype=np.float32)
+    store.upsert(ids=["d:spread"], embeddings=spread.tolist(), documents=["spread"], metadatas=[{"documentId": "d"}])
+    one_hot = np.eye(DIM, dtype=np.float32)
+    store.upsert(
+        ids=[f"d:{i}" for i in range(DIM)],
+        embeddings=one_hot.tolist(),
+        documents=[str(i) for i in range(DIM)],
+        metadatas=[{"documentId": "d"} for _ in range(DIM)]
+    )
+    with store._lock:
+        store._refresh()
+        codes = np.asarray(store._codes)
+        scales = np.asarray(store._code_scales)
+    decoded = codes.astype(np.float32) * (scales[:, None] / 127.0)
+    np.testing.assert_allclose(decoded[1:], one_hot, atol=1e-6)
+    np.testing.assert_allclose(decoded[0], spread[0], atol=1.0 / 127.0)
+    store.close()
+
+def test_int8_store_scans_codes_above_the_ann_threshold(tmp_path, monkeypatch):
+    store = MmapVectorStore(path=str(tmp_path), ann="auto", ann_threshold=100, quantization="int8")
+    vectors = random_vectors(500, seed=3)
+    store.upsert(
+        ids=[f"d:{i}" for i in range(500)],
+        embeddings=vectors.tolist(),
+        documents=[str(i) for i in range(500)],
+        metadatas=[{"documentId": "d"} for _ in range(500)]
+    )
+    scanned = []
+    scan = store._scan
+    monkeypatch.setattr(store, "_scan", lambda matrix, *args, **kwargs: scanned.append(matrix.dtype) or scan(matrix, *args, **kwargs))
+    monkeypatch.setattr(store, "build_ann", lambda: (_ for _ in ()).throw(AssertionError("ANN graph built for an int8 store")))
+
+    for _ in range(2):
+        results = store.query(vectors[:1].tolist(), 3)
+        assert results["ids"][0][0] == "d:0"
+    assert scanned == [np.int8, np.int8]
+    assert store._ann is None
+    store.close()
+
+def test_int8_store_builds_an_explicitly_requested_graph(tmp_path):
+    store = MmapVectorStore(path=str(tmp_path), ann="hnswlib", ann_threshold=100, quantization="int8")
+    assert store._ann_class is not None
+    store.close()
@@ -0,0 +1,141 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from services.partitioned_vector_store import GLOBAL_PARTITION, open_partitioned_store
+
+DIM = 8
+
+def make_chunks(documents: int, per_document: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for d in range(documents):
+        for c in range(per_document):
+            chunks.append((f"doc{d}:{c}", rng.standard_normal(DIM).tolist(), f"text {d} {c}", {"documentId": f"doc{d}", "chunk_index": c}))
+    return chunks
+
+def upsert_chunks(store, chunks):
+    for start in range(0, len(chunks), 5):
+        batch = chunks[start:start + 5]
+        store.upsert(
+            ids=[chunk[0] for chunk in batch],
+            embeddings=[chunk[1] for chunk in batch],
+            documents=[chunk[2] for chunk in batch],
+            metadatas=[chunk[3] for chunk in batch]
+        )
+
+@pytest.fixture
+def store(tmp_path):
+    store = open_partitioned_store("mmap", str(tmp_path), mode="document", max_open=4, list_ttl=60, ann="none")
+    chunks = make_chunks(documents=12, per_document=5)
+    upsert_chunks(store, chunks)
+    yield store, chunks
+    store.close()
+
+def test_open_partitions_are_bounded(store):
+    store, chunks = store
+    assert len(store._stores) <= 4
+    assert store.count() == len(chunks)
+    assert len(store._stores) <= 4
+
+def test_evicted_partitions_are_closed_and_reopened(store):
+    store, chunks = store
+    first = store._stores[next(iter(store._stores))].store
+    for d in range(12):
+        store.query([chunks[0][1]], 3, documentsId=[f"doc{d}"])
+    assert first not in [entry.store for entry in store._stores.values()]
+    with pytest.raises(Exception):
+        first._connection.execute("SELECT 1")
+    results = store.query([chunks[0][1]], 1, documentsId=["doc0"])
+    assert results["ids"][0] == ["doc0:0"]
+
+def test_unscoped_query_searches_every_partition(store):
+    store, chunks = store
+    results = store.query([chunk[1] for chunk in chunks[::7]], 1)
+    assert [ids[0] for ids in results["ids"]] == [chunk[0] for chunk in chunks[::7]]
+
+def test_partition_list_is_cached(tmp_path):
+    store = open_partitioned_store("mmap", str(tmp_path), mode="hash", partitions=4, list_ttl=60, ann="none")
+    upsert_chunks(store, make_chunks(documents=12, per_document=5))
+    calls = []
+    list_partitions = store._list_partitions
+    store._list_partitions = lambda: calls.append(1) or list_partitions()
+    for _ in range(5):
+        store.query([[1.0] * DIM], 2)
+    # Listed once after the partitions created by the upserts, then served from the cache
+    assert calls == [1]
+    store.upsert(ids=["new:0"], embeddings=[[5.0] + [0.0] * (DIM - 1)], documents=["new"], metadatas=[{"documentId": "new"}])
+    assert store.query([[1.0] + [0.0] * (DIM - 1)], 1)["ids"][0] == ["new:0"]
+    # "new" hashes into an existing bucket, so the cached list is still complete
+    assert calls == [1]
+    store.close()
+
+def test_document_mode_serves_unscoped_calls_from_the_global_partition(store):
+    store, chunks = store
+    opened = []
+    open_partition = store._open_partition
+    store._open_partition = lambda name: opened.append(name) or open_partition(name)
+    store.close()
+    store._list_partitions = lambda: pytest.fail("unscoped calls listed the partitions")
+
+    results = store.query([chunk[1] for chunk in chunks[::7]], 1)
+    assert [ids[0] for ids in results["ids"]] == [chunk[0] for chunk in chunks[::7]]
+    assert store.count() == len(chunks)
+    assert len(store.get(include=["metadatas"], limit=100)["ids"]) == len(chunks)
+    assert opened == [GLOBAL_PARTITION]
+
+def test_unknown_documents_are_negatively_cached(store):
+    store, chunks = store
+    checks = []
+    partition_exists = store._partition_exists
+    store._partition_exists = lambda name: checks.append(name) or partition_exists(name)
+    for _ in range(5):
+        assert store.query([chunks[0][1]], 3, documentsId=["missing"])["ids"] == [[]]
+    assert checks == [store.partition_for("missing")]
+
+def test_delete_removes_both_copies(store):
+    store, chunks = store
+    store.delete(["doc3:0", "doc3:1"])
+    assert store.count() == len(chunks) - 2
+    assert sorted(store.get(documentId="doc3", include=[])["ids"]) == ["doc3:2", "doc3:3", "doc3:4"]
+    results = store.query([chunks[15][1]], 1)
+    assert results["ids"][0] != ["doc3:0"]
+
+def test_global_partition_is_rebuilt_when_missing(tmp_path):
+    store = open_partitioned_store("mmap", str(tmp_path), mode="document", ann="none")
+    chunks = make_chunks(documents=6, per_document=5)
+    upsert_chunks(store, chunks)
+    store.close()
+    shutil.rmtree(tmp_path / GLOBAL_PARTITION)
+
+    reopened = open_partitioned_store("mmap", str(tmp_path), mode="document", ann="none")
+    assert reopened.count() == len(chunks)
+    assert reopened.query([chunks[8][1]], 1)["ids"][0] == [chunks[8][0]]
+    reopened.close()
+
+def test_refuses_to_hide_unpartitioned_chunks(tmp_path):
+    from services.mmap_vector_store import MmapVectorStore
+    legacy = MmapVectorStore(path=str(tmp_path), ann="none")
+    legacy.upsert(ids=["doc0:0"], embeddings=[[1.0] * DIM], documents=["text"], metadatas=[{"documentId": "doc0"}])
+    legacy.close()
+    with pytest.raises(RuntimeError, match="migrate_vector_store.py --partition-mode document"):
+        open_partitioned_store("mmap", str(tmp_path), mode="document", ann="none")
+
+def test_sequential_pages_use_the_cursor(store):
+    store, chunks = store
+    counts = []
+    for entry in store._stores.values():
+        original = entry.store.count
+        entry.store.count = lambda original=original: counts.append(1) or original()
+    ids, offset = [], 0
+    while True:
+        page = store.get(include=["metadatas"], limit=7, offset=offset)
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        offset += len(page["ids"])
+    assert sorted(ids) == sorted(chunk[0] for chunk in chunks)
+    assert counts == []
+    # Random access still works without a cursor
+    assert store.get(include=[], limit=3, offset=11)["ids"] == ids[11:14]
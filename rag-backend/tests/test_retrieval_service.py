@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+import pytest
+
+from config import settings
+from services.metrics import metrics
+from services.reranker import Reranker
+from services.retrieval_service import RetrievalService
+from services.vector_db_service import VectorDBService
+
+def make_service(monkeypatch):
+    vector_db_service = VectorDBService()
+    encoded = []
+
+    def fake_create_embeddings(texts):
+        encoded.extend(texts)
+        return [[float(len(text)), float(sum(map(ord, text)))] for text in texts]
+
+    monkeypatch.setattr(vector_db_service, "create_embeddings", fake_create_embeddings)
+    return RetrievalService(vector_db_service), encoded
+
+def test_query_variants_sharing_a_cache_key_get_one_embedding(monkeypatch):
+    service, encoded = make_service(monkeypatch)
+
+    async def scenario():
+        first = await service.embed_query("  What is the refund policy??  ")
+        second = await service.embed_query("what is the refund policy")
+        batch = await service.embed_queries(["WHAT IS THE REFUND POLICY?", "Shipping times?", "shipping times"])
+        await service.embedding_scheduler.stop()
+        return first, second, batch
+
+    try:
+        first, second, batch = asyncio.run(scenario())
+    finally:
+        service.executor.shutdown(wait=True)
+
+    assert encoded == ["what is the refund policy", "shipping times"]
+    assert first == second == batch[0]
+    assert batch[1] == batch[2]
+
+def test_uncached_embedding_matches_the_cached_one(monkeypatch):
+    service, encoded = make_service(monkeypatch)
+
+    async def scenario():
+        cached = await service.embed_query("what is the refund policy")
+        service.vector_db_service.query_embedding_cache.clear()
+        # A cache miss for a variant must not produce a different vector than the one cached under its key
+        uncached = await service.embed_query("What is the Refund Policy?")
+        await service.embedding_scheduler.stop()
+        return cached, uncached
+
+    try:
+        cached, uncached = asyncio.run(scenario())
+    finally:
+        service.executor.shutdown(wait=True)
+    assert cached == uncached
+    assert encoded == ["what is the refund policy", "what is the refund policy"]
+
+class FakeCrossEncoder:
+    """
+    Scores a candidate by the number in its text; each batch takes `delay` seconds
+    """
+
+    def __init__(self, delay: float = 0.0, error: Exception = None):
+        self.delay = delay
+        self.error = error
+        self.batches = 0
+
+    def predict(self, pairs, batch_size):
+        if self.error is not None:
+            raise self.error
+        self.batches += 1
+        time.sleep(self.delay)
+        return [float(document) for _, document in pairs]
+
+def make_candidates(count: int) -> list:
+    return [{"id": f"c{i}", "document": str(i), "metadata": {}, "distance": i / 100} for i in range(count)]
+
+def test_reranker_gives_up_at_the_deadline():
+    reranker = Reranker()
+    reranker.batch_size = 2
+    reranker._model = FakeCrossEncoder(delay=0.05)
+
+    ranked = reranker.rerank("q", make_candidates(6), 3)
+    assert [result["id"] for result in ranked] == ["c5", "c4", "c3"]
+    assert reranker.rerank("q", make_candidates(6), 3, deadline=time.monotonic() + 0.01) is None
+    assert reranker._model.batches == 3 + 1
+
+@pytest.mark.parametrize("model, counter", [
+    (FakeCrossEncoder(delay=0.05), "retrieval.rerank_fallbacks"),
+    (FakeCrossEncoder(error=RuntimeError("model crashed")), "retrieval.rerank_errors")
+], ids=["budget", "error"])
+def test_rerank_falls_back_to_vector_order(monkeypatch, caplog, model, counter):
+    monkeypatch.setattr(settings, "RERANK_BUDGET_MS", 10)
+    service, _ = make_service(monkeypatch)
+    service.reranker = Reranker()
+    service.reranker.batch_size = 2
+    service.reranker._model = model
+    before = metrics.snapshot()["counters"]
+
+    try:
+        results = asyncio.run(service._rerank("q", make_candidates(6), 3, include=["metadatas"]))
+    finally:
+        service.executor.shutdown(wait=True)
+
+    assert [result["id"] for result in results] == ["c0", "c1", "c2"]
+    assert all(result["document"] is None for result in results)
+    after = metrics.snapshot()["counters"]
+    for name in ("retrieval.rerank_fallbacks", "retrieval.rerank_errors"):
+        expected = 1 if name == counter else 0
+        assert after.get(name, 0) - before.get(name, 0) == expected
+    budget_logged = "budget" in caplog.text
+    assert budget_logged == (counter == "retrieval.rerank_fallbacks")
+    if model.error is not None:
+        assert "model crashed" in caplog.text
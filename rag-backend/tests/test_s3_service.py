@@ -0,0 +1,110 @@
+import os
+
+import pytest
+from moto import mock_aws
+
+from config import settings
+from services import s3_service as s3_module
+from services.aws_clients import AWSClientManager, aws_clients
+from services.metrics import metrics
+
+BUCKET = "test-bucket"
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setattr(settings, "AWS_S3_BUCKET", BUCKET)
+    # Small parts so a few MB exercise the multipart and read-ahead paths
+    monkeypatch.setattr(settings, "S3_TRANSFER_THRESHOLD_BYTES", 1024 * 1024)
+    monkeypatch.setattr(settings, "S3_TRANSFER_PART_BYTES", 256 * 1024)
+    monkeypatch.setattr(settings, "S3_TRANSFER_MAX_CONCURRENCY", 4)
+    monkeypatch.setattr(settings, "S3_SPOOL_MEMORY_BYTES", 64 * 1024)
+    monkeypatch.setattr(settings, "S3_RANGE_BLOCK_BYTES", 64 * 1024)
+    with mock_aws():
+        monkeypatch.setattr(aws_clients, "_clients", {})
+        monkeypatch.setattr(aws_clients, "_session", None)
+        monkeypatch.setattr(s3_module, "_s3_service", None)
+        service = s3_module.get_s3_service()
+        service.s3_client.create_bucket(Bucket=BUCKET)
+        yield service
+        service.close()
+
+@pytest.fixture
+def big_object(s3):
+    data = os.urandom(3 * 1024 * 1024 + 12345)
+    s3.s3_client.put_object(Bucket=BUCKET, Key="big.pdf", Body=data)
+    return s3.describe("big.pdf"), data
+
+def test_clients_are_shared_per_service():
+    with mock_aws():
+        manager = AWSClientManager()
+        s3_client = manager.get("s3")
+        assert manager.get("s3") is s3_client
+        assert manager.get("sqs") is not s3_client
+        assert s3_client.meta.config.max_pool_connections == settings.AWS_MAX_POOL_CONNECTIONS
+
+def test_service_is_shared_and_uses_pooled_client(s3):
+    assert s3_module.get_s3_service() is s3
+    assert s3.s3_client is aws_clients.get("s3")
+
+def test_describe_reports_size(big_object):
+    obj, data = big_object
+    assert obj.size == len(data)
+
+def test_iter_blocks_reads_parts_in_order(s3, big_object):
+    obj, data = big_object
+    calls = []
+    get_object = s3.s3_client.get_object
+
+    def counting_get_object(**kwargs):
+        calls.append(kwargs.get("Range"))
+        return get_object(**kwargs)
+
+    s3.s3_client.get_object = counting_get_object
+    try:
+        assert b"".join(s3.iter_blocks(obj, 64 * 1024)) == data
+    finally:
+        del s3.s3_client.get_object
+    # Above the threshold: one ranged GET per part
+    assert len(calls) == -(-len(data) // settings.S3_TRANSFER_PART_BYTES)
+    assert all(call and call.startswith("bytes=") for call in calls)
+
+def test_iter_blocks_small_object_single_get(s3):
+    s3.s3_client.put_object(Bucket=BUCKET, Key="small.txt", Body=b"hello world")
+    assert b"".join(s3.iter_blocks(s3.describe("small.txt"), 4)) == b"hello world"
+
+def test_iter_blocks_stops_early(s3, big_object):
+    obj, data = big_object
+    blocks = s3.iter_blocks(obj, 1024)
+    assert next(blocks) == data[:1024]
+    blocks.close()
+
+def test_open_seekable_spools_with_transfer_manager(s3, big_object):
+    obj, data = big_object
+    with s3.open_seekable(obj) as file:
+        assert file.read() == data
+        file.seek(1000)
+        assert file.read(10) == data[1000:1010]
+    assert "s3.download_mbps" in metrics.snapshot()["summaries"]
+
+def test_open_seekable_ranged_reads(s3, big_object):
+    obj, data = big_object
+    with s3.open_seekable(obj, prefer_ranges=True) as file:
+        file.seek(2 * 1024 * 1024 + 7)
+        assert file.read(100000) == data[2 * 1024 * 1024 + 7:2 * 1024 * 1024 + 100007]
+        file.seek(-10, os.SEEK_END)
+        assert file.read() == data[-10:]
+        reader = file.raw
+        # Only the blocks touched were fetched
+        assert reader.requests <= 4
+    assert "s3.range_mbps" in metrics.snapshot()["summaries"]
+
+def test_download_file_multipart(s3, big_object):
+    _, data = big_object
+    path = s3.download_file("big.pdf")
+    try:
+        assert path.endswith(".pdf")
+        with open(path, "rb") as file:
+            assert file.read() == data
+    finally:
+        s3.delete_local_file(path)
+    assert not os.path.exists(path)
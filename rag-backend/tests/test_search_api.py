@@ -0,0 +1,133 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from config import settings
+
+class FakeRetrievalService:
+    """
+    Ranked hits at distances 0.00, 0.01, 0.02, ... for every query; records the n_results asked for
+    """
+
+    reranker = None
+
+    def __init__(self, total: int = 300):
+        self.results = [
+            {"id": f"doc-1:{i}", "distance": i / 100, "documents": f"chunk {i}", "metadatas": {"documentId": "doc-1"}}
+            for i in range(total)
+        ]
+        self.calls = []
+
+    def hits(self, n_results, include):
+        fields = {"documents": "document", "metadatas": "metadata"}
+        return [
+            {"id": result["id"], "distance": result.get("distance"),
+             **{fields[key]: result[key] if key in include else None for key in fields}}
+            for result in self.results[:n_results]
+        ]
+
+    async def search_similar(self, query, documentsId=None, n_results=5, include=None):
+        self.calls.append([n_results])
+        return self.hits(n_results, include)
+
+    async def search_batch(self, queries, documentsIds, n_results, include=None):
+        self.calls.append(list(n_results))
+        return [self.hits(n, include) for n in n_results]
+
+@pytest.fixture
+def retrieval(monkeypatch):
+    service = FakeRetrievalService()
+    monkeypatch.setattr(main, "retrieval_service", service)
+    return service
+
+@pytest.fixture
+def client():
+    # Without the context manager the lifespan (and model warm-up) does not run
+    return TestClient(main.app)
+
+def test_search_pages_through_hits(retrieval, client):
+    response = client.post("/search", json={"query": "q", "limit": 3, "offset": 2, "fields": ["document"]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [hit["id"] for hit in body["results"]] == ["doc-1:2", "doc-1:3", "doc-1:4"]
+    assert body["results"][0] == {"id": "doc-1:2", "distance": 0.02, "score": 0.98, "document": "chunk 2"}
+    assert body["has_more"] is True
+    assert retrieval.calls == [[6]]
+
+def lexical_only(hits):
+    return [{key: value for key, value in hit.items() if key != "distance"} for hit in hits]
+
+def test_search_refetches_until_the_thresholds_leave_a_full_page(retrieval, client, monkeypatch):
+    # Hybrid fusion ranked 20 lexical-only hits first; they have no distance and fail min_score
+    monkeypatch.setattr(settings, "HYBRID_SEARCH_ENABLED", True)
+    retrieval.results[:20] = lexical_only(retrieval.results[:20])
+
+    response = client.post("/search", json={"query": "q", "limit": 5, "min_score": 0.5, "fields": []})
+
+    body = response.json()
+    assert [hit["id"] for hit in body["results"]] == [f"doc-1:{i}" for i in range(20, 25)]
+    assert body["has_more"] is True
+    assert retrieval.calls == [[6], [12], [24], [48]]
+
+@pytest.mark.parametrize("offset, has_more", [(0, True), (5, False)])
+def test_search_has_more_counts_only_hits_within_max_distance(retrieval, client, offset, has_more):
+    response = client.post("/search", json={"query": "q", "limit": 5, "offset": offset, "max_distance": 0.095})
+
+    body = response.json()
+    assert len(body["results"]) == 5
+    assert body["has_more"] is has_more
+    # Hits come nearest first, so a fetch ending past the threshold settles the page
+    assert retrieval.calls == [[offset + 6]]
+
+def test_search_stops_refetching_at_the_fetch_limit(retrieval, client, monkeypatch):
+    monkeypatch.setattr(settings, "HYBRID_SEARCH_ENABLED", True)
+    monkeypatch.setattr(settings, "SEARCH_MAX_FETCH", 50)
+
+    body = client.post("/search", json={"query": "q", "min_score": 2.0}).json()
+
+    assert body["results"] == [] and body["has_more"] is False
+    assert retrieval.calls == [[6], [12], [24], [48], [50]]
+
+def test_search_rejects_unknown_fields_and_oversized_pages(retrieval, client):
+    assert client.post("/search", json={"query": "q", "fields": ["embedding"]}).status_code == 400
+    assert client.post("/search", json={"query": "q", "offset": settings.SEARCH_MAX_RESULTS}).status_code == 400
+    assert client.post("/search", json={"query": "q", "limit": 0}).status_code == 400
+    assert retrieval.calls == []
+
+def test_search_batch_refetches_only_the_thinned_out_queries(retrieval, client):
+    response = client.post("/search/batch", json={"queries": [
+        {"query": "plain", "limit": 2},
+        {"query": "strict", "limit": 2, "min_score": 0.9, "fields": ["metadata"]},
+        {"query": "far", "limit": 2, "max_distance": 0.05, "offset": 4},
+    ]})
+
+    assert response.status_code == 200
+    plain, strict, far = response.json()["results"]
+    assert [hit["id"] for hit in plain["results"]] == ["doc-1:0", "doc-1:1"] and plain["has_more"]
+    assert strict["results"][1] == {"id": "doc-1:1", "distance": 0.01, "score": 0.99, "metadata": {"documentId": "doc-1"}}
+    assert strict["has_more"] is True
+    assert [hit["id"] for hit in far["results"]] == ["doc-1:4", "doc-1:5"] and far["has_more"] is False
+    # Each query asks for offset + limit + 1 hits; none is fetched again once its page is settled
+    assert retrieval.calls == [[3, 3, 7]]
+
+def test_search_batch_refetches_a_query_whose_page_was_thinned_out(retrieval, client, monkeypatch):
+    monkeypatch.setattr(settings, "HYBRID_SEARCH_ENABLED", True)
+    retrieval.results[:10] = lexical_only(retrieval.results[:10])
+
+    response = client.post("/search/batch", json={"queries": [
+        {"query": "plain", "limit": 2},
+        {"query": "strict", "limit": 2, "max_distance": 0.5},
+    ]})
+
+    plain, strict = response.json()["results"]
+    assert [hit["id"] for hit in plain["results"]] == ["doc-1:0", "doc-1:1"]
+    assert [hit["id"] for hit in strict["results"]] == ["doc-1:10", "doc-1:11"] and strict["has_more"]
+    assert retrieval.calls == [[3, 3], [6], [12], [24]]
+
+def test_search_batch_rejects_empty_and_oversized_batches(retrieval, client, monkeypatch):
+    monkeypatch.setattr(settings, "SEARCH_BATCH_MAX_QUERIES", 2)
+
+    assert client.post("/search/batch", json={"queries": []}).status_code == 400
+    assert client.post("/search/batch", json={"queries": [{"query": "q"}] * 3}).status_code == 400
+    assert retrieval.calls == []
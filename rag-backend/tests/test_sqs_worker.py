@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+import pytest
+from moto import mock_aws
+
+from config import settings
+from services.aws_clients import aws_clients
+import worker.sqs_worker as sqs_worker
+
+class FakeDocumentProcessor:
+    async def process_document(self, file_key, documentId, sqs_attempt=1, max_sqs_attempts=3):
+        return {"status": "success"}
+
+    async def shutdown(self):
+        pass
+
+@pytest.fixture
+def queue(monkeypatch):
+    with mock_aws():
+        monkeypatch.setattr(aws_clients, "_clients", {})
+        monkeypatch.setattr(aws_clients, "_session", None)
+        monkeypatch.setattr(sqs_worker, "DocumentProcessor", FakeDocumentProcessor)
+        sqs = aws_clients.get("sqs")
+        url = sqs.create_queue(QueueName="documents", Attributes={"VisibilityTimeout": "1"})["QueueUrl"]
+        monkeypatch.setattr(settings, "AWS_SQS_QUEUE_URL", url)
+        monkeypatch.setattr(settings, "SQS_VISIBILITY_TIMEOUT", 1)
+        yield sqs, url
+
+def send(sqs, url, count):
+    for i in range(count):
+        sqs.send_message(QueueUrl=url, MessageBody=json.dumps({"key": f"doc{i}.txt", "documentId": str(i)}))
+
+def receive(sqs, url, visibility=30):
+    messages = []
+    while True:
+        batch = sqs.receive_message(QueueUrl=url, MaxNumberOfMessages=10, VisibilityTimeout=visibility).get("Messages", [])
+        if not batch:
+            return messages
+        messages.extend(batch)
+
+def counts(sqs, url):
+    """
+    (visible, in flight) messages in the queue
+    """
+    attributes = sqs.get_queue_attributes(
+        QueueUrl=url, AttributeNames=["ApproximateNumberOfMessages", "ApproximateNumberOfMessagesNotVisible"]
+    )["Attributes"]
+    return int(attributes["ApproximateNumberOfMessages"]), int(attributes["ApproximateNumberOfMessagesNotVisible"])
+
+def test_delete_message_batch(queue):
+    sqs, url = queue
+    send(sqs, url, 12)
+    worker = sqs_worker.SQSWorker()
+    messages = receive(sqs, url)
+    assert len(messages) == 12
+    for start in range(0, 12, sqs_worker.SQS_BATCH_SIZE):
+        worker._delete_message_batch(messages[start:start + sqs_worker.SQS_BATCH_SIZE])
+    assert counts(sqs, url) == (0, 0)
+
+def test_delete_message_batch_logs_partial_failures(queue, caplog):
+    sqs, url = queue
+    send(sqs, url, 2)
+    worker = sqs_worker.SQSWorker()
+    messages = receive(sqs, url)
+    delete_message_batch = worker.sqs_client.delete_message_batch
+
+    def partially_failing(QueueUrl, Entries):
+        # The first entry succeeds, the second is reported as failed
+        response = delete_message_batch(QueueUrl=QueueUrl, Entries=Entries[:1])
+        response["Failed"] = [{"Id": Entries[1]["Id"], "SenderFault": True, "Code": "ReceiptHandleIsInvalid", "Message": "invalid"}]
+        return response
+
+    worker.sqs_client.delete_message_batch = partially_failing
+    try:
+        worker._delete_message_batch(messages)
+    finally:
+        del worker.sqs_client.delete_message_batch
+    assert f"Error deleting message {messages[1]['MessageId']}" in caplog.text
+    assert counts(sqs, url) == (0, 1)
+
+def test_heartbeat_keeps_held_messages_invisible(queue, monkeypatch):
+    sqs, url = queue
+    monkeypatch.setattr(settings, "SQS_VISIBILITY_HEARTBEAT_SECONDS", 0.3)
+    send(sqs, url, 3)
+    worker = sqs_worker.SQSWorker()
+    messages = receive(sqs, url, visibility=1)
+    worker._held = {message["MessageId"]: message for message in messages}
+    calls = []
+    change_visibility_batch = worker.sqs_client.change_message_visibility_batch
+    worker.sqs_client.change_message_visibility_batch = lambda **kwargs: calls.append(kwargs) or change_visibility_batch(**kwargs)
+
+    async def run():
+        heartbeat = asyncio.create_task(worker._visibility_heartbeat())
+        # Longer than the 1s visibility timeout
+        await asyncio.sleep(2.0)
+        visible = await asyncio.to_thread(counts, sqs, url)
+        heartbeat.cancel()
+        await asyncio.gather(heartbeat, return_exceptions=True)
+        return visible
+
+    assert asyncio.run(run()) == (0, 3)
+    # One batched call per beat for all held messages
+    assert calls and all(len(call["Entries"]) == 3 for call in calls)
+
+def test_stop_releases_prefetched_messages(queue):
+    sqs, url = queue
+    send(sqs, url, 4)
+    worker = sqs_worker.SQSWorker()
+    messages = receive(sqs, url, visibility=30)
+    worker._buffered.extend(messages)
+    worker._held = {message["MessageId"]: message for message in messages}
+
+    asyncio.run(worker.stop())
+
+    assert worker._held == {} and not worker._buffered
+    released = receive(sqs, url)
+    assert sorted(message["MessageId"] for message in released) == sorted(message["MessageId"] for message in messages)
+
+def test_processed_messages_are_deleted_in_batches(queue, monkeypatch):
+    sqs, url = queue
+    monkeypatch.setattr(settings, "SQS_DELETE_MAX_WAIT_MS", 50)
+    send(sqs, url, 6)
+    worker = sqs_worker.SQSWorker()
+    calls = []
+    delete_message_batch = worker.sqs_client.delete_message_batch
+    worker.sqs_client.delete_message_batch = lambda **kwargs: calls.append(kwargs) or delete_message_batch(**kwargs)
+    worker.sqs_client.delete_message = lambda **kwargs: pytest.fail("single deletes are not used")
+
+    async def run():
+        worker._delete_wakeup = asyncio.Event()
+        flusher = asyncio.create_task(worker._delete_flusher())
+        for message in await asyncio.to_thread(receive, sqs, url, 30):
+            await worker._process_message(message)
+        await asyncio.sleep(0.3)
+        flusher.cancel()
+        await asyncio.gather(flusher, return_exceptions=True)
+
+    asyncio.run(run())
+    assert sum(len(call["Entries"]) for call in calls) == 6
+    assert len(calls) < 6
+    assert counts(sqs, url) == (0, 0)
@@ -0,0 +1,119 @@
+import threading
+import time
+from services.vector_db_service import VectorDBService
+
+class SlowStore:
+    """
+    Minimal store whose metadata pages are slow, counting full scans
+    """
+    name = "documents"
+
+    def __init__(self, chunks: int):
+        self.metadatas = [{"documentId": f"doc-{i % 3}", "file_type": "txt", "char_count": 10} for i in range(chunks)]
+        self.scans = 0
+        self.lock = threading.Lock()
+
+    def get(self, include, limit=None, offset=0, **kwargs):
+        if offset == 0:
+            with self.lock:
+                self.scans += 1
+        time.sleep(0.05)
+        page = self.metadatas[offset:offset + limit]
+        return {"ids": [f"c{offset + i}" for i in range(len(page))], "metadatas": page}
+
+    def size_bytes(self) -> int:
+        return 0
+
+def test_concurrent_stats_misses_share_one_scan(tmp_path, monkeypatch):
+    from config import settings
+    monkeypatch.setattr(settings, "CACHE_DB_PATH", str(tmp_path / "cache.sqlite3"))
+    service = VectorDBService()
+    service._store = SlowStore(chunks=30)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.get_collection_stats())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert service._store.scans == 1
+    assert len(results) == 8
+    assert all(stats["total_documents"] == 30 for stats in results)
+    assert results[0]["chunks_per_document"] == {"doc-0": 10, "doc-1": 10, "doc-2": 10}
+    assert results[0]["total_characters"] == 300
+
+def test_deleting_chunks_invalidates_cached_answers(tmp_path, monkeypatch):
+    from config import settings
+    from services.answer_cache import AnswerCache
+    from services.mmap_vector_store import MmapVectorStore
+
+    monkeypatch.setattr(settings, "CACHE_DB_PATH", str(tmp_path / "cache.sqlite3"))
+    service = VectorDBService()
+    service._store = MmapVectorStore(path=str(tmp_path / "store"), ann="none")
+    service._store.upsert(
+        ids=["a:0", "a:1", "b:0", "b:1"],
+        embeddings=[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0], [1.0, -1.0]],
+        documents=["a0", "a1", "b0", "b1"],
+        metadatas=[{"documentId": "a"}, {"documentId": "a"}, {"documentId": "b"}, {"documentId": "b"}]
+    )
+    cache = AnswerCache(backend="memory")
+
+    def keys():
+        return {scope: cache.make_key("question", scope and [scope], 5, "model", "v1") for scope in ("a", "b", None)}
+
+    before = keys()
+    for key in before.values():
+        cache.put(key, {"answer": "cached"})
+
+    service.delete_documents(["a:0"])
+    after_delete = keys()
+    assert after_delete["a"] != before["a"] and cache.get(after_delete["a"]) is None
+    assert after_delete[None] != before[None] and cache.get(after_delete[None]) is None
+    assert after_delete["b"] == before["b"]
+
+    assert service.delete_document_chunks("b", keep_ids={"b:0"}) == 1
+    after_replace = keys()
+    assert after_replace["b"] != before["b"] and cache.get(after_replace["b"]) is None
+    service._store.close()
+
+def test_stats_are_kept_per_document_after_the_first_scan(tmp_path, monkeypatch):
+    from config import settings
+    from services.mmap_vector_store import MmapVectorStore
+
+    monkeypatch.setattr(settings, "CACHE_DB_PATH", str(tmp_path / "cache.sqlite3"))
+    service = VectorDBService()
+    service._store = MmapVectorStore(path=str(tmp_path / "store"), ann="none")
+    service._store.upsert(
+        ids=["a:0", "a:1", "b:0"],
+        embeddings=[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]],
+        documents=["a0", "a1", "legacy text"],
+        metadatas=[
+            {"documentId": "a", "file_type": "pdf", "char_count": 10},
+            {"documentId": "a", "file_type": "pdf", "char_count": 20},
+            {"documentId": "b", "file_type": "txt"}
+        ]
+    )
+    # First call backfills the aggregates from a full scan (measuring text without char_count)
+    stats = service.get_collection_stats()
+    assert stats["chunks_per_document"] == {"a": 2, "b": 1}
+    assert stats["total_characters"] == 41
+
+    pages = []
+    get = service._store.get
+    monkeypatch.setattr(service._store, "get", lambda **kwargs: pages.append(kwargs) or get(**kwargs))
+    service._store.upsert(
+        ids=["c:0"], embeddings=[[0.5, 0.5]], documents=["c0"],
+        metadatas=[{"documentId": "c", "file_type": "docx", "char_count": 5}]
+    )
+    service.refresh_document_stats("c")
+    service.delete_documents(["a:1"])
+    service.stats_cache.clear()
+    pages.clear()
+
+    stats = service.get_collection_stats()
+    assert pages == []
+    assert stats["total_documents"] == 3
+    assert stats["chunks_per_document"] == {"a": 1, "b": 1, "c": 1}
+    assert stats["chunks_per_file_type"] == {"pdf": 1, "txt": 1, "docx": 1}
+    assert stats["total_characters"] == 26
+    service._store.close()
@@ -1,12 +1,18 @@
-import boto3
+import collections
 import json
 import logging
 import asyncio
 import time
+from typing import Deque, Dict, List
 from botocore.exceptions import ClientError
 from config import settings
 from services.document_processor import DocumentProcessor
 from services.nest_api_service import NestAPIService
+from services.http_clients import http_clients, NEST_API_CLIENT
+from services.aws_clients import aws_clients
+
+# Entry limit of SQS batch APIs (receive, delete, change visibility)
+SQS_BATCH_SIZE = 10
 
 # Configure logging
 logging.basicConfig(
@@ -17,44 +23,69 @@ logger = logging.getLogger(__name__)
 
 class SQSWorker:
     def __init__(self):
-        self.sqs_client = boto3.client(
-            "sqs",
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_REGION,
-        )
+        self.sqs_client = aws_clients.get("sqs")
         self.queue_url = settings.AWS_SQS_QUEUE_URL
         self.document_processor = DocumentProcessor()
         self.nest_api_service = NestAPIService()
         self.running = False
+        self.concurrency = max(1, settings.WORKER_CONCURRENCY)
+        self.prefetch = max(0, settings.SQS_PREFETCH_MESSAGES)
+        self._in_flight: set = set()
+        # Received and not yet deleted (processing or prefetched), by MessageId: kept invisible by the heartbeat
+        self._held: Dict[str, dict] = {}
+        # Prefetched messages waiting for a free handler
+        self._buffered: Deque[dict] = collections.deque()
+        self._receive_task = None
+        # Processed messages waiting for the next delete_message_batch
+        self._pending_deletes: List[dict] = []
+        self._delete_wakeup = None
+        self._background: List[asyncio.Task] = []
 
     async def start(self):
         """
-        Start the SQS worker (async)
+        Start the SQS worker (async). Up to WORKER_CONCURRENCY messages are processed at once;
+        the next receive runs while they are processed, holding up to SQS_PREFETCH_MESSAGES extra.
         """
-        logger.info("Starting SQS worker...")
+        logger.info(f"Starting SQS worker (concurrency={self.concurrency}, prefetch={self.prefetch})...")
         self.running = True
+        http_clients.start(NEST_API_CLIENT)
+        self._delete_wakeup = asyncio.Event()
+        self._background = [
+            asyncio.create_task(self._visibility_heartbeat()),
+            asyncio.create_task(self._delete_flusher())
+        ]
 
         try:
             while self.running:
                 try:
-                    # Receive messages from SQS (sync boto3 call, so run in thread executor)
-                    messages = await asyncio.to_thread(self._receive_messages)
+                    # Hand prefetched messages to free handlers
+                    while self._buffered and len(self._in_flight) < self.concurrency:
+                        self._start_handler(self._buffered.popleft())
+
+                    room = self.concurrency + self.prefetch - len(self._in_flight) - len(self._buffered)
+                    if self._receive_task is None and room > 0:
+                        # Receive messages from SQS (sync boto3 call, so run in thread executor)
+                        self._receive_task = asyncio.create_task(
+                            asyncio.to_thread(self._receive_messages, min(SQS_BATCH_SIZE, room))
+                        )
 
-                    if messages:
+                    waiting = set(self._in_flight)
+                    if self._receive_task is not None:
+                        waiting.add(self._receive_task)
+                    await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+                    if self._receive_task is not None and self._receive_task.done():
+                        messages = self._receive_task.result()
+                        self._receive_task = None
                         for message in messages:
-                            try:
-                                # ✅ Await the async message processor
-                                await self._process_message(message)
-                            except Exception as e:
-                                logger.error(
-                                    f"Error processing message {message.get('MessageId')}: {e}"
-                                )
-                    else:
-                        await asyncio.sleep(10)
+                            self._held[message["MessageId"]] = message
+                        self._buffered.extend(messages)
+                        if not messages and not self._in_flight:
+                            await asyncio.sleep(10)
 
                 except Exception as e:
                     logger.error(f"Error in SQS worker main loop: {e}")
+                    self._receive_task = None
                     await asyncio.sleep(30)
 
         except asyncio.CancelledError:
@@ -62,12 +93,90 @@ class SQSWorker:
         finally:
             await self.stop()
 
+    def _start_handler(self, message: dict):
+        task = asyncio.create_task(self._handle_message(message))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
     async def stop(self):
         """
-        Stop the SQS worker
+        Stop the SQS worker, letting in-flight messages finish
         """
         logger.info("Stopping SQS worker...")
         self.running = False
+        if self._receive_task is not None:
+            # A receive that is already polling can't be interrupted; release what it returns
+            messages = await asyncio.gather(self._receive_task, return_exceptions=True)
+            if isinstance(messages[0], list):
+                self._buffered.extend(messages[0])
+            self._receive_task = None
+        if self._buffered:
+            # Prefetched but never started: make them visible to other consumers right away
+            await asyncio.to_thread(self._change_visibility_batch, list(self._buffered), 0)
+            for message in self._buffered:
+                self._held.pop(message["MessageId"], None)
+            self._buffered.clear()
+        if self._in_flight:
+            logger.info(f"Waiting for {len(self._in_flight)} in-flight messages...")
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        for task in self._background:
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        self._background = []
+        await self._flush_deletes()
+        await self.document_processor.shutdown()
+        await http_clients.close()
+
+    async def _handle_message(self, message: dict):
+        """
+        Process one message while the heartbeat keeps it invisible to other consumers
+        """
+        try:
+            await self._process_message(message)
+        except Exception as e:
+            logger.error(f"Error processing message {message.get('MessageId')}: {e}")
+        finally:
+            # Deleted, or left to become visible again for SQS to retry
+            self._held.pop(message["MessageId"], None)
+
+    async def _visibility_heartbeat(self):
+        """
+        Periodically extend the visibility timeout of every held message, in batches,
+        so long jobs are not redelivered mid-processing
+        """
+        interval = settings.SQS_VISIBILITY_HEARTBEAT_SECONDS
+        if interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(interval)
+            messages = list(self._held.values())
+            if messages:
+                await asyncio.to_thread(self._change_visibility_batch, messages, settings.SQS_VISIBILITY_TIMEOUT)
+
+    async def _delete_flusher(self):
+        """
+        Delete processed messages in batches of up to 10, waiting at most SQS_DELETE_MAX_WAIT_MS for a batch to fill
+        """
+        while True:
+            await self._delete_wakeup.wait()
+            if len(self._pending_deletes) < SQS_BATCH_SIZE:
+                await asyncio.sleep(settings.SQS_DELETE_MAX_WAIT_MS / 1000)
+            self._delete_wakeup.clear()
+            await self._flush_deletes()
+
+    async def _flush_deletes(self):
+        while self._pending_deletes:
+            batch = self._pending_deletes[:SQS_BATCH_SIZE]
+            del self._pending_deletes[:SQS_BATCH_SIZE]
+            await asyncio.to_thread(self._delete_message_batch, batch)
+
+    def _delete_message(self, message: dict):
+        """
+        Queue a processed message for the next batched delete
+        """
+        self._held.pop(message["MessageId"], None)
+        self._pending_deletes.append(message)
+        self._delete_wakeup.set()
 
     def _receive_messages(self, max_messages: int = 10) -> list:
         """
@@ -78,6 +187,7 @@ class SQSWorker:
                 QueueUrl=self.queue_url,
                 MaxNumberOfMessages=max_messages,
                 WaitTimeSeconds=20,  # Long polling
+                VisibilityTimeout=settings.SQS_VISIBILITY_TIMEOUT,
                 AttributeNames=["All"],
                 MessageAttributeNames=["All"],
             )
@@ -125,9 +235,9 @@ class SQSWorker:
                         "failed",
                         f"Processing failed after {sqs_attempt} attempts",
                     )
-                    await asyncio.to_thread(self._delete_message, message)
+                    self._delete_message(message)
             else:
-                await asyncio.to_thread(self._delete_message, message)
+                self._delete_message(message)
 
             logger.info(f"Finished processing message for file: {file_key}")
 
@@ -137,23 +247,56 @@ class SQSWorker:
             logger.error(f"Error processing message: {e}")
             raise
 
-    def _delete_message(self, message: dict):
+    def _change_visibility_batch(self, messages: List[dict], timeout: int):
+        """
+        Set the visibility timeout of held messages, 10 per call (sync boto3)
         """
-        Delete a processed message from the SQS queue (sync boto3)
+        for start in range(0, len(messages), SQS_BATCH_SIZE):
+            batch = messages[start:start + SQS_BATCH_SIZE]
+            try:
+                response = self.sqs_client.change_message_visibility_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[
+                        {"Id": str(index), "ReceiptHandle": message["ReceiptHandle"], "VisibilityTimeout": timeout}
+                        for index, message in enumerate(batch)
+                    ]
+                )
+                for failure in response.get("Failed", []):
+                    message = batch[int(failure["Id"])]
+                    logger.error(f"Error setting visibility of message {message.get('MessageId')}: {failure.get('Message')}")
+                logger.info(f"Set visibility of {len(batch) - len(response.get('Failed', []))} messages to {timeout}s")
+            except ClientError as e:
+                logger.error(f"Error setting visibility of {len(batch)} messages: {e}")
+            except Exception as e:
+                logger.error(f"Unexpected error setting visibility of {len(batch)} messages: {e}")
+
+    def _delete_message_batch(self, messages: List[dict]):
+        """
+        Delete up to 10 processed messages from the SQS queue in one call (sync boto3)
         """
         try:
-            self.sqs_client.delete_message(
-                QueueUrl=self.queue_url, ReceiptHandle=message["ReceiptHandle"]
+            response = self.sqs_client.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {"Id": str(index), "ReceiptHandle": message["ReceiptHandle"]}
+                    for index, message in enumerate(messages)
+                ]
             )
-            logger.info(f"Deleted message {message.get('MessageId')} from SQS")
+            for failure in response.get("Failed", []):
+                message = messages[int(failure["Id"])]
+                logger.error(f"Error deleting message {message.get('MessageId')}: {failure.get('Message')}")
+            logger.info(f"Deleted {len(response.get('Successful', []))} messages from SQS")
         except ClientError as e:
-            logger.error(f"Error deleting message {message.get('MessageId')}: {e}")
+            logger.error(f"Error deleting {len(messages)} messages: {e}")
         except Exception as e:
-            logger.error(f"Unexpected error deleting message {message.get('MessageId')}: {e}")
+            logger.error(f"Unexpected error deleting {len(messages)} messages: {e}")
 
 
 def main():
+    started = time.perf_counter()
+    # The embedding model and vector store load on first use, not here
     worker = SQSWorker()
+    logger.info(f"SQS worker initialized in {time.perf_counter() - started:.2f}s")
     try:
         asyncio.run(worker.start())
     except Exception as e: